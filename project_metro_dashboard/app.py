@@ -1,21 +1,37 @@
 import asyncio
+import atexit
 import json
 import logging
 import threading
 import time
-from datetime import datetime
-from typing import Any
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 
 from config import settings
 from models.train_event import TrainEvent
 from services.aggregator import Aggregator
-from services.elastic_logger import make_es_logger
-from services.metrics_exporter import events_ingested, metrics_endpoint, observe_request, update_from_stats
+from services.elastic_logger import ElasticLogger, make_es_logger
+from services.coalescing_queue import CoalescingQueue
+from services.event_gate import EventGate, make_event_gate
+from services.event_log import make_event_recorder, parse_speed, replay
+from services.live_stream import Broadcaster
+from services.metrics_exporter import (
+    events_ingested,
+    metrics_endpoint,
+    observe_request,
+    update_from_stats,
+    update_snapshot_staleness,
+)
+from services.response_cache import SnapshotCache
 from services.schedule_optimizer import ScheduleOptimizer
 from services.scheduler import AppScheduler
+from services.shared_state import SharedStatePublisher, SharedStateReader
+from services.sim_clock import VirtualClock
 from services.simulator import simulate
+from services.stop_detector import StopDetector, make_stop_detector
+from services.train_index import INDEX_FIELDS, sort_page
 
 
 logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
@@ -24,44 +40,176 @@ logger = logging.getLogger("app")
 app = Flask(__name__)
 
 
-aggregator = Aggregator()
-es_logger = make_es_logger()
+# Reader processes serve the snapshot an ingest process publishes to shared memory
+READER_MODE = settings.SHARED_STATE_MODE == "reader"
+aggregator = SharedStateReader(settings.SHARED_STATE_NAME) if READER_MODE else Aggregator()
+shared_state: Optional[SharedStatePublisher] = None
+# Only the ingest process ships to Elasticsearch and records events; readers never open the spool or log
+es_logger = ElasticLogger(settings.ES_HOST, enabled=False) if READER_MODE else make_es_logger()
+if not READER_MODE:
+    # Flush buffered bulk documents and close the spool on exit (asgi.py also closes it on lifespan shutdown)
+    atexit.register(es_logger.close)
 optimizer = ScheduleOptimizer()
-
-
-async def consumer(queue: asyncio.Queue) -> None:
+recorder = None if READER_MODE else make_event_recorder()
+if recorder is not None:
+    atexit.register(recorder.close)
+# Same bytes as jsonify(): compact separators plus a trailing newline
+response_cache = SnapshotCache(lambda data: (app.json.dumps(data, separators=(",", ":")) + "\n").encode())
+broadcaster = Broadcaster(
+    aggregator,
+    lambda data: app.json.dumps(data, separators=(",", ":")),
+    max_rate_hz=settings.STREAM_MAX_RATE_HZ,
+    queue_size=settings.STREAM_CLIENT_QUEUE,
+    drop_policy=settings.STREAM_DROP_POLICY,
+)
+
+
+# Events handled between forced yields; queue.get() does not suspend while items are
+# queued, so without this a backlog would starve other tasks on the loop (ASGI handlers)
+CONSUMER_YIELD_EVERY = 256
+
+
+def archive(ev: Any) -> None:
+    if recorder is not None:
+        recorder.record(ev)
+    # Log to Elasticsearch with dynamic index
+    index_name = None
+    if hasattr(ev, "train_id"):
+        index_name = settings.ELASTIC_INDICES["trains"]
+    elif hasattr(ev, "station_id"):
+        index_name = settings.ELASTIC_INDICES["stations"]
+    if index_name:
+        es_logger.index(index_name, ev.model_dump())
+
+
+async def next_batch(queue: Any, max_events: int, wait_seconds: float) -> List[Any]:
+    """Wait for one event, then take up to ``max_events`` without waiting more than ``wait_seconds``."""
+    batch = [await queue.get()]
+    deadline = asyncio.get_running_loop().time() + wait_seconds
+    while len(batch) < max_events:
+        if not queue.empty():
+            batch.append(queue.get_nowait())
+            continue
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            break
+        # Sleep out the window rather than wait_for(get()), which can drop an item on timeout
+        await asyncio.sleep(remaining)
+    return batch
+
+
+def archive_stops(stops: List[Any]) -> None:
+    # Derived events: not in the event log, replays derive them again
+    index_name = settings.ELASTIC_INDICES["stops"]
+    for stop in stops:
+        es_logger.index(index_name, stop.model_dump())
+
+
+async def consumer(
+    queue: Any,
+    archive_events: bool = True,
+    gate: Optional[EventGate] = None,
+    detector: Optional[StopDetector] = None,
+    idle_flush_seconds: Optional[float] = None,
+) -> None:
+    # Events the gate holds back stay unfinished on the queue until it releases them, so
+    # queue.join() (VirtualClock) only returns once every queued event has been applied
+    quiet = idle_flush_seconds
+    if quiet is None and gate is not None:
+        quiet = gate.reorder_tolerance_seconds
+
+    def apply(events: List[Any]) -> None:
+        # Update aggregator and metrics once per batch
+        if not events:
+            return
+        aggregator.update_many(events)
+        events_ingested.inc(len(events))
+        if detector is not None:
+            archive_stops(detector.observe(events))
+        if archive_events:
+            for ev in events:
+                archive(ev)
+
+    wait_seconds = settings.INGEST_BATCH_WAIT_MS / 1000
+    handled = 0
     while True:
-        ev = await queue.get()
+        if gate is not None and gate.pending and queue.empty():
+            # The feed went quiet: let held events out once the reorder window has passed
+            await asyncio.sleep(quiet or 0.0)
+            if queue.empty():
+                held = gate.pending
+                try:
+                    apply(gate.flush())
+                finally:
+                    for _ in range(held):
+                        queue.task_done()
+                continue
+        batch = await next_batch(queue, settings.INGEST_BATCH_MAX, wait_seconds)
+        handled += len(batch)
+        if handled >= CONSUMER_YIELD_EVERY:
+            handled = 0
+            await asyncio.sleep(0)
         start = time.time()
+        held = gate.pending if gate is not None else 0
         try:
-            # Update aggregator and metrics
-            aggregator.update(ev)  # type: ignore[arg-type]
-            events_ingested.inc()
-            # Log to Elasticsearch with dynamic index
-            index_name = None
-            if hasattr(ev, "train_id"):
-                index_name = settings.ELASTIC_INDICES["trains"]
-            elif hasattr(ev, "station_id"):
-                index_name = settings.ELASTIC_INDICES["stations"]
-            if index_name:
-                es_logger.index(index_name, ev.model_dump())  # type: ignore[attr-defined]
+            apply(gate.push(batch) if gate is not None else batch)
         finally:
             observe_request(time.time() - start)
-            queue.task_done()
+            # Applied or rejected: the batch plus what the gate released, minus what it now holds
+            for _ in range(len(batch) + held - (gate.pending if gate is not None else 0)):
+                queue.task_done()
+
+
+def record_sim_kpis(now: datetime) -> None:
+    # KPI snapshot stamped with simulated time (sim-fast mode); published first so the
+    # log never depends on wall-clock snapshot cadence
+    aggregator.publish()
+    stats = aggregator.compute_stats(now=now)
+    update_from_stats(stats)
+    if settings.SIM_KPI_LOG:
+        with open(settings.SIM_KPI_LOG, "a") as fh:
+            fh.write(json.dumps(stats) + "\n")
+
+
+async def run_pipeline() -> None:
+    # Producer (simulator or replay) and consumer on the current event loop
+    queue: Any
+    archive_raw = settings.INGEST_COALESCE and settings.INGEST_ARCHIVE_RAW
+    if settings.INGEST_COALESCE:
+        # Archive every raw event at put time; the consumer only sees the latest per id
+        queue = CoalescingQueue(
+            settings.INGEST_QUEUE_SIZE, settings.INGEST_OVERFLOW_POLICY, on_put=archive if archive_raw else None
+        )
+    else:
+        queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+    # In sim-fast the queue only runs dry while the clock waits for it to drain: release held events at once
+    idle_flush = 0.0 if settings.DATA_MODE == "sim-fast" else None
+    cons = asyncio.create_task(
+        consumer(
+            queue,
+            archive_events=not archive_raw,
+            gate=make_event_gate(),
+            detector=make_stop_detector(),
+            idle_flush_seconds=idle_flush,
+        )
+    )
+    if settings.DATA_MODE == "sim-fast":
+        clock = VirtualClock(settings.SIM_START_TS, queue)
+        clock.every(15, record_sim_kpis)
+        prod = asyncio.create_task(simulate(queue, clock, settings.SIM_DURATION_SECONDS))
+    elif settings.DATA_MODE == "replay":
+        prod = asyncio.create_task(replay(queue, settings.REPLAY_PATH, parse_speed(settings.REPLAY_SPEED)))
+    else:
+        prod = asyncio.create_task(simulate(queue))
+    await asyncio.gather(cons, prod)
 
 
 def start_background_simulation() -> None:
     loop = asyncio.new_event_loop()
 
-    async def runner() -> None:
-        queue: asyncio.Queue = asyncio.Queue(maxsize=10000)
-        cons = asyncio.create_task(consumer(queue))
-        prod = asyncio.create_task(simulate(queue))
-        await asyncio.gather(cons, prod)
-
     def run_loop() -> None:
         asyncio.set_event_loop(loop)
-        loop.run_until_complete(runner())
+        loop.run_until_complete(run_pipeline())
 
     t = threading.Thread(target=run_loop, daemon=True)
     t.start()
@@ -77,6 +225,21 @@ def run_optimizer_once() -> None:
         es_logger.index(settings.ELASTIC_INDICES["routes"], p.model_dump())
 
 
+def start_shared_state() -> None:
+    global shared_state
+    if settings.SHARED_STATE_MODE != "ingest" or shared_state is not None:
+        return
+    shared_state = SharedStatePublisher(
+        aggregator,
+        settings.SHARED_STATE_NAME,
+        max_trains=settings.SHARED_STATE_MAX_TRAINS,
+        max_stations=settings.SHARED_STATE_MAX_STATIONS,
+        interval_seconds=settings.SHARED_STATE_PUBLISH_SECONDS,
+    )
+    shared_state.start()
+    atexit.register(shared_state.close)
+
+
 # Initialize background services
 _bootstrap_done = False
 _bootstrap_lock = threading.Lock()
@@ -87,42 +250,289 @@ def _bootstrap() -> None:
     with _bootstrap_lock:
         if _bootstrap_done:
             return
-        start_background_simulation()
-        scheduler = AppScheduler(aggregator.compute_stats, run_optimizer_once)
-        scheduler.start()
+        if not READER_MODE:
+            # Simulation and the optimizer run once, in the ingest process
+            start_background_simulation()
+            scheduler = AppScheduler(aggregator.compute_stats, run_optimizer_once)
+            scheduler.start()
+            start_shared_state()
         _bootstrap_done = True
 
 
+SERVICE_INFO = {
+    "service": "Metro Operations Dashboard",
+    "version": "1.0.0",
+    "endpoints": {
+        "/trains": "GET - Current status of all trains (?since=<version> for changes only, ?bbox=<lat,lon,lat,lon>;"
+                   " filters ?status=&next_station=&is_delayed=&is_overcrowded=, ?fields=, ?sort=[-]<field>,"
+                   " ?limit=&offset=)",
+        "/trains/nearest": "GET - Trains nearest a point, with distances (?lat=&lon=&k=10)",
+        "/trains/<id>/history": "GET - Recent positions, speed, delay and load of a train (?from=&to=)",
+        "/stations": "GET - Platform occupancy and alerts for all stations (?since=<version>)",
+        "/routes": "GET - Route plans information",
+        "/stats": "GET - KPIs and summary statistics",
+        "/stream": "GET - Server-Sent Events: snapshot, then coalesced train/station deltas",
+        "/rollups/<trains|stations>/<id|fleet>": "GET - Recent count/avg/min/max (?window=<seconds>&series=1)",
+        "/stations/<id>/percentiles": "GET - p50/p95/p99 platform wait over the percentile window",
+        "/stations/<id>/incoming": "GET - Trains heading to the station, soonest ETA first (?limit=10)",
+        "/metrics": "GET - Prometheus metrics endpoint"
+    },
+    "status": "operational",
+    "docs": "See README.md for usage examples"
+}
+
+
 @app.route("/", methods=["GET"])
 def root():
     _bootstrap()
-    return jsonify({
-        "service": "Metro Operations Dashboard",
-        "version": "1.0.0",
-        "endpoints": {
-            "/trains": "GET - Current status of all trains",
-            "/stations": "GET - Platform occupancy and alerts for all stations",
-            "/routes": "GET - Route plans information",
-            "/stats": "GET - KPIs and summary statistics",
-            "/metrics": "GET - Prometheus metrics endpoint"
-        },
-        "status": "operational",
-        "docs": "See README.md for usage examples"
-    })
+    return jsonify(SERVICE_INFO)
+
+
+def cached_section_response(name: str) -> Response:
+    # Serialized once per snapshot version; unchanged data costs a version check
+    snap = aggregator.current()
+    version = snap.section_versions[name]
+    entry = response_cache.get(name, version, lambda: (version, snap.records(name)))
+    if request.if_none_match.contains(entry.etag):
+        resp = Response(status=304)
+    elif entry.body and request.accept_encodings["gzip"] and len(entry.body) >= settings.RESPONSE_GZIP_MIN_BYTES:
+        resp = Response(entry.gzipped(), mimetype="application/json")
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(entry.body, mimetype="application/json")
+    resp.set_etag(entry.etag)
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+
+def section_response(name: str) -> Response:
+    since = request.args.get("since", type=int)
+    if since is None:
+        return cached_section_response(name)
+    # Delta sync: only entities changed after the client's cursor, plus removals
+    return jsonify(aggregator.delta(name, since))
+
+
+# Largest k accepted by /trains/nearest
+NEAREST_MAX_K = 1000
+
+
+def bbox_document(bbox: str) -> Tuple[Dict, int]:
+    """Body and status of /trains?bbox=min_lat,min_lon,max_lat,max_lon; shared by the Flask and ASGI apps."""
+    try:
+        min_lat, min_lon, max_lat, max_lon = (float(v) for v in bbox.split(","))
+    except ValueError:
+        return {"error": "bbox must be min_lat,min_lon,max_lat,max_lon"}, 400
+    if min_lat > max_lat or min_lon > max_lon:
+        return {"error": "bbox minimums must not exceed its maximums"}, 400
+    result = aggregator.trains_in_bbox(min_lat, min_lon, max_lat, max_lon)
+    if result is None:
+        return {"error": "spatial index disabled"}, 404
+    version, trains = result
+    body = {"version": version, "bbox": [min_lat, min_lon, max_lat, max_lon], "count": len(trains), "trains": trains}
+    return body, 200
+
+
+def nearest_document(lat: Optional[str], lon: Optional[str], k: Optional[str]) -> Tuple[Dict, int]:
+    """Body and status of /trains/nearest?lat=&lon=&k=."""
+    try:
+        point = float(lat or ""), float(lon or "")
+        count = int(k) if k else 10
+    except ValueError:
+        return {"error": "lat and lon must be numbers, k an integer"}, 400
+    if not 1 <= count <= NEAREST_MAX_K:
+        return {"error": f"k must be between 1 and {NEAREST_MAX_K}"}, 400
+    result = aggregator.nearest_trains(point[0], point[1], count)
+    if result is None:
+        return {"error": "spatial index disabled"}, 404
+    version, trains = result
+    return {"version": version, "lat": point[0], "lon": point[1], "trains": trains}, 200
+
+
+# Query parameters that turn /trains into a filtered/projected/sorted/paged query
+TRAIN_QUERY_PARAMS = INDEX_FIELDS + ("fields", "sort", "limit", "offset")
+TRAIN_FIELDS = tuple(TrainEvent.model_fields)
+_BOOLEANS = {"true": True, "1": True, "false": False, "0": False}
+
+
+def train_query_document(args: Mapping[str, str]) -> Tuple[Dict, int]:
+    """Body and status of /trains with any of TRAIN_QUERY_PARAMS; shared by the Flask and ASGI apps."""
+    filters: Dict[str, object] = {}
+    for field in INDEX_FIELDS:
+        value = args.get(field)
+        if value is None:
+            continue
+        if field in ("is_delayed", "is_overcrowded"):
+            if value.lower() not in _BOOLEANS:
+                return {"error": f"{field} must be true or false"}, 400
+            filters[field] = _BOOLEANS[value.lower()]
+        else:
+            filters[field] = value
+    fields = [f for f in (args.get("fields") or "").split(",") if f]
+    sort = args.get("sort") or "train_id"
+    unknown = [f for f in fields + [sort.lstrip("-")] if f not in TRAIN_FIELDS]
+    if unknown:
+        return {"error": f"unknown field {unknown[0]!r}; fields are {', '.join(TRAIN_FIELDS)}"}, 400
+    try:
+        limit = int(args["limit"]) if args.get("limit") else None
+        offset = int(args.get("offset") or 0)
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError
+    except ValueError:
+        return {"error": "limit and offset must be non-negative integers"}, 400
+    version, records = aggregator.query_trains(filters)
+    page = sort_page(records, sort.lstrip("-"), sort.startswith("-"), offset, limit)
+    if fields:
+        page = [{f: r[f] for f in fields} for r in page]
+    return {"version": version, "count": len(records), "offset": offset, "limit": limit, "trains": page}, 200
 
 
 @app.route("/trains", methods=["GET"])
 def get_trains():
     _bootstrap()
-    stats = aggregator.snapshot()
-    return jsonify(stats.get("trains", []))
+    bbox = request.args.get("bbox")
+    if bbox is not None:
+        body, status = bbox_document(bbox)
+        return jsonify(body), status
+    if any(p in request.args for p in TRAIN_QUERY_PARAMS):
+        body, status = train_query_document(request.args)
+        return jsonify(body), status
+    return section_response("trains")
+
+
+@app.route("/trains/nearest", methods=["GET"])
+def get_nearest_trains():
+    _bootstrap()
+    body, status = nearest_document(request.args.get("lat"), request.args.get("lon"), request.args.get("k"))
+    return jsonify(body), status
+
+
+def _parse_time(value: str) -> float:
+    # Epoch seconds or ISO-8601; naive times are UTC
+    try:
+        return float(value)
+    except ValueError:
+        ts = datetime.fromisoformat(value)
+        return (ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def history_document(train_id: str, start: Optional[str], end: Optional[str]) -> Tuple[Dict, int]:
+    """Body and status of /trains/<train_id>/history?from=&to=; shared by the Flask and ASGI apps."""
+    try:
+        first = _parse_time(start) if start else None
+        last = _parse_time(end) if end else None
+    except ValueError:
+        return {"error": "from and to must be ISO-8601 times or epoch seconds"}, 400
+    if first is not None and last is not None and first > last:
+        return {"error": "from must not be after to"}, 400
+    samples = aggregator.history(train_id, first, last)
+    if samples is None:
+        return {"error": f"no history for {train_id}"}, 404
+    return {"id": train_id, "count": len(samples), "samples": samples}, 200
+
+
+@app.route("/trains/<train_id>/history", methods=["GET"])
+def get_train_history(train_id: str):
+    _bootstrap()
+    body, status = history_document(train_id, request.args.get("from"), request.args.get("to"))
+    return jsonify(body), status
 
 
 @app.route("/stations", methods=["GET"])
 def get_stations():
     _bootstrap()
-    stats = aggregator.snapshot()
-    return jsonify(stats.get("stations", []))
+    return section_response("stations")
+
+
+@app.route("/stream", methods=["GET"])
+def stream():
+    _bootstrap()
+    broadcaster.start()
+    sub, initial = broadcaster.subscribe()
+
+    def frames():
+        try:
+            yield initial.sse
+            while True:
+                try:
+                    frame = sub.get(timeout=15.0)
+                except EOFError:
+                    return
+                # SSE comment line keeps idle connections (and proxies) alive
+                yield frame.sse if frame is not None else b": keepalive\n\n"
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    resp = Response(frames(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+# Default look-back of /rollups when no ?window= is given
+ROLLUP_DEFAULT_WINDOW_SECONDS = 900
+
+
+def rollup_document(name: str, entity_id: str, window: Optional[str], series: Optional[str]) -> Tuple[Dict, int]:
+    """Body and status of /rollups/<name>/<entity_id>; shared by the Flask and ASGI apps."""
+    try:
+        window_seconds = float(window) if window else ROLLUP_DEFAULT_WINDOW_SECONDS
+    except ValueError:
+        window_seconds = 0
+    if not window_seconds > 0:
+        return {"error": "window must be a positive number of seconds"}, 400
+    doc = aggregator.rollup(name, entity_id, window_seconds, series in ("1", "true"))
+    if doc is None:
+        return {"error": f"no rollups for {entity_id}"}, 404
+    return {"kind": name, "id": entity_id, **doc}, 200
+
+
+@app.route("/rollups/<any(trains, stations):name>/<entity_id>", methods=["GET"])
+def get_rollup(name: str, entity_id: str):
+    _bootstrap()
+    body, status = rollup_document(name, entity_id, request.args.get("window"), request.args.get("series"))
+    return jsonify(body), status
+
+
+def percentile_document(station_id: str) -> Tuple[Dict, int]:
+    """Body and status of /stations/<station_id>/percentiles."""
+    doc = aggregator.percentiles(station_id)
+    if doc is None:
+        return {"error": f"no percentiles for {station_id}"}, 404
+    return {"id": station_id, **doc}, 200
+
+
+@app.route("/stations/<station_id>/percentiles", methods=["GET"])
+def get_station_percentiles(station_id: str):
+    _bootstrap()
+    body, status = percentile_document(station_id)
+    return jsonify(body), status
+
+
+# Default number of trains on /stations/<id>/incoming when no ?limit= is given
+INCOMING_DEFAULT_LIMIT = 10
+
+
+def incoming_document(station_id: str, limit: Optional[str]) -> Tuple[Dict, int]:
+    """Body and status of /stations/<station_id>/incoming?limit=."""
+    try:
+        count = int(limit) if limit else INCOMING_DEFAULT_LIMIT
+    except ValueError:
+        count = 0
+    if count < 1:
+        return {"error": "limit must be a positive integer"}, 400
+    result = aggregator.incoming_trains(station_id)
+    if result is None:
+        return {"error": f"unknown station {station_id}"}, 404
+    version, arrivals = result
+    return {"id": station_id, "version": version, "count": len(arrivals), "trains": arrivals[:count]}, 200
+
+
+@app.route("/stations/<station_id>/incoming", methods=["GET"])
+def get_station_incoming(station_id: str):
+    _bootstrap()
+    body, status = incoming_document(station_id, request.args.get("limit"))
+    return jsonify(body), status
 
 
 @app.route("/routes", methods=["GET"])
@@ -138,15 +548,19 @@ def get_stats():
     stats = aggregator.compute_stats()
     update_from_stats(stats)
     es_logger.index(settings.ELASTIC_INDICES["kpis"], stats)
-    return jsonify(stats)
+    return jsonify({**stats, "snapshot": aggregator.staleness()})
 
 
 @app.route(settings.PROM_SCRAPE_PATH, methods=["GET"])  # /metrics
 def metrics():
     _bootstrap()
+    update_snapshot_staleness(aggregator.staleness())
     return metrics_endpoint()
 
 
 if __name__ == "__main__":
+    if settings.SHARED_STATE_MODE == "ingest":
+        # Publish right away so readers have a segment before the first request here
+        _bootstrap()
     app.run(host="0.0.0.0", port=settings.APP_PORT)
 
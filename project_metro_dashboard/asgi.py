@@ -0,0 +1,365 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+import app as dashboard
+from config import settings
+from services.live_stream import Frame, Subscriber
+from services.metrics_exporter import update_from_stats, update_snapshot_staleness
+from services.response_cache import CachedBody
+from services.scheduler import AppScheduler
+
+
+# ASGI entry point: ``uvicorn asgi:app``. The simulator/consumer pipeline and the
+# HTTP handlers share one event loop; /trains and /stations are answered from an
+# immutable view that a background task rebuilds and swaps in whole, so readers
+# never take the aggregator lock and never wait on ingest. Every other document
+# (queries, deltas, rollups, boards, stats) takes aggregator or index locks and is
+# built and serialized in a worker thread, never on the loop. The Flask app in
+# app.py serves the same services under WSGI.
+
+logger = logging.getLogger("asgi")
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+Headers = List[Tuple[bytes, bytes]]
+
+SECTIONS = ("trains", "stations")
+KEEPALIVE_SECONDS = 15.0
+
+SERVICE_INFO = {
+    **dashboard.SERVICE_INFO,
+    "endpoints": {
+        **dashboard.SERVICE_INFO["endpoints"],
+        "/ws": "WebSocket - same frames as /stream, one JSON text message each",
+    },
+}
+
+
+class ViewPublisher:
+    """Holds the latest serialized /trains and /stations bodies.
+
+    ``views`` is replaced, never mutated, so a handler that read the reference
+    keeps a consistent body even while the next one is being built. Records come
+    from the aggregator's published snapshot; serializing and compressing happen
+    in a worker thread.
+    """
+
+    def __init__(self, interval_seconds: float = 0.25) -> None:
+        self.interval_seconds = interval_seconds
+        self.views: Dict[str, CachedBody] = {}
+
+    async def refresh(self) -> None:
+        for name in SECTIONS:
+            snap = dashboard.aggregator.current()
+            version = snap.section_versions[name]
+            current = self.views.get(name)
+            if current is not None and current.version >= version:
+                continue
+            entry = await asyncio.to_thread(self._encode, name, version, snap.records(name))
+            self.views = {**self.views, name: entry}
+
+    @staticmethod
+    def _encode(name: str, version: int, records: List[Dict[str, Any]]) -> CachedBody:
+        entry = dashboard.response_cache.encode(name, version, records)
+        if len(entry.body) >= settings.RESPONSE_GZIP_MIN_BYTES:
+            entry.gzipped()
+        return entry
+
+    async def get(self, name: str) -> CachedBody:
+        if name not in self.views:
+            await self.refresh()
+        return self.views[name]
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:  # noqa: BLE001
+                logger.exception("View refresh failed")
+            await asyncio.sleep(self.interval_seconds)
+
+
+views = ViewPublisher(settings.ASGI_VIEW_INTERVAL_SECONDS)
+_tasks: List[asyncio.Task] = []
+_scheduler: Optional[AppScheduler] = None
+
+
+def _header(scope: Scope, name: bytes) -> str:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/").strip('"') == etag:
+            return True
+    return False
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        if coding.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+async def _respond(send: Send, status: int, body: bytes, content_type: str = "application/json", headers: Optional[Headers] = None) -> None:
+    start: Headers = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": start + (headers or [])})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _respond_json(send: Send, data: Any, status: int = 200) -> None:
+    await _respond(send, status, dashboard.response_cache.serialize(data))
+
+
+def _render(document: Callable[..., Tuple[Any, int]], *args: Any) -> Tuple[bytes, int]:
+    body, status = document(*args)
+    return dashboard.response_cache.serialize(body), status
+
+
+async def _respond_document(send: Send, document: Callable[..., Tuple[Any, int]], *args: Any) -> None:
+    """Respond with one of app.py's ``(body, status)`` documents, built off the event loop."""
+    body, status = await asyncio.to_thread(_render, document, *args)
+    await _respond(send, status, body)
+
+
+def _headers_only(send: Send) -> Send:
+    """``send`` for a HEAD request: same status and headers, Content-Length included, empty body."""
+
+    async def send_head(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.body":
+            message = {**message, "body": b""}
+        await send(message)
+
+    return send_head
+
+
+def _delta_document(name: str, since: int) -> Tuple[Dict, int]:
+    return dashboard.aggregator.delta(name, since), 200
+
+
+async def section_response(scope: Scope, send: Send, name: str) -> None:
+    query = parse_qs(scope["query_string"].decode())
+    if name == "trains" and "bbox" in query:
+        await _respond_document(send, dashboard.bbox_document, query["bbox"][0])
+        return
+    if name == "trains" and any(p in query for p in dashboard.TRAIN_QUERY_PARAMS):
+        await _respond_document(send, dashboard.train_query_document, {k: v[0] for k, v in query.items()})
+        return
+    try:
+        since: Optional[int] = int(query["since"][0])
+    except (KeyError, ValueError):
+        since = None
+    if since is not None:
+        # Delta sync reads the live aggregator; it is a suffix walk, not a full copy
+        await _respond_document(send, _delta_document, name, since)
+        return
+    entry = await views.get(name)
+    headers: Headers = [(b"etag", f'"{entry.etag}"'.encode()), (b"vary", b"Accept-Encoding")]
+    if _etag_matches(_header(scope, b"if-none-match"), entry.etag):
+        await send({"type": "http.response.start", "status": 304, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+    elif entry.body and _accepts_gzip(_header(scope, b"accept-encoding")) and len(entry.body) >= settings.RESPONSE_GZIP_MIN_BYTES:
+        await _respond(send, 200, entry.gzipped(), headers=headers + [(b"content-encoding", b"gzip")])
+    else:
+        await _respond(send, 200, entry.body, headers=headers)
+
+
+def _stats_document() -> Tuple[Dict, int]:
+    stats = dashboard.aggregator.compute_stats()
+    update_from_stats(stats)
+    dashboard.es_logger.index(settings.ELASTIC_INDICES["kpis"], stats)
+    return {**stats, "snapshot": dashboard.aggregator.staleness()}, 200
+
+
+def _metrics_payload() -> bytes:
+    update_snapshot_staleness(dashboard.aggregator.staleness())
+    return generate_latest()
+
+
+def _subscribe() -> Tuple[Subscriber, Frame, asyncio.Event]:
+    # Frames are offered from the broadcaster thread; the event wakes this loop
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    dashboard.broadcaster.start()
+    sub, initial = dashboard.broadcaster.subscribe(lambda: loop.call_soon_threadsafe(wake.set))
+    return sub, initial, wake
+
+
+async def _next_frame(sub: Subscriber, wake: asyncio.Event) -> Optional[Frame]:
+    """Next frame, or None after KEEPALIVE_SECONDS idle. Raises EOFError once closed."""
+    while True:
+        wake.clear()
+        frame = sub.get(0)
+        if frame is not None:
+            return frame
+        try:
+            await asyncio.wait_for(wake.wait(), KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            return None
+
+
+async def _unsubscribe_on(receive: Receive, sub: Subscriber, disconnect_type: str) -> None:
+    while (await receive())["type"] != disconnect_type:
+        pass
+    dashboard.broadcaster.unsubscribe(sub)
+
+
+async def stream_response(scope: Scope, receive: Receive, send: Send) -> None:
+    headers: Headers = [
+        (b"content-type", b"text/event-stream"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ]
+    if scope["method"] == "HEAD":
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    sub, initial, wake = _subscribe()
+    watcher = asyncio.create_task(_unsubscribe_on(receive, sub, "http.disconnect"))
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": initial.sse, "more_body": True})
+        while True:
+            try:
+                frame = await _next_frame(sub, wake)
+            except EOFError:
+                break
+            body = frame.sse if frame is not None else b": keepalive\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        watcher.cancel()
+        dashboard.broadcaster.unsubscribe(sub)
+
+
+async def websocket(scope: Scope, receive: Receive, send: Send) -> None:
+    if (await receive())["type"] != "websocket.connect":
+        return
+    if scope["path"] != "/ws":
+        await send({"type": "websocket.close", "code": 1008})
+        return
+    await send({"type": "websocket.accept"})
+    sub, initial, wake = _subscribe()
+    watcher = asyncio.create_task(_unsubscribe_on(receive, sub, "websocket.disconnect"))
+    try:
+        await send({"type": "websocket.send", "text": initial.message})
+        while True:
+            try:
+                frame = await _next_frame(sub, wake)
+            except EOFError:
+                break
+            if frame is not None:
+                await send({"type": "websocket.send", "text": frame.message})
+    finally:
+        client_gone = watcher.done()
+        watcher.cancel()
+        dashboard.broadcaster.unsubscribe(sub)
+    if not client_gone:
+        # Dropped as a slow consumer: tell the client to reconnect for a fresh snapshot
+        await send({"type": "websocket.close", "code": 1013})
+
+
+async def http(scope: Scope, receive: Receive, send: Send) -> None:
+    path = scope["path"]
+    parts = path.split("/")
+    if scope["method"] == "HEAD":
+        send = _headers_only(send)
+    if scope["method"] not in ("GET", "HEAD"):
+        await _respond_json(send, {"error": "method not allowed"}, 405)
+    elif path == "/":
+        await _respond_json(send, SERVICE_INFO)
+    elif path in ("/trains", "/stations"):
+        await section_response(scope, send, path[1:])
+    elif path == "/trains/nearest":
+        query = parse_qs(scope["query_string"].decode())
+        lat, lon, k = (query.get(key, [None])[0] for key in ("lat", "lon", "k"))
+        await _respond_document(send, dashboard.nearest_document, lat, lon, k)
+    elif len(parts) == 4 and parts[1] == "trains" and parts[2] and parts[3] == "history":
+        query = parse_qs(scope["query_string"].decode())
+        start, end = (query.get(key, [None])[0] for key in ("from", "to"))
+        await _respond_document(send, dashboard.history_document, parts[2], start, end)
+    elif path == "/stream":
+        await stream_response(scope, receive, send)
+    elif len(parts) == 4 and parts[1] == "rollups" and parts[2] in SECTIONS and parts[3]:
+        query = parse_qs(scope["query_string"].decode())
+        window, series = (query.get(key, [None])[0] for key in ("window", "series"))
+        await _respond_document(send, dashboard.rollup_document, parts[2], parts[3], window, series)
+    elif len(parts) == 4 and parts[1] == "stations" and parts[2] and parts[3] == "percentiles":
+        await _respond_document(send, dashboard.percentile_document, parts[2])
+    elif len(parts) == 4 and parts[1] == "stations" and parts[2] and parts[3] == "incoming":
+        query = parse_qs(scope["query_string"].decode())
+        await _respond_document(send, dashboard.incoming_document, parts[2], query.get("limit", [None])[0])
+    elif path == "/routes":
+        await _respond_json(send, {"message": "Route plans are logged to Elasticsearch index metro-route-plans"})
+    elif path == "/stats":
+        await _respond_document(send, _stats_document)
+    elif path == settings.PROM_SCRAPE_PATH:
+        await _respond(send, 200, await asyncio.to_thread(_metrics_payload), CONTENT_TYPE_LATEST)
+    else:
+        await _respond_json(send, {"error": "not found"}, 404)
+
+
+def _log_task_exit(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background task %s failed", task.get_name(), exc_info=task.exception())
+
+
+async def startup() -> None:
+    global _scheduler
+    background = [("views", views.run())]
+    if not dashboard.READER_MODE:
+        background.append(("pipeline", dashboard.run_pipeline()))
+    for name, coro in background:
+        task = asyncio.create_task(coro, name=name)
+        task.add_done_callback(_log_task_exit)
+        _tasks.append(task)
+    if not dashboard.READER_MODE:
+        _scheduler = AppScheduler(dashboard.aggregator.compute_stats, dashboard.run_optimizer_once)
+        _scheduler.start()
+        dashboard.start_shared_state()
+    dashboard.broadcaster.start()
+
+
+async def shutdown() -> None:
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    if _scheduler is not None:
+        _scheduler.scheduler.shutdown(wait=False)
+    dashboard.broadcaster.stop()
+    dashboard.es_logger.close()
+    if dashboard.recorder is not None:
+        dashboard.recorder.close()
+
+
+async def lifespan(receive: Receive, send: Send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await startup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    if scope["type"] == "http":
+        await http(scope, receive, send)
+    elif scope["type"] == "websocket":
+        await websocket(scope, receive, send)
+    elif scope["type"] == "lifespan":
+        await lifespan(receive, send)
@@ -0,0 +1,79 @@
+"""
+benchmarks/bench_aggregator_backends.py
+---------------------------------------
+Compares the dict-of-models and columnar train stores behind Aggregator.
+
+Run with:
+    python benchmarks/bench_aggregator_backends.py [--sizes 1000 10000 100000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator
+
+
+def make_events(n: int, seed: int = 7) -> List[TrainEvent]:
+    rng = random.Random(seed)
+    ts = datetime.now(timezone.utc)
+    return [
+        TrainEvent(
+            id=f"ev-{i}",
+            train_id=f"TRN-{i:06d}",
+            location=(rng.uniform(28.4, 28.9), rng.uniform(77.0, 77.4)),
+            speed_kmph=rng.uniform(20.0, 60.0),
+            ts=ts,
+            delay_min=rng.uniform(-1.0, 8.0),
+            passenger_count=rng.randint(20, 200),
+            next_station=f"STN-{rng.randrange(20):03d}",
+        )
+        for i in range(n)
+    ]
+
+
+def timed(fn: Callable[[], object], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(backend: str, events: List[TrainEvent]) -> None:
+    agg = Aggregator(backend=backend)
+
+    def ingest() -> None:
+        for ev in events:
+            agg.update(ev)
+
+    t_ingest = timed(ingest)
+    t_stats = timed(agg.compute_stats, repeat=5)
+    t_snapshot = timed(agg.snapshot)
+    n = len(events)
+    print(
+        f"{backend:>9} n={n:>7}  update {t_ingest / n * 1e6:7.2f} us/ev"
+        f"  compute_stats {t_stats * 1e3:8.3f} ms  snapshot {t_snapshot * 1e3:9.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+    for n in args.sizes:
+        events = make_events(n)
+        for backend in ("dict", "columnar"):
+            bench(backend, events)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+benchmarks/bench_batching.py
+----------------------------
+Ingest throughput at consumer batch sizes 1, 64, 512 and 4096.
+
+"aggregator" times Aggregator.update (batch 1) or update_many over slices of
+the batch size, for both train store backends. "pipeline" runs app.consumer on
+a pre-filled asyncio.Queue with INGEST_BATCH_MAX set to the batch size, so it
+also counts queue gets, metrics and task_done. ES and the event log are off.
+Events are generated up front by the NumPy simulator.
+
+Run with:
+    python benchmarks/bench_batching.py [--batches 1 64 512 4096] [--trains 5000] [--ticks 20] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ["ES_ENABLED"] = "false"
+os.environ.pop("EVENT_LOG_PATH", None)
+
+import app as dashboard
+from bench_sharding import make_events
+from config import settings
+from services.aggregator import Aggregator
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    return max(fn(*args) for _ in range(repeat))
+
+
+def bench_aggregator(events: list, batch: int, backend: str) -> float:
+    agg = Aggregator(backend=backend)
+    start = time.perf_counter()
+    if batch == 1:
+        for ev in events:
+            agg.update(ev)
+    else:
+        for i in range(0, len(events), batch):
+            agg.update_many(events[i : i + batch])
+    return len(events) / (time.perf_counter() - start)
+
+
+def bench_pipeline(events: list, batch: int, backend: str) -> float:
+    dashboard.aggregator = Aggregator(backend=backend)
+    settings.INGEST_BATCH_MAX = batch
+    settings.INGEST_BATCH_WAIT_MS = 0
+
+    async def run() -> float:
+        queue: asyncio.Queue = asyncio.Queue()
+        for ev in events:
+            queue.put_nowait(ev)
+        start = time.perf_counter()
+        consumer = asyncio.create_task(dashboard.consumer(queue, archive_events=False))
+        await queue.join()
+        elapsed = time.perf_counter() - start
+        consumer.cancel()
+        return elapsed
+
+    return len(events) / asyncio.run(run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 64, 512, 4096])
+    parser.add_argument("--trains", type=int, default=5_000)
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3, help="report the best of N runs")
+    args = parser.parse_args()
+    events = make_events(args.trains, args.ticks)
+    print(f"{len(events)} events")
+    print(f"{'batch':>6} {'backend':>9} {'aggregator ev/s':>16} {'pipeline ev/s':>14}")
+    for backend in ("dict", "columnar"):
+        for batch in args.batches:
+            print(
+                f"{batch:>6} {backend:>9} {best_of(args.repeat, bench_aggregator, events, batch, backend):>16,.0f}"
+                f" {best_of(args.repeat, bench_pipeline, events, batch, backend):>14,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
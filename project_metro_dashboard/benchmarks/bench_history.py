@@ -0,0 +1,96 @@
+"""
+benchmarks/bench_history.py
+---------------------------
+Per-train trajectory rings: ingest cost, memory and /trains/<id>/history range queries.
+
+Simulator ticks are appended to TrajectoryStore in 512-event batches, without
+and with a deadband, timing the steady-state append per sample once every
+ring has wrapped. Range queries for the last N minutes of random trains are
+then answered by binary search over the ring and, for comparison, by masking
+every held timestamp of the train.
+
+Run with:
+    python benchmarks/bench_history.py [--trains 10000] [--capacity 256] [--ticks 300] [--deadband-m 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ["ES_ENABLED"] = "false"
+
+from services.simulator import VectorSimulator
+from services.trajectories import TrajectoryStore, format_trajectory
+
+
+def ingest(store: TrajectoryStore, sim: VectorSimulator, ticks: int) -> Tuple[float, float]:
+    """Best steady-state ns per appended sample over ``ticks`` simulated ticks, and the share kept."""
+    ids = sim.train_ids
+    best, kept = float("inf"), 0
+    for tick in range(ticks):
+        sim.advance()
+        now = 1.7e9 + tick * sim.tick_seconds
+        columns = [np.full(len(ids), now), sim.lat, sim.lon, sim.speed, sim.delay, sim.passengers]
+        start = time.perf_counter()
+        for i in range(0, len(ids), 512):
+            kept += store.append_many(ids[i : i + 512], *(c[i : i + 512] for c in columns))
+        if tick >= store.capacity:
+            best = min(best, (time.perf_counter() - start) / len(ids) * 1e9)
+    return best, kept / (ticks * len(ids))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trains", type=int, default=10_000)
+    parser.add_argument("--capacity", type=int, default=256)
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--deadband-m", type=float, default=50.0)
+    parser.add_argument("--minutes", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.trains} trains, capacity {args.capacity}")
+    for deadband in (0.0, args.deadband_m):
+        sim = VectorSimulator(args.trains, 200, 200, seed=0)
+        sim._init_trains()
+        store = TrajectoryStore(args.capacity, args.trains, deadband_m=deadband)
+        ns, kept = ingest(store, sim, args.ticks)
+        print(
+            f"  deadband {deadband:4.0f} m  append {ns:5,.0f} ns/sample  {kept:6.1%} kept"
+            f"  {store.nbytes / 2**20:6.1f} MiB"
+        )
+
+    rng = random.Random(0)
+    now = 1.7e9 + (args.ticks - 1) * sim.tick_seconds
+    start = now - args.minutes * 60
+    queries = [rng.choice(sim.train_ids) for _ in range(2000)]
+
+    def masked(train_id: str) -> dict:
+        # Linear baseline: unroll the whole ring into ts order, then mask it
+        row = store._rows[train_id]
+        count = int(store.count[row])
+        index = (int(store.head[row]) - count + np.arange(count)) % store.capacity
+        columns = {name: col[row].take(index) for name, col in store.columns.items()}
+        mask = columns["ts"] >= start
+        return {name: col[mask] for name, col in columns.items()}
+
+    for label, query in (("binary search", lambda t: store.range(t, start)), ("mask scan", masked)):
+        begin = time.perf_counter()
+        for train_id in queries:
+            query(train_id)
+        us = (time.perf_counter() - begin) / len(queries) * 1e6
+        print(f"  last {args.minutes:g} min  {label:>13}  {us:6.1f} us/query")
+    begin = time.perf_counter()
+    for train_id in queries[:200]:
+        format_trajectory(store.range(train_id, start))
+    print(f"  formatted response        {(time.perf_counter() - begin) / 200 * 1e6:6.1f} us/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+benchmarks/bench_incoming.py
+----------------------------
+/stations/<id>/incoming: cached boards vs rebuilding them vs scanning the fleet.
+
+An aggregator ingests simulator ticks, then answers Aggregator.incoming_trains
+for every station three ways: a board rebuilt through the next_station index
+and the vectorized ETA pass (the first read after one of its trains moved),
+the cached board (every other read), and a scan of the snapshot for trains
+heading there followed by the same ETA pass (no index, no cache).
+
+Run with:
+    python benchmarks/bench_incoming.py [--trains 100000] [--stations 200] [--ticks 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ["ES_ENABLED"] = "false"
+
+from config import settings
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator, heading_records
+from services.incoming import estimate_arrivals
+from services.simulator import VectorSimulator
+
+
+def per_station_us(fn, station_ids: list) -> float:
+    start = time.perf_counter()
+    for sid in station_ids:
+        fn(sid)
+    return (time.perf_counter() - start) / len(station_ids) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trains", type=int, default=100_000)
+    parser.add_argument("--stations", type=int, default=200)
+    parser.add_argument("--ticks", type=int, default=3)
+    args = parser.parse_args()
+
+    sim = VectorSimulator(args.trains, args.stations, 200, seed=0)
+    sim._init_trains()
+    stations = sim.stations
+    agg = Aggregator(
+        backend="columnar", rollup_tiers=[], percentile_window_seconds=0, spatial_cell_km=0, stations=stations
+    )
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for i in range(args.ticks):
+        events = [e for e in sim.step(t0 + timedelta(seconds=sim.tick_seconds * i)) if isinstance(e, TrainEvent)]
+        for j in range(0, len(events), 512):
+            agg.update_many(events[j : j + 512])
+    agg.publish()
+    station_ids = list(stations.ids)
+
+    def rebuild(sid: str) -> None:
+        agg.boards._boards.pop(sid, None)
+        agg.incoming_trains(sid)
+
+    def scan(sid: str) -> None:
+        estimate_arrivals(heading_records(agg.current(), sid, None), stations.location(sid), settings.ETA_MIN_SPEED_KMPH)
+
+    rebuilt = min(per_station_us(rebuild, station_ids) for _ in range(3))
+    cached = min(per_station_us(agg.incoming_trains, station_ids) for _ in range(3))
+    scanned = per_station_us(scan, station_ids[:20])
+    heading = sum(len(agg.incoming_trains(sid)[1]) for sid in station_ids) / len(station_ids)
+    print(f"{args.trains} trains, {args.stations} stations, {heading:,.0f} incoming trains per station")
+    print(f"  scan + ETAs      {scanned:10,.1f} us/request")
+    print(f"  index + ETAs     {rebuilt:10,.1f} us/request  ({scanned / rebuilt:,.0f}x)")
+    print(f"  cached board     {cached:10,.1f} us/request  ({scanned / cached:,.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
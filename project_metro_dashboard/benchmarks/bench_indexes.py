@@ -0,0 +1,85 @@
+"""
+benchmarks/bench_indexes.py
+---------------------------
+Filtered /trains queries through the secondary indexes vs a scan of the snapshot.
+
+Two aggregators ingest the same simulator ticks, one with TRAIN_INDEXES on and
+one off, timing update_many per train after the first tick has inserted the
+fleet (the steady-state index upkeep). Then each filter is answered by
+Aggregator.query_trains from both: O(matches) through the index, O(fleet)
+for the scan. Filters matching most of the fleet fall back to the scan.
+
+Run with:
+    python benchmarks/bench_indexes.py [--trains 100000] [--stations 200] [--ticks 4] [--queries 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ["ES_ENABLED"] = "false"
+
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator
+from services.simulator import VectorSimulator
+
+
+def ingest_ns(agg: Aggregator, events: list) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(events), 512):
+        agg.update_many(events[i : i + 512])
+    return (time.perf_counter() - start) / len(events) * 1e9
+
+
+def query_ms(agg: Aggregator, filters: dict, queries: int) -> float:
+    start = time.perf_counter()
+    for _ in range(queries):
+        agg.query_trains(filters)
+    return (time.perf_counter() - start) / queries * 1e3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trains", type=int, default=100_000)
+    parser.add_argument("--stations", type=int, default=200)
+    parser.add_argument("--ticks", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    sim = VectorSimulator(args.trains, args.stations, 200, seed=0)
+    sim._init_trains()
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    ticks = [
+        [e for e in sim.step(t0 + timedelta(seconds=sim.tick_seconds * i)) if isinstance(e, TrainEvent)]
+        for i in range(args.ticks)
+    ]
+    options = dict(backend="columnar", rollup_tiers=[], percentile_window_seconds=0, spatial_cell_km=0)
+    indexed, scanned = Aggregator(**options, train_indexes=True), Aggregator(**options, train_indexes=False)
+    on, off = float("inf"), float("inf")
+    for n, events in enumerate(ticks):
+        tick_on, tick_off = ingest_ns(indexed, events), ingest_ns(scanned, events)
+        if n:
+            on, off = min(on, tick_on), min(off, tick_off)
+    print(f"{args.trains} trains, {args.stations} stations")
+    print(f"  ingest  index off {off:6,.0f} ns/train   index on {on:6,.0f} ns/train  (+{on - off:,.0f})")
+
+    filters = [
+        {"next_station": sim.station_ids[12]},
+        {"status": "dwelling"},
+        {"is_overcrowded": True, "is_delayed": True},
+        {"is_delayed": True},
+    ]
+    print(f"{'filter':>46} {'matches':>8} {'scan':>9} {'index':>9} {'speedup':>8}")
+    for f in filters:
+        matches = len(indexed.query_trains(f)[1])
+        scan, index = query_ms(scanned, f, args.queries), query_ms(indexed, f, args.queries)
+        label = ",".join(f"{k}={v}" for k, v in f.items())
+        print(f"{label:>46} {matches:>8,} {scan:7.2f}ms {index:7.2f}ms {scan / index:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
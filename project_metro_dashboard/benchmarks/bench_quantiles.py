@@ -0,0 +1,103 @@
+"""
+benchmarks/bench_quantiles.py
+-----------------------------
+Accuracy and per-update cost of the DDSketch behind the /stats percentiles.
+
+"accuracy" compares p50/p95/p99 from a sketch against exact quantiles of the
+same values: simulator delays, and a heavy-tailed lognormal as a harder
+case. "cost" times DDSketch.add per value, add_many over batches, and
+Aggregator.update_many with the percentile window on vs off (the ingest
+overhead of the sketches), with rollups off in both.
+
+Run with:
+    python benchmarks/bench_quantiles.py [--values 200000] [--accuracy 0.01] [--trains 5000] [--ticks 20] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ["ES_ENABLED"] = "false"
+
+from bench_sharding import make_events
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator
+from services.quantiles import QUANTILE_KEYS, QUANTILES, DDSketch
+
+
+def report_accuracy(name: str, values: np.ndarray, accuracy: float) -> None:
+    sketch = DDSketch(accuracy)
+    sketch.add_many(values)
+    cells = []
+    for q, key in zip(QUANTILES, QUANTILE_KEYS):
+        exact = float(np.quantile(values, q, method="lower"))
+        estimate = sketch.quantile(q)
+        error = abs(estimate - exact) / abs(exact) if exact else abs(estimate)
+        cells.append(f"{key} {exact:8.3f} ~ {estimate:8.3f} ({error:6.2%})")
+    bins = len(sketch.positive) + len(sketch.negative)
+    print(f"  {name:>10}: " + "  ".join(cells) + f"  [{bins} bins]")
+
+
+def ns_per_value(fn, values: np.ndarray) -> float:
+    start = time.perf_counter()
+    fn(values)
+    return (time.perf_counter() - start) / len(values) * 1e9
+
+
+def add_each(values: np.ndarray, accuracy: float) -> None:
+    sketch = DDSketch(accuracy)
+    for value in values.tolist():
+        sketch.add(value)
+
+
+def add_batches(values: np.ndarray, accuracy: float, batch: int) -> None:
+    sketch = DDSketch(accuracy)
+    for i in range(0, len(values), batch):
+        sketch.add_many(values[i : i + batch])
+
+
+def ingest_rate(events: list, window_seconds: int) -> float:
+    agg = Aggregator(backend="columnar", rollup_tiers=[], percentile_window_seconds=window_seconds)
+    start = time.perf_counter()
+    for i in range(0, len(events), 512):
+        agg.update_many(events[i : i + 512])
+    return len(events) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--values", type=int, default=200_000)
+    parser.add_argument("--accuracy", type=float, default=0.01)
+    parser.add_argument("--trains", type=int, default=5_000)
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3, help="report the best of N ingest runs")
+    args = parser.parse_args()
+
+    events = make_events(args.trains, args.ticks)
+    delays = np.array([e.delay_min for e in events if isinstance(e, TrainEvent)])
+    heavy = np.random.default_rng(1).lognormal(1.0, 1.5, args.values)
+
+    print(f"accuracy (relative accuracy {args.accuracy:.2%}, exact ~ sketch)")
+    report_accuracy("sim delays", delays, args.accuracy)
+    report_accuracy("lognormal", heavy, args.accuracy)
+
+    print("cost per value")
+    print(f"  add           {ns_per_value(lambda v: add_each(v, args.accuracy), heavy):8.0f} ns")
+    for batch in (64, 512, 4096):
+        cost = ns_per_value(lambda v: add_batches(v, args.accuracy, batch), heavy)
+        print(f"  add_many {batch:>4} {cost:8.0f} ns")
+
+    off = max(ingest_rate(events, 0) for _ in range(args.repeat))
+    on = max(ingest_rate(events, 900) for _ in range(args.repeat))
+    print(f"ingest (update_many, batch 512, {len(events)} events)")
+    print(f"  sketches off {off:12,.0f} ev/s")
+    print(f"  sketches on  {on:12,.0f} ev/s  ({(1 / on - 1 / off) * 1e9:,.0f} ns/event)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+benchmarks/bench_serving.py
+---------------------------
+Read throughput and latency of the Flask (threaded WSGI) and uvicorn (ASGI)
+entry points while the simulator ingests.
+
+Each server runs in a subprocess with the NumPy engine and ES disabled. The
+default DATA_MODE=sim-fast ingests as fast as the consumer allows, so ingest
+competes with readers for the whole run; --data-mode sim gives real-time ticks.
+A pool of concurrent clients then GETs /trains and /stats. Client and servers
+share the machine, so compare the rows against each other, not across hosts.
+
+Run with:
+    python benchmarks/bench_serving.py [--sizes 1000 10000] [--clients 32] [--seconds 10] [--data-mode sim]
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+ROOT = Path(__file__).parent.parent
+
+SERVERS = {
+    "flask": [sys.executable, "app.py"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:app", "--log-level", "warning", "--port"],
+}
+
+
+def start_server(kind: str, port: int, trains: int, data_mode: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        APP_PORT=str(port),
+        DATA_MODE=data_mode,
+        SIM_ENGINE="numpy",
+        SIM_TRAIN_COUNT=str(trains),
+        ES_ENABLED="false",
+        LOG_LEVEL="WARNING",
+    )
+    cmd = SERVERS[kind] + ([str(port)] if kind == "asgi" else [])
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            # The Flask app bootstraps ingest on its first request
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def ingested(client: httpx.AsyncClient) -> float:
+    text = (await client.get("/metrics")).text
+    match = re.search(r"^metro_events_ingested_total (\S+)$", text, re.M)
+    return float(match.group(1)) if match else 0.0
+
+
+async def load(base_url: str, clients: int, seconds: float) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        await wait_ready(client)
+        await asyncio.sleep(2.0)  # let the fleet fill in
+        events_before = await ingested(client)
+        deadline = time.monotonic() + seconds
+
+        async def worker(i: int) -> None:
+            nonlocal errors
+            paths = ("/trains", "/trains", "/trains", "/stats")
+            n = i
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    resp = await client.get(paths[n % len(paths)])
+                    resp.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                n += 1
+
+        start = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+        elapsed = time.monotonic() - start
+        events_after = await ingested(client)
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+        "ingest_eps": (events_after - events_before) / elapsed,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data-mode", choices=["sim", "sim-fast"], default="sim-fast")
+    args = parser.parse_args()
+    print(f"{'trains':>8} {'server':>6} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'ingest ev/s':>12} {'errors':>7}")
+    for n in args.sizes:
+        for kind in SERVERS:
+            proc = start_server(kind, args.port, n, args.data_mode)
+            try:
+                r = asyncio.run(load(f"http://127.0.0.1:{args.port}", args.clients, args.seconds))
+            finally:
+                proc.terminate()
+                proc.wait(10)
+            print(f"{n:>8} {kind:>6} {r['rps']:>9.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                  f"{r['ingest_eps']:>12.0f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+benchmarks/bench_sharding.py
+----------------------------
+Ingest throughput of one Aggregator vs ShardProcessPool (worker processes)
+at increasing shard counts.
+
+Events are generated up front by the NumPy simulator, so only routing and
+aggregator updates are timed. Both sides apply events with ``update_many`` in
+batches of ``--batch`` (the pool per shard), so the single aggregator is not
+charged per-event overhead the pool avoids.
+
+Run with:
+    python benchmarks/bench_sharding.py [--sizes 1 2 4 8] [--trains 5000] [--ticks 20] [--batch 256]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.aggregator import Aggregator
+from services.sharded_aggregator import ShardProcessPool
+from services.simulator import VectorSimulator
+
+
+def make_events(trains: int, ticks: int) -> list:
+    sim = VectorSimulator(train_count=trains, station_count=20, train_capacity=200, seed=1)
+    sim._init_trains()
+    ts = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    events = []
+    for tick in range(ticks):
+        events.extend(sim.step(ts + timedelta(seconds=tick)))
+    return events
+
+
+def bench_single(events: list, batch: int) -> float:
+    agg = Aggregator(backend="columnar")
+    start = time.perf_counter()
+    for i in range(0, len(events), batch):
+        agg.update_many(events[i : i + batch])
+    agg.compute_stats()
+    return len(events) / (time.perf_counter() - start)
+
+
+def bench_processes(events: list, shards: int, batch: int) -> float:
+    pool = ShardProcessPool(shards, backend="columnar", batch_size=batch)
+    start = time.perf_counter()
+    for ev in events:
+        pool.submit(ev)
+    pool.compute_stats()  # flushes and waits for every shard
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return len(events) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--trains", type=int, default=5_000)
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=256)
+    args = parser.parse_args()
+    events = make_events(args.trains, args.ticks)
+    print(f"{len(events)} events, {os.cpu_count()} CPUs")
+    print(f"single aggregator          {bench_single(events, args.batch):>10,.0f} ev/s")
+    for n in args.sizes:
+        print(f"shards={n:<3} processes     {bench_processes(events, n, args.batch):>10,.0f} ev/s")
+
+
+if __name__ == "__main__":
+    main()
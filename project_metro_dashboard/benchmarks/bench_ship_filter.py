@@ -0,0 +1,70 @@
+"""
+benchmarks/bench_ship_filter.py
+-------------------------------
+How many simulator documents the ES ship policies keep, and what the filter costs.
+
+Simulator ticks are dumped to documents the way app.archive does and passed
+through ShipFilter with ES_SHIP_POLICIES (EXAMPLE_ES_SHIP_POLICIES when that is
+empty), reporting shipped and suppressed documents per index, plus the filter's
+time per document next to the model_dump every archived event already pays.
+
+Run with:
+    python benchmarks/bench_ship_filter.py [--trains 2000] [--stations 50] [--ticks 150]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ["ES_ENABLED"] = "false"
+
+from config import settings
+from models.train_event import TrainEvent
+from services.ship_filter import ShipFilter, ShipPolicy
+from services.simulator import VectorSimulator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trains", type=int, default=2000)
+    parser.add_argument("--stations", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=150)
+    args = parser.parse_args()
+
+    sim = VectorSimulator(args.trains, args.stations, 200, seed=0)
+    sim._init_trains()
+    specs = settings.ES_SHIP_POLICIES or settings.EXAMPLE_ES_SHIP_POLICIES
+    policies = {index: ShipPolicy.from_dict(spec) for index, spec in specs.items()}
+    gate = ShipFilter(policies)
+    indices = settings.ELASTIC_INDICES
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    totals: Counter = Counter()
+    dump_s = filter_s = 0.0
+    for tick in range(args.ticks):
+        events = sim.step(t0 + timedelta(seconds=sim.tick_seconds * tick))
+        start = time.perf_counter()
+        docs = [
+            (indices["trains"] if isinstance(ev, TrainEvent) else indices["stations"], ev.model_dump())
+            for ev in events
+        ]
+        dump_s += time.perf_counter() - start
+        start = time.perf_counter()
+        for index, doc in docs:
+            totals[index, gate.admit(index, doc)] += 1
+        filter_s += time.perf_counter() - start
+    documents = sum(totals.values())
+    print(f"{args.trains} trains, {args.stations} stations, {args.ticks} ticks of {sim.tick_seconds:g} s")
+    for index in policies:
+        shipped, suppressed = totals[index, True], totals[index, False]
+        share = shipped / max(1, shipped + suppressed)
+        print(f"  {index:>22}  shipped {shipped:8,}  suppressed {suppressed:8,}  ({share:6.1%} shipped)")
+    print(f"  filter {filter_s / documents * 1e9:6,.0f} ns/doc   model_dump {dump_s / documents * 1e9:6,.0f} ns/doc")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+benchmarks/bench_simulator.py
+-----------------------------
+Per-tick cost of the per-train Python simulator vs the NumPy VectorSimulator.
+
+Run with:
+    python benchmarks/bench_simulator.py [--sizes 1000 10000 50000 100000]
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.simulator import Simulator, VectorSimulator
+
+
+def per_tick(fn, ticks: int) -> float:
+    start = time.perf_counter()
+    for _ in range(ticks):
+        fn()
+    return (time.perf_counter() - start) / ticks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000, 100_000])
+    parser.add_argument("--ticks", type=int, default=5)
+    args = parser.parse_args()
+    ts = datetime.now(timezone.utc)
+    for n in args.sizes:
+        py = Simulator(train_count=n, station_count=20, train_capacity=200)
+        py._init_trains()
+        vec = VectorSimulator(train_count=n, station_count=20, train_capacity=200, seed=1)
+        vec._init_trains()
+        t_py = per_tick(lambda: py.step(ts), max(1, args.ticks // 2))
+        t_adv = per_tick(vec.advance, args.ticks)
+        t_vec = per_tick(lambda: vec.step(ts), args.ticks)
+        print(
+            f"n={n:>7}  python step {t_py * 1e3:9.1f} ms  numpy advance {t_adv * 1e3:7.2f} ms"
+            f"  numpy step+events {t_vec * 1e3:8.1f} ms  (tick budget {py.tick_seconds * 1e3:.0f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+benchmarks/bench_spatial.py
+---------------------------
+GridIndex bbox/nearest queries vs linear scans over the whole fleet.
+
+Trains are placed uniformly over the simulator's city bounds. "python scan"
+is what answering from the snapshot records costs without an index: a loop
+with a bounds test per train (bbox) or a geopy geodesic per train (nearest,
+run once since it takes seconds). "numpy scan" is the best linear baseline:
+one vectorized pass over position columns. Queries are ~2 km viewports and
+k=10 nearest at random points.
+
+Run with:
+    python benchmarks/bench_spatial.py [--trains 100000] [--queries 200] [--cell-km 0.5]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from geopy.distance import geodesic
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import settings
+from services.geo import haversine_km
+from services.spatial_index import GridIndex
+
+
+def per_query_us(fn, queries: list) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        fn(*q)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trains", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--cell-km", type=float, default=settings.SPATIAL_INDEX_CELL_KM)
+    args = parser.parse_args()
+
+    (min_lat, min_lon), (max_lat, max_lon) = settings.CITY_BOUNDS
+    rng = np.random.default_rng(1)
+    lats = rng.uniform(min_lat, max_lat, args.trains)
+    lons = rng.uniform(min_lon, max_lon, args.trains)
+    ids = [f"TRN-{i:06d}" for i in range(args.trains)]
+    records = [{"train_id": t, "location": (la, lo)} for t, la, lo in zip(ids, lats.tolist(), lons.tolist())]
+
+    index = GridIndex(settings.CITY_BOUNDS, args.cell_km)
+    start = time.perf_counter()
+    index.move_many(ids, lats, lons)
+    build = time.perf_counter() - start
+    # Steady state: every train moves ~50 m, in consumer-sized batches and one by one
+    lats_next = lats + 0.00045
+    start = time.perf_counter()
+    for i in range(0, args.trains, 512):
+        index.move_many(ids[i : i + 512], lats_next[i : i + 512], lons[i : i + 512])
+    batched = (time.perf_counter() - start) / args.trains
+    start = time.perf_counter()
+    for t, la, lo in zip(ids[:20000], lats[:20000].tolist(), lons[:20000].tolist()):
+        index.move(t, la, lo)
+    single = (time.perf_counter() - start) / 20000
+    print(f"{args.trains} trains, {index.rows}x{index.cols} cells of {args.cell_km} km, built in {build * 1e3:,.0f} ms")
+    print(f"  moves: {batched * 1e9:,.0f} ns/train in batches of 512, {single * 1e9:,.0f} ns/train one by one")
+
+    points = list(zip(rng.uniform(min_lat, max_lat, args.queries), rng.uniform(min_lon, max_lon, args.queries)))
+    half = 1.0 / 111.2  # ~1 km in degrees
+    boxes = [(la - half, lo - half, la + half, lo + half) for la, lo in points]
+
+    def python_bbox(a: float, b: float, c: float, d: float) -> list:
+        return [r["train_id"] for r in records if a <= r["location"][0] <= c and b <= r["location"][1] <= d]
+
+    def numpy_bbox(a: float, b: float, c: float, d: float) -> np.ndarray:
+        return np.flatnonzero((lats >= a) & (lats <= c) & (lons >= b) & (lons <= d))
+
+    def numpy_nearest(la: float, lo: float) -> np.ndarray:
+        distances = haversine_km(la, lo, lats, lons)
+        best = np.argpartition(distances, 10)[:10]
+        return best[np.argsort(distances[best])]
+
+    start = time.perf_counter()
+    sorted(records, key=lambda r: geodesic(points[0], r["location"]).km)[:10]
+    geodesic_us = (time.perf_counter() - start) * 1e6
+
+    rows = [
+        ("bbox ~2 km", per_query_us(python_bbox, boxes[:10]), per_query_us(numpy_bbox, boxes),
+         per_query_us(index.bbox, boxes)),
+        ("nearest k=10", geodesic_us, per_query_us(numpy_nearest, points),
+         per_query_us(lambda la, lo: index.nearest(la, lo, 10), points)),
+    ]
+    print(f"{'query':>14} {'python scan':>14} {'numpy scan':>12} {'grid index':>12} {'vs python':>10} {'vs numpy':>9}")
+    for name, python_us, numpy_us, index_us in rows:
+        print(
+            f"{name:>14} {python_us:>12,.0f}us {numpy_us:>10,.0f}us {index_us:>10,.1f}us"
+            f" {python_us / index_us:>9,.0f}x {numpy_us / index_us:>8,.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+import json
 import os
+from datetime import datetime
 
 
 def getenv(key: str, default: str) -> str:
@@ -10,13 +12,122 @@ APP_PORT = int(getenv("APP_PORT", "8000"))
 ES_HOST = getenv("ES_HOST", "http://elasticsearch:9200")
 KIBANA_HOST = getenv("KIBANA_HOST", "http://kibana:5601")
 PROM_SCRAPE_PATH = getenv("PROM_SCRAPE_PATH", "/metrics")
+# "sim" runs the simulator in real time; "sim-fast" runs it on a virtual clock as fast
+# as the consumer keeps up, deterministic from SIM_SEED (0 when unset); "replay" plays
+# back a recorded event log
 DATA_MODE = getenv("DATA_MODE", "sim")
+SIM_START_TS = datetime.fromisoformat(getenv("SIM_START_TS", "2025-01-01T00:00:00+00:00"))
+SIM_DURATION_SECONDS = float(getenv("SIM_DURATION_SECONDS", "86400"))
+# JSON-lines file receiving a KPI snapshot every 15 simulated seconds in sim-fast mode
+SIM_KPI_LOG = getenv("SIM_KPI_LOG", "")
+# Binary event log: every ingested event is appended here when set; DATA_MODE=replay
+# feeds REPLAY_PATH back through the consumer at REPLAY_SPEED ("1", "10", ... or "max")
+EVENT_LOG_PATH = getenv("EVENT_LOG_PATH", "")
+REPLAY_PATH = getenv("REPLAY_PATH", "events.mlog")
+REPLAY_SPEED = getenv("REPLAY_SPEED", "1")
 SIM_TRAIN_COUNT = int(getenv("SIM_TRAIN_COUNT", "10"))
 SIM_STATION_COUNT = int(getenv("SIM_STATION_COUNT", "20"))
 TRAIN_CAPACITY = int(getenv("TRAIN_CAPACITY", "200"))
+# Area the simulator places trains and stations in: "min_lat,min_lon,max_lat,max_lon"
+_city = [float(v) for v in getenv("CITY_BOUNDS", "28.40,77.00,28.90,77.40").split(",")]
+CITY_BOUNDS = ((_city[0], _city[1]), (_city[2], _city[3]))
+# Live train positions are indexed in a grid of cells this many km wide over CITY_BOUNDS,
+# serving /trains?bbox= and /trains/nearest (0 disables the index and both queries)
+SPATIAL_INDEX_CELL_KM = float(getenv("SPATIAL_INDEX_CELL_KM", "0.5"))
+# Secondary indexes by status, next_station, is_delayed and is_overcrowded behind filtered
+# /trains queries; without them (or in reader processes) filters scan the whole fleet
+TRAIN_INDEXES = getenv("TRAIN_INDEXES", "true").lower() == "true"
+# /stations/<id>/incoming ETAs assume trains cover the distance at least this fast, so trains
+# stopped at an earlier station still get one
+ETA_MIN_SPEED_KMPH = float(getenv("ETA_MIN_SPEED_KMPH", "20"))
+# Station coordinates: CSV with station_id,lat,lon columns; empty lays out SIM_STATION_COUNT
+# stations over CITY_BOUNDS (the same layout the simulator uses)
+STATIONS_PATH = getenv("STATIONS_PATH", "")
+# A train within this many metres of its next station has arrived there; arrivals and
+# departures (with dwell times) are derived per ingest batch (0 disables them)
+STOP_RADIUS_M = float(getenv("STOP_RADIUS_M", "150"))
+# Ingest queue between producer and consumer. Coalescing keeps one pending event per
+# train/station (latest wins); INGEST_ARCHIVE_RAW still sends every raw event to ES and
+# the event log. The size counts distinct ids when coalescing, events otherwise. Off by
+# default: under a backlog, history, rollups, percentiles and stop detection would only
+# see the latest event per id.
+INGEST_QUEUE_SIZE = int(getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_COALESCE = getenv("INGEST_COALESCE", "false").lower() == "true"
+INGEST_OVERFLOW_POLICY = getenv("INGEST_OVERFLOW_POLICY", "block")  # block|drop_newest
+INGEST_ARCHIVE_RAW = getenv("INGEST_ARCHIVE_RAW", "true").lower() == "true"
+# The consumer applies up to INGEST_BATCH_MAX queued events per aggregator call, waiting at
+# most INGEST_BATCH_WAIT_MS for more once the first has arrived (0: take what is queued)
+INGEST_BATCH_MAX = int(getenv("INGEST_BATCH_MAX", "512"))
+INGEST_BATCH_WAIT_MS = float(getenv("INGEST_BATCH_WAIT_MS", "0"))
+# Before the aggregator: drop event ids seen among the last INGEST_DEDUPE_WINDOW (0 disables)
+# and events older than the newest already applied for their train/station. A reorder
+# tolerance > 0 holds events that long (in event time) and applies them in ts order.
+INGEST_DEDUPE_WINDOW = int(getenv("INGEST_DEDUPE_WINDOW", "100000"))
+INGEST_REJECT_STALE = getenv("INGEST_REJECT_STALE", "true").lower() == "true"
+INGEST_REORDER_TOLERANCE_MS = float(getenv("INGEST_REORDER_TOLERANCE_MS", "0"))
+# Simulator engine: "python" (per-train loop) or "numpy" (batched arrays, seeded by SIM_SEED)
+SIM_ENGINE = getenv("SIM_ENGINE", "python")
+SIM_SEED = int(getenv("SIM_SEED", "")) if getenv("SIM_SEED", "") else None
 OPTIMIZE_INTERVAL_SECONDS = int(getenv("OPTIMIZE_INTERVAL_SECONDS", "60"))
 ES_ENABLED = getenv("ES_ENABLED", "true").lower() == "true"
+# Buffer ES documents and ship them via _bulk from a background thread
+ES_BULK_ENABLED = getenv("ES_BULK_ENABLED", "true").lower() == "true"
+ES_BULK_MAX_DOCS = int(getenv("ES_BULK_MAX_DOCS", "500"))
+ES_BULK_FLUSH_SECONDS = float(getenv("ES_BULK_FLUSH_SECONDS", "1.0"))
+ES_BULK_BUFFER_MAX = int(getenv("ES_BULK_BUFFER_MAX", "50000"))
+ES_BULK_OVERFLOW_POLICY = getenv("ES_BULK_OVERFLOW_POLICY", "drop_oldest")  # drop_oldest|drop_newest|block
+ES_BULK_MAX_RETRIES = int(getenv("ES_BULK_MAX_RETRIES", "3"))
+# Durable on-disk spool for documents that cannot reach ES, replayed once it recovers
+ES_SPOOL_ENABLED = getenv("ES_SPOOL_ENABLED", "true").lower() == "true"
+ES_SPOOL_DIR = getenv("ES_SPOOL_DIR", "/var/tmp/metro-es-spool")
+ES_SPOOL_SEGMENT_BYTES = int(getenv("ES_SPOOL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+ES_SPOOL_MAX_BYTES = int(getenv("ES_SPOOL_MAX_BYTES", str(1024 * 1024 * 1024)))
+ES_SPOOL_PROBE_SECONDS = float(getenv("ES_SPOOL_PROBE_SECONDS", "5"))
+ES_SPOOL_REPLAY_DOCS_PER_SEC = float(getenv("ES_SPOOL_REPLAY_DOCS_PER_SEC", "1000"))
 LOG_LEVEL = getenv("LOG_LEVEL", "INFO")
+# /trains and /stations responses at least this large are served gzip-compressed on request
+RESPONSE_GZIP_MIN_BYTES = int(getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+# /stream (Server-Sent Events): max pushes per second, per-client queue and slow-client policy
+STREAM_MAX_RATE_HZ = float(getenv("STREAM_MAX_RATE_HZ", "2"))
+STREAM_CLIENT_QUEUE = int(getenv("STREAM_CLIENT_QUEUE", "64"))
+STREAM_DROP_POLICY = getenv("STREAM_DROP_POLICY", "drop_oldest")  # drop_oldest|disconnect
+# ASGI mode (uvicorn asgi:app): how often the /trains and /stations bodies are rebuilt
+ASGI_VIEW_INTERVAL_SECONDS = float(getenv("ASGI_VIEW_INTERVAL_SECONDS", "0.25"))
+# Train state backend for the aggregator: "dict" (pydantic models) or "columnar" (NumPy arrays)
+AGGREGATOR_BACKEND = getenv("AGGREGATOR_BACKEND", "dict")
+# Recompute running KPI totals from a full scan every N aggregator updates (0 disables)
+KPI_RESYNC_INTERVAL = int(getenv("KPI_RESYNC_INTERVAL", "50000"))
+# Rolling per-train/station and fleet-wide rollups: "<bucket seconds>:<buckets>" per resolution,
+# about 64 bytes per bucket per entity (empty disables rollups and the /rollups endpoints).
+# A bucket narrower than the report interval (e.g. "1:60") closes on nearly every event.
+ROLLUP_TIERS = getenv("ROLLUP_TIERS", "60:60,900:16,3600:24")
+# p50/p95/p99 delay and platform wait in /stats and Prometheus come from quantile sketches over
+# this sliding event-time window (0 disables them), advanced in buckets of PERCENTILE_BUCKET_SECONDS
+PERCENTILE_WINDOW_SECONDS = int(getenv("PERCENTILE_WINDOW_SECONDS", "900"))
+PERCENTILE_BUCKET_SECONDS = int(getenv("PERCENTILE_BUCKET_SECONDS", "60"))
+# Reported quantiles are within this relative error of the exact value
+PERCENTILE_RELATIVE_ACCURACY = float(getenv("PERCENTILE_RELATIVE_ACCURACY", "0.01"))
+# Per-train trajectory history behind /trains/<id>/history: the last HISTORY_CAPACITY samples
+# (28 bytes each) of at most HISTORY_MAX_TRAINS trains, so memory stays under their product
+# (0 capacity disables it). A positive deadband only keeps samples that moved more than
+# HISTORY_DEADBAND_M or changed delay by more than HISTORY_DEADBAND_DELAY_MIN, plus one at
+# least every HISTORY_MAX_GAP_SECONDS
+HISTORY_CAPACITY = int(getenv("HISTORY_CAPACITY", "256"))
+HISTORY_MAX_TRAINS = int(getenv("HISTORY_MAX_TRAINS", "10000"))
+HISTORY_DEADBAND_M = float(getenv("HISTORY_DEADBAND_M", "0"))
+HISTORY_DEADBAND_DELAY_MIN = float(getenv("HISTORY_DEADBAND_DELAY_MIN", "0"))
+HISTORY_MAX_GAP_SECONDS = float(getenv("HISTORY_MAX_GAP_SECONDS", "60"))
+# Readers see an immutable snapshot republished every N updates and once changes are this old;
+# 0/0 republishes on the first read after any change (always fresh, more copying under load)
+SNAPSHOT_INTERVAL_SECONDS = float(getenv("SNAPSHOT_INTERVAL_SECONDS", "0"))
+SNAPSHOT_EVERY_UPDATES = int(getenv("SNAPSHOT_EVERY_UPDATES", "0"))
+# Multi-process serving: one "ingest" process publishes its snapshot to shared memory
+# every SHARED_STATE_PUBLISH_SECONDS; "reader" processes (API workers) serve from it
+SHARED_STATE_MODE = getenv("SHARED_STATE_MODE", "off")  # off|ingest|reader
+SHARED_STATE_NAME = getenv("SHARED_STATE_NAME", "metro-state")
+SHARED_STATE_MAX_TRAINS = int(getenv("SHARED_STATE_MAX_TRAINS", "50000"))
+SHARED_STATE_MAX_STATIONS = int(getenv("SHARED_STATE_MAX_STATIONS", "5000"))
+SHARED_STATE_PUBLISH_SECONDS = float(getenv("SHARED_STATE_PUBLISH_SECONDS", "0.5"))
 
 
 ELASTIC_INDICES = {
@@ -24,5 +135,28 @@ ELASTIC_INDICES = {
     "stations": "metro-station-events",
     "routes": "metro-route-plans",
     "kpis": "metro-kpis",
+    "stops": "metro-train-stops",
 }
+# Example ship policy: a train's document ships when its `status` or `next_station` changed, it
+# moved past a deadband, or 60 s passed since its last shipped one; stations likewise on `alerts`.
+# Opt in with ES_SHIP_POLICIES='<this as JSON>' (benchmarks/bench_ship_filter.py measures it)
+EXAMPLE_ES_SHIP_POLICIES = {
+    ELASTIC_INDICES["trains"]: {
+        "key": "train_id",
+        "on_change": ["status", "next_station"],
+        "deadband": {"location": 50, "speed_kmph": 5, "delay_min": 0.5, "passenger_count": 20},
+        "max_interval_seconds": 60,
+    },
+    ELASTIC_INDICES["stations"]: {
+        "key": "station_id",
+        "on_change": ["alerts"],
+        "deadband": {"platform_occupancy": 25, "avg_wait_min": 0.5},
+        "max_interval_seconds": 60,
+    },
+}
+# Deadband/sampling policies applied before documents are sent to Elasticsearch, keyed by index
+# (JSON; default "{}" ships everything). Per entity (`key`), a document ships when an `on_change`
+# field changed; otherwise at most one per `min_interval_seconds`, and only if a `deadband` field
+# moved past its threshold (`location` in metres) or `max_interval_seconds` passed since the last one
+ES_SHIP_POLICIES = json.loads(getenv("ES_SHIP_POLICIES", "{}"))
 
@@ -0,0 +1,15 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class StopEvent(BaseModel):
+    id: str
+    train_id: str
+    station_id: str
+    kind: str  # "arrival" | "departure"
+    ts: datetime
+    delay_min: float = 0.0
+    # Departures only: time since the matching arrival
+    dwell_seconds: Optional[float] = None
@@ -1,64 +1,596 @@
+import itertools
 import threading
-from collections import deque
+import time
 from datetime import datetime, timezone
-from statistics import mean
-from typing import Deque, Dict, List, Tuple, Union
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
 
+from config import settings
 from models.station_event import StationEvent
 from models.train_event import TrainEvent
+from services.change_log import ChangeLog, ChangeStep, changes_after, extend_history
+from services.chunked_map import ChunkedMap
+from services.kpi_tracker import CROWDED_OCCUPANCY, RunningKpis
+from services.incoming import IncomingBoard
+from services.quantiles import DDSketch, KpiSketches, format_percentiles
+from services.rollups import RollupStore, Tier, format_rollup, parse_tiers
+from services.spatial_index import GridIndex
+from services.stations import StationCatalog, make_station_catalog
+from services.train_index import TrainIndex, event_key, filter_records, matches
+from services.trajectories import TrajectoryStore, format_trajectory
+from services.train_store import TrainStore, make_train_store
 
 
 Event = Union[TrainEvent, StationEvent]
 
+# Metrics rolled up per entity, in RollupStore column order
+TRAIN_ROLLUP_METRICS = ("delay_min", "passenger_count")
+STATION_ROLLUP_METRICS = ("platform_occupancy", "avg_wait_min")
+
+
+def format_stats(kpis: Dict[str, float], now: Optional[datetime] = None) -> Dict:
+    """Turn running KPI totals into the /stats document."""
+    trains_active = kpis["count"]
+    avg_delay = kpis["delay_sum"] / trains_active if trains_active else 0.0
+    avg_speed = kpis["speed_sum"] / trains_active if trains_active else 0.0
+    total_passengers = kpis["passengers_total"]
+    crowded_stations = kpis["crowded_stations"]
+    missed_stops = 0  # Placeholder for advanced logic
+    on_time_percent = 100.0 * (kpis["on_time"] / trains_active if trains_active else 0.0)
+    return {
+        "ts": (now or datetime.now(timezone.utc)).isoformat(),
+        "trains_active": trains_active,
+        "avg_delay_min": round(avg_delay, 2),
+        "avg_speed_kmph": round(avg_speed, 2),
+        "passengers_total": total_passengers,
+        "crowded_stations": crowded_stations,
+        "missed_stops": missed_stops,
+        "on_time_percent": round(on_time_percent, 2),
+    }
+
+
+def with_percentiles(stats: Dict, percentiles: Optional[Dict]) -> Dict:
+    if percentiles is not None:
+        stats["percentiles"] = percentiles
+    return stats
+
+
+def nearest_records(snap: "AggregatorSnapshot", hits: Iterable[Tuple[str, float]]) -> Tuple[int, List[Dict]]:
+    records = [
+        {**snap.trains[train_id], "distance_km": round(distance, 3)}
+        for train_id, distance in hits
+        if train_id in snap.trains
+    ]
+    return snap.section_versions["trains"], records
+
+
+def indexed_records(snap: "AggregatorSnapshot", ids: Iterable[str], filters: Dict[str, object]) -> Tuple[int, List[Dict]]:
+    # Index membership follows the live state; keep only records that match as published
+    trains = snap.trains
+    records = [trains[t] for t in ids if t in trains]
+    return snap.section_versions["trains"], [r for r in records if matches(r, filters)]
+
+
+def heading_records(snap: "AggregatorSnapshot", station_id: str, ids: Optional[Iterable[str]]) -> List[Dict]:
+    """Snapshot records of trains heading to ``station_id``: the given ids, or a scan without them."""
+    trains = snap.trains
+    if ids is None:
+        return [r for r in trains.values() if r["next_station"] == station_id]
+    return [r for r in (trains.get(t) for t in ids) if r is not None and r["next_station"] == station_id]
+
+
+class AggregatorSnapshot:
+    """Immutable view of the aggregator state at one version.
+
+    Published by reference, so readers use it without any lock. Record dicts
+    (and, in the Aggregator's ChunkedMap sections, whole chunks of them) are
+    shared with later snapshots that did not change them; treat them as
+    read-only. ``changes`` maps each section to (floor, newest ChangeStep) for
+    lock-free deltas; None when the snapshot carries no change history.
+    """
+
+    __slots__ = ("version", "section_versions", "trains", "stations", "kpis", "changes")
+
+    def __init__(
+        self,
+        version: int,
+        section_versions: Dict[str, int],
+        trains: Mapping[str, Dict],
+        stations: Mapping[str, Dict],
+        kpis: Dict[str, float],
+        changes: Optional[Dict[str, Tuple[int, Optional[ChangeStep]]]] = None,
+    ) -> None:
+        self.version = version
+        self.section_versions = section_versions
+        self.trains = trains
+        self.stations = stations
+        self.kpis = kpis
+        self.changes = changes
+
+    def delta(self, name: str, since: int) -> Dict:
+        """Entities of a section changed or removed after ``since``, answered from this snapshot alone.
+
+        Falls back to the full section (``"full": True``) when the cursor is
+        ahead of the snapshot (e.g. after a restart) or older than the change
+        history it carries.
+        """
+        if since == self.version:
+            return {"version": self.version, "full": False, "changed": [], "removed": []}
+        history = self.changes.get(name) if self.changes is not None and since < self.version else None
+        result = changes_after(history[1], history[0], since) if history is not None else None
+        if result is None:
+            return {"version": self.version, "full": True, "changed": self.records(name), "removed": []}
+        records = self.trains if name == "trains" else self.stations
+        changed, removed = result
+        return {
+            "version": self.version,
+            "full": False,
+            "changed": [records[k] for k in changed if k in records],
+            "removed": [k for k in removed if k not in records],
+        }
+
+    def records(self, name: str) -> List[Dict]:
+        return list((self.trains if name == "trains" else self.stations).values())
+
 
 class Aggregator:
-    def __init__(self, window_size: int = 300) -> None:
+    """Live train/station state behind one writer lock.
+
+    Reads (``snapshot``, ``section``, ``compute_stats``) are served from the
+    published AggregatorSnapshot. Ingest republishes it every
+    ``snapshot_every_updates`` updates and once changes are
+    ``snapshot_interval_seconds`` old; a reader that finds the snapshot older
+    than that refreshes it only if the write lock is free, and otherwise keeps
+    the current one. With both at 0, every read after a change republishes.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        kpi_resync_interval: Optional[int] = None,
+        snapshot_interval_seconds: Optional[float] = None,
+        snapshot_every_updates: Optional[int] = None,
+        rollup_tiers: Optional[Sequence[Tier]] = None,
+        percentile_window_seconds: Optional[int] = None,
+        spatial_cell_km: Optional[float] = None,
+        train_indexes: Optional[bool] = None,
+        stations: Optional[StationCatalog] = None,
+        history_capacity: Optional[int] = None,
+    ) -> None:
         self.lock = threading.RLock()
-        self.trains: Dict[str, TrainEvent] = {}
+        self.trains: TrainStore = make_train_store(backend or settings.AGGREGATOR_BACKEND)
         self.stations: Dict[str, StationEvent] = {}
-        self.window: Deque[Tuple[datetime, Event]] = deque(maxlen=window_size)
+        self.kpis = RunningKpis()
+        # Recent-history rollups per train/station and fleet-wide (no tiers disables them)
+        tiers = parse_tiers(settings.ROLLUP_TIERS) if rollup_tiers is None else rollup_tiers
+        self.rollups: Dict[str, RollupStore] = (
+            {"trains": RollupStore(TRAIN_ROLLUP_METRICS, tiers), "stations": RollupStore(STATION_ROLLUP_METRICS, tiers)}
+            if tiers
+            else {}
+        )
+        # Sliding-window delay/wait quantile sketches (a 0 window disables them)
+        window = settings.PERCENTILE_WINDOW_SECONDS if percentile_window_seconds is None else percentile_window_seconds
+        self.sketches: Optional[KpiSketches] = (
+            KpiSketches(window, settings.PERCENTILE_BUCKET_SECONDS, settings.PERCENTILE_RELATIVE_ACCURACY)
+            if window
+            else None
+        )
+        # Grid over live train positions for bbox/nearest queries (a 0 cell size disables it)
+        cell_km = settings.SPATIAL_INDEX_CELL_KM if spatial_cell_km is None else spatial_cell_km
+        self.spatial: Optional[GridIndex] = GridIndex(settings.CITY_BOUNDS, cell_km) if cell_km else None
+        # Secondary indexes behind filtered /trains queries (without them filters scan the fleet)
+        indexed = settings.TRAIN_INDEXES if train_indexes is None else train_indexes
+        self.index: Optional[TrainIndex] = TrainIndex() if indexed else None
+        # Cached per-station arrival boards behind /stations/<id>/incoming
+        self.boards = IncomingBoard(stations or make_station_catalog(), settings.ETA_MIN_SPEED_KMPH)
+        # Fixed-capacity per-train trajectory rings behind /trains/<id>/history (0 capacity disables them)
+        capacity = settings.HISTORY_CAPACITY if history_capacity is None else history_capacity
+        self.trajectories: Optional[TrajectoryStore] = (
+            TrajectoryStore(
+                capacity,
+                settings.HISTORY_MAX_TRAINS,
+                settings.HISTORY_DEADBAND_M,
+                settings.HISTORY_DEADBAND_DELAY_MIN,
+                settings.HISTORY_MAX_GAP_SECONDS,
+            )
+            if capacity
+            else None
+        )
+        # Full-scan drift correction every N updates (0 disables it)
+        self.kpi_resync_interval = (
+            settings.KPI_RESYNC_INTERVAL if kpi_resync_interval is None else kpi_resync_interval
+        )
+        self._updates_since_resync = 0
+        # Bumped on every update; section_versions records the version of the last change per section.
+        self._next_version = itertools.count(1).__next__
+        self.version = 0
+        self.section_versions: Dict[str, int] = {"trains": 0, "stations": 0}
+        self.train_changes = ChangeLog()
+        self.station_changes = ChangeLog()
+        self.snapshot_interval_seconds = (
+            settings.SNAPSHOT_INTERVAL_SECONDS if snapshot_interval_seconds is None else snapshot_interval_seconds
+        )
+        self.snapshot_every_updates = (
+            settings.SNAPSHOT_EVERY_UPDATES if snapshot_every_updates is None else snapshot_every_updates
+        )
+        self._published = AggregatorSnapshot(
+            0, dict(self.section_versions), ChunkedMap(), ChunkedMap(), self.kpis.as_dict(),
+            {"trains": (0, None), "stations": (0, None)},
+        )
+        self._unpublished = 0
+        # Monotonic time of the oldest change not yet in the published snapshot
+        self._dirty_since = 0.0
 
     def update(self, event: Event) -> None:
         with self.lock:
-            self.window.append((event.ts, event))
+            self.version = self._next_version()
             if isinstance(event, TrainEvent):
-                self.trains[event.train_id] = event
+                self.section_versions["trains"] = self.version
+                self.train_changes.touch(event.train_id, self.version)
+                old = self.trains.kpi_row(event.train_id)
+                self.trains.upsert(event)
+                if self.spatial is not None:
+                    self.spatial.move(event.train_id, *event.location)
+                if self.index is not None:
+                    self.index.update(event.train_id, event_key(event))
+                self.boards.move(event.train_id, event.next_station, self.version)
+                self.kpis.apply_train(old, (event.delay_min, event.speed_kmph, event.passenger_count))
+                if self.rollups:
+                    self.rollups["trains"].add(
+                        event.train_id, event.ts.timestamp(), (event.delay_min, event.passenger_count)
+                    )
+                if self.sketches is not None:
+                    self.sketches.add_trains((event.ts.timestamp(),), (event.delay_min,))
+                if self.trajectories is not None:
+                    self.trajectories.append(
+                        event.train_id, event.ts.timestamp(), event.location[0], event.location[1],
+                        event.speed_kmph, event.delay_min, event.passenger_count,
+                    )
             elif isinstance(event, StationEvent):
+                self.section_versions["stations"] = self.version
+                self.station_changes.touch(event.station_id, self.version)
+                prev = self.stations.get(event.station_id)
                 self.stations[event.station_id] = event
+                self.kpis.apply_station(
+                    prev.platform_occupancy if prev is not None else None, event.platform_occupancy
+                )
+                if self.rollups:
+                    self.rollups["stations"].add(
+                        event.station_id, event.ts.timestamp(), (event.platform_occupancy, event.avg_wait_min)
+                    )
+                if self.sketches is not None:
+                    self.sketches.add_stations((event.ts.timestamp(),), (event.station_id,), (event.avg_wait_min,))
+            self._updates_since_resync += 1
+            if self.kpi_resync_interval and self._updates_since_resync >= self.kpi_resync_interval:
+                self.resync_kpis()
+            self._changed()
 
-    def compute_stats(self) -> Dict:
+    def update_many(self, events: Sequence[Event]) -> None:
+        """Apply a batch under one lock acquisition.
+
+        Ends in the same state, versions and KPIs as ``update`` per event, but
+        the stores and running KPIs are touched once per train/station, with
+        the last event of the batch for each. Rollups and sketches take every event.
+        """
+        if not events:
+            return
         with self.lock:
-            trains_list: List[TrainEvent] = list(self.trains.values())
-            stations_list: List[StationEvent] = list(self.stations.values())
-            trains_active = len(trains_list)
-            avg_delay = mean([t.delay_min for t in trains_list]) if trains_list else 0.0
-            avg_speed = mean([t.speed_kmph for t in trains_list]) if trains_list else 0.0
-            total_passengers = sum([t.passenger_count for t in trains_list])
-            crowded_stations = sum([1 for s in stations_list if s.platform_occupancy > 350])
-            missed_stops = 0  # Placeholder for advanced logic
-            on_time_percent = (
-                100.0
-                * (
-                    sum(1 for t in trains_list if not t.is_delayed) / trains_active
-                    if trains_active
-                    else 0.0
+            latest_trains: Dict[str, Tuple[int, TrainEvent]] = {}
+            latest_stations: Dict[str, Tuple[int, StationEvent]] = {}
+            for event in events:
+                self.version = self._next_version()
+                if isinstance(event, TrainEvent):
+                    latest_trains[event.train_id] = (self.version, event)
+                elif isinstance(event, StationEvent):
+                    latest_stations[event.station_id] = (self.version, event)
+            if latest_trains:
+                # Change logs must be touched in version order to stay a sorted suffix
+                trains = sorted(latest_trains.values(), key=lambda pair: pair[0])
+                self.section_versions["trains"] = trains[-1][0]
+                old_rows = [self.trains.kpi_row(event.train_id) for _, event in trains]
+                self.trains.upsert_many([event for _, event in trains])
+                if self.spatial is not None:
+                    self.spatial.move_many(
+                        [event.train_id for _, event in trains],
+                        [event.location[0] for _, event in trains],
+                        [event.location[1] for _, event in trains],
+                    )
+                if self.index is not None:
+                    self.index.update_many([(event.train_id, event_key(event)) for _, event in trains])
+                self.boards.move_many([(event.train_id, event.next_station, version) for version, event in trains])
+                for old, (version, event) in zip(old_rows, trains):
+                    self.train_changes.touch(event.train_id, version)
+                    self.kpis.apply_train(old, (event.delay_min, event.speed_kmph, event.passenger_count))
+            if latest_stations:
+                stations = sorted(latest_stations.values(), key=lambda pair: pair[0])
+                self.section_versions["stations"] = stations[-1][0]
+                for version, event in stations:
+                    self.station_changes.touch(event.station_id, version)
+                    prev = self.stations.get(event.station_id)
+                    self.stations[event.station_id] = event
+                    self.kpis.apply_station(
+                        prev.platform_occupancy if prev is not None else None, event.platform_occupancy
+                    )
+            if self.rollups or self.sketches is not None or self.trajectories is not None:
+                self._record_history(events)
+            self._updates_since_resync += len(events)
+            if self.kpi_resync_interval and self._updates_since_resync >= self.kpi_resync_interval:
+                self.resync_kpis()
+            self._changed(len(events))
+
+    def _record_history(self, events: Sequence[Event]) -> None:
+        # One pass: a failing isinstance against a pydantic model class is slow
+        trains: List[TrainEvent] = []
+        stations: List[StationEvent] = []
+        for e in events:
+            (trains if isinstance(e, TrainEvent) else stations).append(e)  # type: ignore[arg-type]
+        if trains:
+            ts = [e.ts.timestamp() for e in trains]
+            if self.rollups:
+                self.rollups["trains"].add_many(
+                    [e.train_id for e in trains], ts, [(e.delay_min, e.passenger_count) for e in trains]
                 )
+            if self.sketches is not None:
+                self.sketches.add_trains(ts, [e.delay_min for e in trains])
+            if self.trajectories is not None:
+                self.trajectories.append_many(
+                    [e.train_id for e in trains],
+                    ts,
+                    [e.location[0] for e in trains],
+                    [e.location[1] for e in trains],
+                    [e.speed_kmph for e in trains],
+                    [e.delay_min for e in trains],
+                    [e.passenger_count for e in trains],
+                )
+        if stations:
+            ts = [e.ts.timestamp() for e in stations]
+            station_ids = [e.station_id for e in stations]
+            if self.rollups:
+                self.rollups["stations"].add_many(
+                    station_ids, ts, [(e.platform_occupancy, e.avg_wait_min) for e in stations]
+                )
+            if self.sketches is not None:
+                self.sketches.add_stations(ts, station_ids, [e.avg_wait_min for e in stations])
+
+    def rollup_raw(
+        self, name: str, entity_id: str, window_seconds: float, series: bool = False, now: Optional[float] = None
+    ) -> Optional[Dict]:
+        store = self.rollups.get(name)
+        return store.query(entity_id, window_seconds, series, now) if store is not None else None
+
+    def rollup(self, name: str, entity_id: str, window_seconds: float, series: bool = False) -> Optional[Dict]:
+        """Recent count/sum/min/max/avg for a train, station or "fleet"; None if unknown."""
+        raw = self.rollup_raw(name, entity_id, window_seconds, series)
+        return format_rollup(raw) if raw is not None else None
+
+    def history(
+        self, train_id: str, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Optional[List[Dict]]:
+        """The train's recorded samples with ``start <= ts <= end`` (epoch seconds), oldest first.
+
+        None if history is disabled or the train was never recorded.
+        """
+        if self.trajectories is None:
+            return None
+        columns = self.trajectories.range(train_id, start, end)
+        return format_trajectory(columns) if columns is not None else None
+
+    def percentile_sketches(
+        self, station_id: Optional[str] = None, now: Optional[float] = None
+    ) -> Optional[Dict[str, DDSketch]]:
+        return self.sketches.sketches(station_id, now) if self.sketches is not None else None
+
+    def percentiles(self, station_id: Optional[str] = None) -> Optional[Dict]:
+        """p50/p95/p99 delay and wait fleet-wide, or one station's wait; None if disabled or unknown."""
+        sketches = self.percentile_sketches(station_id)
+        return format_percentiles(sketches, self.sketches.window_seconds) if sketches is not None else None
+
+    def trains_in_bbox(
+        self, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+    ) -> Optional[Tuple[int, List[Dict]]]:
+        """(version, records) of trains inside the box; None without a spatial index.
+
+        The index follows live positions; records come from the published
+        snapshot, so a train that moved since it was published may show its
+        previous location.
+        """
+        if self.spatial is None:
+            return None
+        ids = self.spatial.bbox(min_lat, min_lon, max_lat, max_lon)
+        snap = self.current()
+        return snap.section_versions["trains"], [snap.trains[t] for t in ids if t in snap.trains]
+
+    def nearest_trains(self, lat: float, lon: float, k: int) -> Optional[Tuple[int, List[Dict]]]:
+        """(version, records with "distance_km") of the k trains nearest (lat, lon); None without an index."""
+        if self.spatial is None:
+            return None
+        return nearest_records(self.current(), self.spatial.nearest(lat, lon, k))
+
+    def query_trains(self, filters: Dict[str, object]) -> Tuple[int, List[Dict]]:
+        """(version, records) of trains matching every ``field: value`` in ``filters`` (see INDEX_FIELDS).
+
+        With the secondary indexes this costs O(matches); records come from
+        the published snapshot, like ``trains_in_bbox``.
+        """
+        # Per match, a lookup costs about twice what a scan pays per train
+        if self.index is None or not filters or self.index.candidates(filters) * 2 > len(self.index):
+            snap = self.current()
+            return snap.section_versions["trains"], filter_records(snap.trains.values(), filters)
+        return indexed_records(self.current(), self.index.lookup(filters), filters)
+
+    def incoming_trains(self, station_id: str) -> Optional[Tuple[int, List[Dict]]]:
+        """(version, trains heading to the station with ETAs, soonest first); None for unknown stations.
+
+        Cached per station until one of its incoming trains updates.
+        """
+        snap = self.current()
+
+        def records() -> List[Dict]:
+            ids = self.index.lookup({"next_station": station_id}) if self.index is not None else None
+            return heading_records(snap, station_id, ids)
+
+        return self.boards.board(station_id, snap.version, snap.section_versions["trains"], records)
+
+    def remove_train(self, train_id: str) -> bool:
+        with self.lock:
+            old = self.trains.kpi_row(train_id)
+            if old is None:
+                return False
+            self.trains.remove(train_id)
+            if self.spatial is not None:
+                self.spatial.remove(train_id)
+            if self.index is not None:
+                self.index.remove(train_id)
+            self.kpis.apply_train(old, None)
+            self.version = self._next_version()
+            self.section_versions["trains"] = self.version
+            self.train_changes.remove(train_id, self.version)
+            self.boards.remove(train_id, self.version)
+            if self.trajectories is not None:
+                self.trajectories.remove(train_id)
+            if self.rollups:
+                self.rollups["trains"].remove(train_id)
+            self._changed()
+            return True
+
+    def remove_station(self, station_id: str) -> bool:
+        with self.lock:
+            prev = self.stations.pop(station_id, None)
+            if prev is None:
+                return False
+            self.kpis.apply_station(prev.platform_occupancy, None)
+            self.version = self._next_version()
+            self.section_versions["stations"] = self.version
+            self.station_changes.remove(station_id, self.version)
+            if self.rollups:
+                self.rollups["stations"].remove(station_id)
+            self._changed()
+            return True
+
+    def _changed(self, updates: int = 1) -> None:
+        # Called with the lock held after every version bump (or batch of them)
+        if not self._unpublished:
+            self._dirty_since = time.monotonic()
+        self._unpublished += updates
+        if (self.snapshot_every_updates and self._unpublished >= self.snapshot_every_updates) or (
+            self.snapshot_interval_seconds and time.monotonic() - self._dirty_since >= self.snapshot_interval_seconds
+        ):
+            self.publish()
+
+    def publish(self) -> AggregatorSnapshot:
+        """Build a snapshot of the current state and swap it in.
+
+        Only entities changed since the previous snapshot are re-serialized,
+        and only the chunks holding them are copied; the rest are shared with it.
+        """
+        with self.lock:
+            prev = self._published
+            if prev.version == self.version:
+                return prev
+            trains, stations = prev.trains, prev.stations
+            changes = dict(prev.changes)  # type: ignore[arg-type]
+            if self.section_versions["trains"] > prev.section_versions["trains"]:
+                trains, changes["trains"] = self._patched(
+                    prev, "trains", self.train_changes, self.trains, self.trains.records_for
+                )
+            if self.section_versions["stations"] > prev.section_versions["stations"]:
+                stations, changes["stations"] = self._patched(
+                    prev, "stations", self.station_changes, self.stations,
+                    lambda ids: [self.stations[k].model_dump() for k in ids],
+                )
+            snap = AggregatorSnapshot(
+                self.version, dict(self.section_versions), trains, stations, self.kpis.as_dict(), changes
+            )
+            self._published = snap
+            self._unpublished = 0
+            return snap
+
+    def _patched(
+        self,
+        prev: AggregatorSnapshot,
+        name: str,
+        changes: ChangeLog,
+        live: Iterable[str],
+        records_for: Callable[[List[str]], List[Dict]],
+    ) -> Tuple[ChunkedMap, Tuple[int, Optional[ChangeStep]]]:
+        base: ChunkedMap = prev.trains if name == "trains" else prev.stations  # type: ignore[assignment]
+        entries = changes.entries_since(prev.version)
+        if entries is None:
+            # Removal history was pruned past the previous snapshot: rebuild the section,
+            # and its delta history starts over from this version
+            keys = list(live)
+            return ChunkedMap.from_items(zip(keys, records_for(keys))), (self.version, None)
+        changed, removed = entries
+        floor, head = prev.changes[name]  # type: ignore[index]
+        # The first step of a chain covers everything since its floor
+        step = extend_history(head, prev.version if head is not None else floor, self.version, changed, removed)
+        keys = [k for k, _ in changed]
+        # Never a full copy under the writer lock: only chunks with changed keys are copied
+        return base.patched(zip(keys, records_for(keys)), [k for k, _ in removed]), (floor, step)
+
+    @property
+    def published(self) -> AggregatorSnapshot:
+        """The published snapshot as is, never refreshed."""
+        return self._published
+
+    def current(self) -> AggregatorSnapshot:
+        """The published snapshot; refreshed here only if that needs no waiting."""
+        snap = self._published
+        if snap.version != self.version and time.monotonic() - self._dirty_since >= self.snapshot_interval_seconds:
+            if self.lock.acquire(blocking=False):
+                try:
+                    snap = self.publish()
+                finally:
+                    self.lock.release()
+        return snap
+
+    def staleness(self) -> Dict[str, float]:
+        """How far the published snapshot trails the live state."""
+        snap = self._published
+        behind = self._unpublished
+        return {
+            "version": snap.version,
+            "versions_behind": behind,
+            "age_seconds": round(time.monotonic() - self._dirty_since, 3) if behind else 0.0,
+        }
+
+    def scan_kpis(self) -> Dict[str, float]:
+        """Recompute the running KPI totals from scratch (O(fleet))."""
+        with self.lock:
+            kpis = dict(self.trains.kpis())
+            kpis["crowded_stations"] = sum(
+                1 for s in self.stations.values() if s.platform_occupancy > CROWDED_OCCUPANCY
             )
-            return {
-                "ts": datetime.now(timezone.utc).isoformat(),
-                "trains_active": trains_active,
-                "avg_delay_min": round(avg_delay, 2),
-                "avg_speed_kmph": round(avg_speed, 2),
-                "passengers_total": total_passengers,
-                "crowded_stations": crowded_stations,
-                "missed_stops": missed_stops,
-                "on_time_percent": round(on_time_percent, 2),
-            }
+            return kpis
+
+    def resync_kpis(self) -> None:
+        with self.lock:
+            self.kpis.resync(self.trains.kpis(), (s.platform_occupancy for s in self.stations.values()))
+            self._updates_since_resync = 0
+
+    def compute_stats(self, full_scan: bool = False, now: Optional[datetime] = None) -> Dict:
+        stats = format_stats(self.scan_kpis() if full_scan else self.current().kpis, now)
+        return with_percentiles(stats, self.percentiles())
 
     def snapshot(self) -> Dict:
+        snap = self.current()
+        return {"trains": snap.records("trains"), "stations": snap.records("stations")}
+
+    def section(self, name: str) -> Tuple[int, List[Dict]]:
+        """Return ("trains" or "stations") records with the version they reflect."""
+        snap = self.current()
+        return snap.section_versions[name], snap.records(name)
+
+    def live_records(self, name: str) -> List[Dict]:
+        """Current records of a section, bypassing the published snapshot."""
         with self.lock:
-            return {
-                "trains": [t.model_dump() for t in self.trains.values()],
-                "stations": [s.model_dump() for s in self.stations.values()],
-            }
+            if name == "trains":
+                return self.trains.records()
+            return [s.model_dump() for s in self.stations.values()]
+
+    def delta(self, name: str, since: int) -> Dict:
+        """Entities of a section changed or removed after version ``since``.
 
+        Served from the published snapshot and the change history it carries,
+        never under the writer lock; see AggregatorSnapshot.delta.
+        """
+        return self.current().delta(name, since)
@@ -0,0 +1,16 @@
+from typing import List
+
+import numpy as np
+
+
+def slot_rounds(slots: np.ndarray) -> List[np.ndarray]:
+    """Split batch rows into rounds with at most one row per slot, keeping each slot's rows in order."""
+    if len(np.unique(slots)) == len(slots):
+        return [np.arange(len(slots))]
+    order = np.argsort(slots, kind="stable")
+    ordered = slots[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    # Position of each row among the rows of its slot
+    rank = np.empty(len(slots), dtype=np.int64)
+    rank[order] = np.arange(len(slots)) - np.repeat(starts, np.diff(np.r_[starts, len(slots)]))
+    return [np.flatnonzero(rank == r) for r in range(int(rank.max()) + 1)]
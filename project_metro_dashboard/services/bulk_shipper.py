@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from services.metrics_exporter import (
+    es_buffer_docs,
+    es_bulk_batch_docs,
+    es_bulk_flush_seconds,
+    es_docs_dropped,
+    es_docs_shipped,
+)
+
+
+logger = logging.getLogger("bulk_shipper")
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+# Per-item _bulk statuses worth retrying; anything else is a permanent rejection
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+DeadLetter = Callable[[str, List[Dict[str, Any]]], None]
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class BulkShipper:
+    """Buffers documents per index and ships them with the _bulk API from a worker thread.
+
+    An index is flushed once it holds ``max_docs`` documents, and every index is
+    flushed at least every ``flush_seconds``. Items that fail with a retryable
+    status are resent with exponential backoff; documents that still fail after
+    ``max_retries`` go to ``dead_letter`` if one is set, otherwise they are dropped.
+
+    The ``block`` policy only waits in plain threads; called from a running
+    event loop it drops the new document instead of stalling the loop.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        max_docs: int = 500,
+        flush_seconds: float = 1.0,
+        buffer_max: int = 50000,
+        overflow_policy: str = "drop_oldest",
+        max_retries: int = 3,
+        retry_backoff_seconds: float = 0.5,
+        block_timeout_seconds: float = 1.0,
+        dead_letter: Optional[DeadLetter] = None,
+    ) -> None:
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy!r}")
+        self.client = client
+        self.max_docs = max_docs
+        self.flush_seconds = flush_seconds
+        self.buffer_max = buffer_max
+        self.overflow_policy = overflow_policy
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.block_timeout_seconds = block_timeout_seconds
+        self.dead_letter = dead_letter
+        self._buffers: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._buffered = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def buffered(self) -> int:
+        return self._buffered
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="es-bulk-shipper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def submit(self, index: str, doc: Dict[str, Any]) -> bool:
+        """Queue a document; returns False if the overflow policy dropped it."""
+        with self._cond:
+            if self._buffered >= self.buffer_max:
+                if self.overflow_policy == "drop_newest":
+                    es_docs_dropped.labels(reason="overflow").inc()
+                    return False
+                if self.overflow_policy == "drop_oldest":
+                    victim = self._buffers.get(index) or max(self._buffers.values(), key=len)
+                    victim.popleft()
+                    self._buffered -= 1
+                    es_docs_dropped.labels(reason="overflow").inc()
+                elif _on_event_loop():
+                    es_docs_dropped.labels(reason="overflow").inc()
+                    return False
+                else:
+                    self._cond.notify_all()
+                    deadline = time.monotonic() + self.block_timeout_seconds
+                    while self._buffered >= self.buffer_max:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._cond.wait(remaining):
+                            es_docs_dropped.labels(reason="overflow").inc()
+                            return False
+            buf = self._buffers.get(index)
+            if buf is None:
+                buf = self._buffers[index] = deque()
+            buf.append(doc)
+            self._buffered += 1
+            es_buffer_docs.set(self._buffered)
+            if len(buf) >= self.max_docs:
+                self._cond.notify_all()
+        return True
+
+    def flush(self) -> None:
+        """Synchronously ship everything currently buffered."""
+        while True:
+            batches = self._take(force=True)
+            if not batches:
+                return
+            for index, docs in batches:
+                self._ship(index, docs)
+
+    def _take(self, force: bool) -> List[Tuple[str, List[Dict[str, Any]]]]:
+        with self._cond:
+            batches = []
+            for index, buf in self._buffers.items():
+                if buf and (force or len(buf) >= self.max_docs):
+                    n = min(len(buf), self.max_docs)
+                    batches.append((index, [buf.popleft() for _ in range(n)]))
+                    self._buffered -= n
+            if batches:
+                es_buffer_docs.set(self._buffered)
+                self._cond.notify_all()
+            return batches
+
+    def _run(self) -> None:
+        next_flush = time.monotonic() + self.flush_seconds
+        while not self._stop.is_set():
+            with self._cond:
+                if not any(len(b) >= self.max_docs for b in self._buffers.values()):
+                    self._cond.wait(max(0.0, next_flush - time.monotonic()))
+            if self._stop.is_set():
+                break
+            due = time.monotonic() >= next_flush
+            if due:
+                next_flush = time.monotonic() + self.flush_seconds
+            for index, docs in self._take(force=due):
+                self._ship(index, docs)
+
+    def _ship(self, index: str, docs: List[Dict[str, Any]]) -> None:
+        pending = docs
+        attempt = 0
+        while pending:
+            failed: List[Dict[str, Any]] = []
+            operations: List[Dict[str, Any]] = []
+            for doc in pending:
+                operations.append({"index": {}})
+                operations.append(doc)
+            es_bulk_batch_docs.observe(len(pending))
+            start = time.perf_counter()
+            try:
+                resp = self.client.bulk(index=index, operations=operations)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Bulk request to index=%s failed: %s", index, exc)
+                failed = pending
+            else:
+                es_bulk_flush_seconds.observe(time.perf_counter() - start)
+                rejected = 0
+                if resp.get("errors"):
+                    for doc, item in zip(pending, resp["items"]):
+                        status = next(iter(item.values())).get("status", 500)
+                        if status < 300:
+                            continue
+                        if status in RETRYABLE_STATUSES:
+                            failed.append(doc)
+                        else:
+                            rejected += 1
+                if rejected:
+                    logger.warning("Elasticsearch rejected %d docs for index=%s", rejected, index)
+                    es_docs_dropped.labels(reason="rejected").inc(rejected)
+                es_docs_shipped.labels(index=index).inc(len(pending) - len(failed) - rejected)
+            if not failed:
+                return
+            attempt += 1
+            if attempt > self.max_retries:
+                if self.dead_letter is not None:
+                    self.dead_letter(index, failed)
+                else:
+                    es_docs_dropped.labels(reason="retries_exhausted").inc(len(failed))
+                return
+            # Backoff is cut short on shutdown; the final flush retries without waiting
+            self._stop.wait(self.retry_backoff_seconds * 2 ** (attempt - 1))
+            pending = failed
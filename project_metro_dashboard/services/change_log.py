@@ -0,0 +1,144 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class ChangeLog:
+    """Per-entity last-change versions, kept in change order for delta queries.
+
+    Entities are moved to the end whenever they change, so everything that
+    changed after a cursor is a suffix of the ordering and ``changed_since``
+    costs O(changes) rather than O(entities). Removals are remembered as
+    tombstones up to ``max_tombstones``; a cursor older than the newest pruned
+    tombstone can no longer be served incrementally.
+    """
+
+    def __init__(self, max_tombstones: int = 10000) -> None:
+        self.max_tombstones = max_tombstones
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._removed: "OrderedDict[str, int]" = OrderedDict()
+        self._floor = 0
+
+    def touch(self, key: str, version: int) -> None:
+        self._versions[key] = version
+        self._versions.move_to_end(key)
+        self._removed.pop(key, None)
+
+    def remove(self, key: str, version: int) -> None:
+        self._versions.pop(key, None)
+        self._removed[key] = version
+        self._removed.move_to_end(key)
+        while len(self._removed) > self.max_tombstones:
+            _, pruned = self._removed.popitem(last=False)
+            self._floor = max(self._floor, pruned)
+
+    def version_of(self, key: str) -> Optional[int]:
+        return self._versions.get(key)
+
+    def changed_since(self, since: int) -> Optional[Tuple[List[str], List[str]]]:
+        """(changed keys, removed keys) after ``since``, or None if a full resync is needed."""
+        entries = self.entries_since(since)
+        if entries is None:
+            return None
+        changed, removed = entries
+        return [key for key, _ in changed], [key for key, _ in removed]
+
+    def entries_since(self, since: int) -> Optional[Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]]:
+        """Like ``changed_since`` but with each key's change version, oldest first."""
+        if since < self._floor:
+            return None
+        changed: List[Tuple[str, int]] = []
+        for key, version in reversed(self._versions.items()):
+            if version <= since:
+                break
+            changed.append((key, version))
+        removed: List[Tuple[str, int]] = []
+        for key, version in reversed(self._removed.items()):
+            if version <= since:
+                break
+            removed.append((key, version))
+        changed.reverse()
+        removed.reverse()
+        return changed, removed
+
+
+class ChangeStep:
+    """What one snapshot publish changed in a section, linked to the previous publish.
+
+    Every published snapshot holds the newest step of each section, so a
+    delta walks back over immutable steps from the snapshot instead of
+    querying the live ChangeLog under the writer lock. Once the chain holds
+    more than ``HISTORY_MAX_ENTRIES`` entries the older end is cut off; a walk
+    that runs out before reaching its cursor needs a full resync.
+    """
+
+    __slots__ = ("base", "version", "changed", "removed", "reachable", "prev")
+
+    def __init__(
+        self,
+        base: int,
+        version: int,
+        changed: List[Tuple[str, int]],
+        removed: List[Tuple[str, int]],
+        prev: Optional["ChangeStep"],
+    ) -> None:
+        # Covers changes with base < version <= self.version
+        self.base = base
+        self.version = version
+        self.changed = changed
+        self.removed = removed
+        self.prev = prev
+        # Entries reachable from this step, an upper bound once the chain was cut
+        self.reachable = len(changed) + len(removed) + (prev.reachable if prev is not None else 0)
+
+
+# Changed/removed entries kept reachable behind the newest published step, per section
+HISTORY_MAX_ENTRIES = 10000
+
+
+def extend_history(
+    head: Optional[ChangeStep],
+    base: int,
+    version: int,
+    changed: List[Tuple[str, int]],
+    removed: List[Tuple[str, int]],
+    max_entries: Optional[int] = None,
+) -> ChangeStep:
+    max_entries = HISTORY_MAX_ENTRIES if max_entries is None else max_entries
+    step = ChangeStep(base, version, changed, removed, head)
+    if step.reachable > 2 * max_entries:
+        # Amortized: walk and cut only once the chain has doubled past the budget
+        kept, node = 0, step
+        while node.prev is not None and kept + len(node.changed) + len(node.removed) <= max_entries:
+            kept += len(node.changed) + len(node.removed)
+            node = node.prev
+        node.prev = None
+        step.reachable = kept + len(node.changed) + len(node.removed)
+    return step
+
+
+def changes_after(
+    head: Optional[ChangeStep], floor: int, since: int
+) -> Optional[Tuple[List[str], List[str]]]:
+    """(changed keys, removed keys) after ``since`` in change order; None if history does not reach back.
+
+    ``floor`` is the version the chain starts from when ``head`` is None.
+    A key may be in both lists; the snapshot decides which one holds.
+    """
+    if head is None:
+        return ([], []) if since >= floor else None
+    changed: Dict[str, int] = {}
+    removed: Dict[str, int] = {}
+    node: Optional[ChangeStep] = head
+    last = head
+    while node is not None and node.version > since:
+        # Newest step first, so the first version seen for a key is its latest
+        for key, version in node.changed:
+            if version > since and key not in changed:
+                changed[key] = version
+        for key, version in node.removed:
+            if version > since and key not in removed:
+                removed[key] = version
+        last, node = node, node.prev
+    if node is None and last.base > since:
+        return None
+    return sorted(changed, key=changed.__getitem__), sorted(removed, key=removed.__getitem__)
@@ -0,0 +1,99 @@
+from collections.abc import ItemsView, Mapping, ValuesView
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Entries per chunk: publishing copies one chunk per touched chunk instead of the whole section
+CHUNK_SIZE = 512
+
+
+class _Values(ValuesView):
+    def __iter__(self) -> Iterator[Any]:
+        return chain.from_iterable(chunk.values() for chunk in self._mapping._chunks)
+
+
+class _Items(ItemsView):
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        return chain.from_iterable(chunk.items() for chunk in self._mapping._chunks)
+
+
+class ChunkedMap(Mapping):
+    """Immutable, insertion-ordered mapping kept as a list of small dicts.
+
+    ``patched`` returns a new map sharing every chunk that holds no changed or
+    removed key, so republishing ``k`` changes copies at most ``k`` chunks
+    rather than the whole mapping. The key -> chunk directory is only copied
+    when keys are added or removed. Iteration order matches the dict this
+    replaces: updated keys keep their place and new keys go last.
+    """
+
+    __slots__ = ("_chunks", "_where")
+
+    def __init__(self, chunks: Optional[List[Dict[str, Any]]] = None, where: Optional[Dict[str, int]] = None) -> None:
+        self._chunks: List[Dict[str, Any]] = chunks if chunks is not None else []
+        self._where: Dict[str, int] = (
+            where if where is not None else {key: i for i, chunk in enumerate(self._chunks) for key in chunk}
+        )
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[str, Any]]) -> "ChunkedMap":
+        data = dict(items)
+        keys = list(data)
+        chunks = [{key: data[key] for key in keys[i : i + CHUNK_SIZE]} for i in range(0, len(keys), CHUNK_SIZE)]
+        return cls(chunks)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._chunks[self._where[key]][key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        i = self._where.get(key)
+        return default if i is None else self._chunks[i][key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._where
+
+    def __iter__(self) -> Iterator[str]:
+        return chain.from_iterable(self._chunks)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def values(self) -> ValuesView:
+        return _Values(self)
+
+    def items(self) -> ItemsView:
+        return _Items(self)
+
+    def patched(self, changed: Iterable[Tuple[str, Any]], removed: Iterable[str] = ()) -> "ChunkedMap":
+        """A copy with ``removed`` keys dropped, then ``changed`` keys set."""
+        chunks = list(self._chunks)
+        where = self._where
+        copied = set()
+
+        def writable(i: int) -> Dict[str, Any]:
+            if i not in copied:
+                chunks[i] = dict(chunks[i])
+                copied.add(i)
+            return chunks[i]
+
+        for key in removed:
+            i = where.get(key)
+            if i is None:
+                continue
+            if where is self._where:
+                where = dict(where)
+            del where[key]
+            del writable(i)[key]
+        for key, value in changed:
+            i = where.get(key)
+            if i is None:
+                if where is self._where:
+                    where = dict(where)
+                if not chunks or len(chunks[-1]) >= CHUNK_SIZE:
+                    chunks.append({})
+                    copied.add(len(chunks) - 1)
+                i = where[key] = len(chunks) - 1
+            writable(i)[key] = value
+        if len(chunks) > 2 * (len(where) // CHUNK_SIZE + 1):
+            # Removals left mostly empty chunks behind: repack (rare, O(n))
+            return ChunkedMap.from_items(chain.from_iterable(chunk.items() for chunk in chunks))
+        return ChunkedMap(chunks, where)
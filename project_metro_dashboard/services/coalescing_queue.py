@@ -0,0 +1,121 @@
+import asyncio
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Union
+
+from models.station_event import StationEvent
+from models.train_event import TrainEvent
+from services.metrics_exporter import ingest_events_coalesced, ingest_events_dropped, ingest_queue_depth
+
+
+Event = Union[TrainEvent, StationEvent]
+
+OVERFLOW_POLICIES = ("block", "drop_newest")
+
+
+def coalesce_key(event: Event) -> Hashable:
+    if isinstance(event, TrainEvent):
+        return ("train", event.train_id)
+    return ("station", event.station_id)
+
+
+class CoalescingQueue:
+    """Ingest queue holding at most one pending event per train/station.
+
+    A put for an id that is already waiting replaces that event in place
+    unless the waiting one has a later ``ts``: the newer state keeps the older
+    event's position, so no id waits longer than
+    one pass over the queue and a slow consumer only ever sees the latest
+    position. ``maxsize`` bounds distinct ids; once reached, a put for a new id
+    waits (``block``) or is discarded (``drop_newest``).
+
+    ``on_put`` sees every raw event before coalescing, which is where the
+    Elasticsearch/event log archive hooks in when it must keep all of them.
+    Implements the parts of the asyncio.Queue API the pipeline uses, including
+    ``task_done``/``join`` (replaced events never count as unfinished).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        overflow_policy: str = "block",
+        on_put: Optional[Callable[[Event], None]] = None,
+        key: Callable[[Event], Hashable] = coalesce_key,
+    ) -> None:
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}")
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+        self.on_put = on_put
+        self.key = key
+        self.coalesced = 0
+        self.dropped = 0
+        self._pending: "OrderedDict[Hashable, Event]" = OrderedDict()
+        self._unfinished = 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def qsize(self) -> int:
+        return len(self._pending)
+
+    def empty(self) -> bool:
+        return not self._pending
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= len(self._pending)
+
+    def put_nowait(self, event: Event) -> None:
+        """Queue or merge ``event``; raises asyncio.QueueFull only under the block policy."""
+        k = self.key(event)
+        if k not in self._pending and self.full() and self.overflow_policy == "block":
+            raise asyncio.QueueFull
+        if self.on_put is not None:
+            self.on_put(event)
+        if k in self._pending:
+            if event.ts >= self._pending[k].ts:
+                self._pending[k] = event
+            self.coalesced += 1
+            ingest_events_coalesced.inc()
+            return
+        if self.full():
+            self.dropped += 1
+            ingest_events_dropped.inc()
+            return
+        self._pending[k] = event
+        self._unfinished += 1
+        self._finished.clear()
+        self._not_empty.set()
+        ingest_queue_depth.set(len(self._pending))
+
+    async def put(self, event: Event) -> None:
+        while self.overflow_policy == "block" and self.full() and self.key(event) not in self._pending:
+            self._not_full.clear()
+            await self._not_full.wait()
+        self.put_nowait(event)
+
+    def get_nowait(self) -> Event:
+        if not self._pending:
+            raise asyncio.QueueEmpty
+        _, event = self._pending.popitem(last=False)
+        self._not_full.set()
+        ingest_queue_depth.set(len(self._pending))
+        return event
+
+    async def get(self) -> Event:
+        while not self._pending:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def task_done(self) -> None:
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._finished.set()
+
+    async def join(self) -> None:
+        if self._unfinished:
+            await self._finished.wait()
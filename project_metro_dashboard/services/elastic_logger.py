@@ -1,41 +1,116 @@
 import json
 import logging
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from elasticsearch import Elasticsearch, ConnectionError as ESConnectionError
 
 from config import settings
+from services.bulk_shipper import BulkShipper
+from services.es_spool import DiskSpool, SpoolReplayer
+from services.ship_filter import ShipFilter, make_ship_filter
 
 
 logger = logging.getLogger("elastic_logger")
 
 
 class ElasticLogger:
-    def __init__(self, host: str, enabled: bool = True) -> None:
+    def __init__(
+        self,
+        host: str,
+        enabled: bool = True,
+        bulk: bool = False,
+        spool_dir: Optional[str] = None,
+        ship_filter: Optional[ShipFilter] = None,
+    ) -> None:
         self.enabled = enabled
+        # Deadband/sampling in front of everything below; None ships every document
+        self.ship_filter = ship_filter
         self.client: Optional[Elasticsearch] = None
+        self.shipper: Optional[BulkShipper] = None
+        self.spool: Optional[DiskSpool] = None
+        self.replayer: Optional[SpoolReplayer] = None
+        # False while ES is unreachable; documents then go to the spool (if any)
+        self.available = False
         if enabled:
             try:
                 self.client = Elasticsearch(hosts=[host])
                 # Ping to verify
                 self.client.info()
+                self.available = True
                 logger.info("Connected to Elasticsearch at %s", host)
             except Exception as exc:  # noqa: BLE001
                 logger.warning("Elasticsearch unavailable: %s", exc)
-                self.client = None
+                if spool_dir is None:
+                    self.client = None
+        if self.client is not None and spool_dir is not None:
+            self.spool = DiskSpool(
+                spool_dir, segment_max_bytes=settings.ES_SPOOL_SEGMENT_BYTES, max_bytes=settings.ES_SPOOL_MAX_BYTES
+            )
+            self.replayer = SpoolReplayer(
+                self.client,
+                self.spool,
+                on_health=self._set_available,
+                probe_seconds=settings.ES_SPOOL_PROBE_SECONDS,
+                docs_per_second=settings.ES_SPOOL_REPLAY_DOCS_PER_SEC,
+            )
+            self.replayer.start()
+        if self.client is not None and bulk:
+            self.shipper = BulkShipper(
+                self.client,
+                max_docs=settings.ES_BULK_MAX_DOCS,
+                flush_seconds=settings.ES_BULK_FLUSH_SECONDS,
+                buffer_max=settings.ES_BULK_BUFFER_MAX,
+                overflow_policy=settings.ES_BULK_OVERFLOW_POLICY,
+                max_retries=settings.ES_BULK_MAX_RETRIES,
+                dead_letter=self._spool_failed if self.spool is not None else None,
+            )
+            self.shipper.start()
+
+    def _set_available(self, healthy: bool) -> None:
+        if healthy and not self.available:
+            logger.info("Elasticsearch reachable again, replaying spool")
+        self.available = healthy
+
+    def _spool_failed(self, index: str, docs: List[Dict[str, Any]]) -> None:
+        self.available = False
+        if self.spool is not None:
+            self.spool.append_many(index, docs)
 
     def index(self, index: str, doc: Dict[str, Any]) -> None:
         if not self.enabled or self.client is None:
             return
+        if self.ship_filter is not None and not self.ship_filter.admit(index, doc):
+            return
+        if not self.available and self.spool is not None:
+            self.spool.append(index, doc)
+            return
+        if self.shipper is not None:
+            self.shipper.submit(index, doc)
+            return
         try:
             self.client.index(index=index, document=doc)
         except ESConnectionError:
             logger.warning("Failed to send doc to Elasticsearch index=%s", index)
+            self._spool_failed(index, [doc])
         except Exception as exc:  # noqa: BLE001
             logger.warning("Unexpected ES error: %s", exc)
 
+    def close(self) -> None:
+        if self.shipper is not None:
+            self.shipper.stop()
+        if self.replayer is not None:
+            self.replayer.stop()
+        if self.spool is not None:
+            self.spool.close()
+
 
 def make_es_logger() -> ElasticLogger:
-    return ElasticLogger(settings.ES_HOST, enabled=settings.ES_ENABLED)
+    return ElasticLogger(
+        settings.ES_HOST,
+        enabled=settings.ES_ENABLED,
+        bulk=settings.ES_BULK_ENABLED,
+        spool_dir=settings.ES_SPOOL_DIR if settings.ES_SPOOL_ENABLED else None,
+        ship_filter=make_ship_filter(),
+    )
 
@@ -0,0 +1,272 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.bulk_shipper import RETRYABLE_STATUSES
+from services.metrics_exporter import es_docs_dropped, es_docs_replayed, es_docs_spooled, es_spool_bytes
+
+
+logger = logging.getLogger("es_spool")
+
+SpoolEntry = Tuple[str, Dict[str, Any]]
+# (segment sequence number, byte offset inside that segment)
+Cursor = Tuple[int, int]
+
+_SEGMENT_PREFIX = "spool-"
+_SEGMENT_SUFFIX = ".ndjson"
+_CURSOR_FILE = "cursor.json"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class DiskSpool:
+    """Segmented append-only NDJSON spool for documents Elasticsearch could not take.
+
+    Writes go to the newest segment, which rotates once it reaches
+    ``segment_max_bytes``. When the spool grows past ``max_bytes`` the oldest
+    segment is discarded. The read cursor is persisted on ``commit`` so a restart
+    resumes replay where it left off; fully consumed segments are deleted.
+    """
+
+    def __init__(self, directory: str, segment_max_bytes: int = 16 * 1024 * 1024, max_bytes: int = 1024 ** 3) -> None:
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._sizes: Dict[int, int] = {}
+        for name in os.listdir(directory):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                seq = int(name[len(_SEGMENT_PREFIX) : -len(_SEGMENT_SUFFIX)])
+                self._sizes[seq] = os.path.getsize(self._path(seq))
+        self._cursor: Cursor = self._load_cursor()
+        # Always start a fresh segment so a torn line from a crash is never appended to
+        self._active_seq = max(self._sizes, default=0) + 1
+        self._sizes[self._active_seq] = 0
+        self._active = open(self._path(self._active_seq), "ab")
+        if self._cursor[0] not in self._sizes:
+            self._cursor = (min(self._sizes), 0)
+        es_spool_bytes.set(self.pending_bytes)
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{_SEGMENT_PREFIX}{seq:012d}{_SEGMENT_SUFFIX}")
+
+    def _load_cursor(self) -> Cursor:
+        try:
+            with open(os.path.join(self.directory, _CURSOR_FILE)) as fh:
+                data = json.load(fh)
+            return int(data["segment"]), int(data["offset"])
+        except (OSError, ValueError, KeyError):
+            return min(self._sizes, default=1), 0
+
+    def _save_cursor(self) -> None:
+        path = os.path.join(self.directory, _CURSOR_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"segment": self._cursor[0], "offset": self._cursor[1]}, fh)
+        os.replace(tmp, path)
+
+    @property
+    def cursor(self) -> Cursor:
+        return self._cursor
+
+    @property
+    def pending_bytes(self) -> int:
+        seq, offset = self._cursor
+        return sum(size for s, size in self._sizes.items() if s >= seq) - offset
+
+    def __bool__(self) -> bool:
+        return self.pending_bytes > 0
+
+    def append(self, index: str, doc: Dict[str, Any]) -> None:
+        self.append_many(index, [doc])
+
+    def append_many(self, index: str, docs: List[Dict[str, Any]]) -> None:
+        if not docs:
+            return
+        payload = b"".join(
+            json.dumps({"index": index, "doc": doc}, default=_json_default).encode() + b"\n" for doc in docs
+        )
+        with self._lock:
+            self._active.write(payload)
+            self._active.flush()
+            self._sizes[self._active_seq] += len(payload)
+            if self._sizes[self._active_seq] >= self.segment_max_bytes:
+                self._rotate()
+            self._enforce_cap()
+            es_spool_bytes.set(self.pending_bytes)
+        es_docs_spooled.inc(len(docs))
+
+    def _rotate(self) -> None:
+        self._active.close()
+        self._active_seq += 1
+        self._sizes[self._active_seq] = 0
+        self._active = open(self._path(self._active_seq), "ab")
+
+    def _enforce_cap(self) -> None:
+        while sum(self._sizes.values()) > self.max_bytes and len(self._sizes) > 1:
+            oldest = min(self._sizes)
+            offset = self._cursor[1] if self._cursor[0] == oldest else 0
+            if self._cursor[0] <= oldest:
+                with open(self._path(oldest), "rb") as fh:
+                    fh.seek(offset)
+                    lost = sum(1 for _ in fh)
+                logger.warning("ES spool over %d bytes, discarding %d docs", self.max_bytes, lost)
+                es_docs_dropped.labels(reason="spool_full").inc(lost)
+            self._delete_segment(oldest)
+            if self._cursor[0] <= oldest:
+                self._cursor = (min(self._sizes), 0)
+
+    def _delete_segment(self, seq: int) -> None:
+        del self._sizes[seq]
+        try:
+            os.remove(self._path(seq))
+        except FileNotFoundError:
+            pass
+
+    def read_batch(self, max_docs: int) -> Tuple[List[SpoolEntry], Cursor]:
+        """Read up to ``max_docs`` entries from the cursor without consuming them."""
+        entries: List[SpoolEntry] = []
+        with self._lock:
+            seq, offset = self._cursor
+            while len(entries) < max_docs and seq in self._sizes:
+                with open(self._path(seq), "rb") as fh:
+                    fh.seek(offset)
+                    while len(entries) < max_docs:
+                        line = fh.readline()
+                        if not line.endswith(b"\n"):
+                            break  # EOF, or a torn write left by a crash
+                        offset += len(line)
+                        try:
+                            record = json.loads(line)
+                            entries.append((record["index"], record["doc"]))
+                        except (ValueError, KeyError):
+                            logger.warning("Skipping corrupt spool record in segment %d", seq)
+                            es_docs_dropped.labels(reason="corrupt").inc()
+                if len(entries) < max_docs and seq != self._active_seq:
+                    if line:
+                        # Only a crash leaves an unterminated line, and nothing follows it in a closed segment
+                        logger.warning("Skipping %d torn bytes at the end of spool segment %d", len(line), seq)
+                        es_docs_dropped.labels(reason="corrupt").inc()
+                    seq, offset = seq + 1, 0
+                else:
+                    break
+        return entries, (seq, offset)
+
+    def commit(self, cursor: Cursor) -> None:
+        with self._lock:
+            for seq in [s for s in self._sizes if s < cursor[0]]:
+                self._delete_segment(seq)
+            self._cursor = cursor
+            self._save_cursor()
+            es_spool_bytes.set(self.pending_bytes)
+
+    def close(self) -> None:
+        with self._lock:
+            self._active.close()
+
+
+class SpoolReplayer:
+    """Probes Elasticsearch and drains a DiskSpool into it at a bounded rate.
+
+    ``on_health`` is called with the result of every probe so the owner can
+    switch between spooling and live shipping.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        spool: DiskSpool,
+        on_health: Optional[Callable[[bool], None]] = None,
+        probe_seconds: float = 5.0,
+        docs_per_second: float = 1000.0,
+        batch_docs: int = 500,
+    ) -> None:
+        self.client = client
+        self.spool = spool
+        self.on_health = on_health
+        self.probe_seconds = probe_seconds
+        self.docs_per_second = docs_per_second
+        self.batch_docs = batch_docs
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="es-spool-replayer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def probe(self) -> bool:
+        try:
+            healthy = bool(self.client.ping())
+        except Exception:  # noqa: BLE001
+            healthy = False
+        if self.on_health is not None:
+            self.on_health(healthy)
+        return healthy
+
+    def replay_once(self) -> int:
+        """Ship one batch from the spool; returns docs replayed, or -1 if ES failed."""
+        entries, cursor = self.spool.read_batch(self.batch_docs)
+        if not entries:
+            # Only torn or corrupt bytes were read: move past them so replay can finish
+            if cursor != self.spool.cursor:
+                self.spool.commit(cursor)
+            return 0
+        operations: List[Dict[str, Any]] = []
+        for index, doc in entries:
+            operations.append({"index": {"_index": index}})
+            operations.append(doc)
+        try:
+            resp = self.client.bulk(operations=operations)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Spool replay failed: %s", exc)
+            return -1
+        retry: Dict[str, List[Dict[str, Any]]] = {}
+        rejected = 0
+        if resp.get("errors"):
+            for (index, doc), item in zip(entries, resp["items"]):
+                status = next(iter(item.values())).get("status", 500)
+                if status in RETRYABLE_STATUSES:
+                    retry.setdefault(index, []).append(doc)
+                elif status >= 300:
+                    rejected += 1
+        # Retryable items go back to the tail so the cursor can still advance
+        for index, docs in retry.items():
+            self.spool.append_many(index, docs)
+        if rejected:
+            es_docs_dropped.labels(reason="rejected").inc(rejected)
+        self.spool.commit(cursor)
+        replayed = len(entries) - rejected - sum(len(d) for d in retry.values())
+        es_docs_replayed.inc(replayed)
+        return replayed
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self.probe():
+                self._stop.wait(self.probe_seconds)
+                continue
+            while not self._stop.is_set() and self.spool:
+                start, cursor = time.monotonic(), self.spool.cursor
+                shipped = self.replay_once()
+                if shipped < 0 or self.spool.cursor == cursor:
+                    break  # ES failed, or nothing could be consumed: wait for the next probe
+                # Pace replay so a recovering cluster is not flooded
+                self._stop.wait(max(0.0, max(shipped, 1) / self.docs_per_second - (time.monotonic() - start)))
+            self._stop.wait(self.probe_seconds)
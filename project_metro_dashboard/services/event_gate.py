@@ -0,0 +1,111 @@
+import heapq
+import itertools
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from config import settings
+from services.coalescing_queue import Event, coalesce_key
+from services.metrics_exporter import events_rejected
+
+
+class EventGate:
+    """Drops duplicate and out-of-order events before they reach the aggregator.
+
+    Duplicates are event ids seen among the last ``dedupe_window`` ids (0
+    disables). Stale events carry a ``ts`` older than the newest one already
+    admitted for the same train/station, so a late or retried event can never
+    overwrite newer state. Both checks are O(1) per event.
+
+    With ``reorder_tolerance_seconds`` > 0, events are held back until the
+    newest event time seen is that far past them and released in ``ts`` order,
+    so arrivals up to that late are applied instead of rejected. The buffer is
+    a heap, O(log held) per event; ``flush`` releases everything held.
+    """
+
+    def __init__(
+        self,
+        dedupe_window: int = 100000,
+        reject_stale: bool = True,
+        reorder_tolerance_seconds: float = 0.0,
+    ) -> None:
+        self.dedupe_window = dedupe_window
+        self.reject_stale = reject_stale
+        self.reorder_tolerance_seconds = reorder_tolerance_seconds
+        self._tolerance = timedelta(seconds=reorder_tolerance_seconds)
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._watermarks: Dict[Hashable, datetime] = {}
+        self._held: List[Tuple[datetime, int, Event]] = []
+        self._order = itertools.count()
+        self._max_ts: Optional[datetime] = None
+        self.duplicates = 0
+        self.stale = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._held)
+
+    def _duplicate(self, event: Event) -> bool:
+        if not self.dedupe_window:
+            return False
+        seen = self._seen
+        if event.id in seen:
+            return True
+        seen[event.id] = None
+        if len(seen) > self.dedupe_window:
+            seen.popitem(last=False)
+        return False
+
+    def _fresh(self, event: Event) -> bool:
+        if not self.reject_stale:
+            return True
+        key = coalesce_key(event)
+        last = self._watermarks.get(key)
+        if last is not None and event.ts < last:
+            return False
+        self._watermarks[key] = event.ts
+        return True
+
+    def _admit(self, events: Sequence[Event], duplicates: int) -> List[Event]:
+        admitted = [event for event in events if self._fresh(event)]
+        stale = len(events) - len(admitted)
+        # Counted once per batch, like the other ingest metrics
+        if duplicates:
+            self.duplicates += duplicates
+            events_rejected.labels(reason="duplicate").inc(duplicates)
+        if stale:
+            self.stale += stale
+            events_rejected.labels(reason="stale").inc(stale)
+        return admitted
+
+    def push(self, events: Sequence[Event]) -> List[Event]:
+        """Filter a batch; returns the events to apply now, in the order to apply them."""
+        fresh = [event for event in events if not self._duplicate(event)]
+        duplicates = len(events) - len(fresh)
+        if not self._tolerance:
+            return self._admit(fresh, duplicates)
+        for event in fresh:
+            heapq.heappush(self._held, (event.ts, next(self._order), event))
+            if self._max_ts is None or event.ts > self._max_ts:
+                self._max_ts = event.ts
+        due: List[Event] = []
+        if self._max_ts is not None:
+            horizon = self._max_ts - self._tolerance
+            while self._held and self._held[0][0] <= horizon:
+                due.append(heapq.heappop(self._held)[2])
+        return self._admit(due, duplicates)
+
+    def flush(self) -> List[Event]:
+        """Release every held event, e.g. once the feed has gone quiet."""
+        due = [heapq.heappop(self._held)[2] for _ in range(len(self._held))]
+        return self._admit(due, 0)
+
+
+def make_event_gate() -> Optional[EventGate]:
+    if not (settings.INGEST_DEDUPE_WINDOW or settings.INGEST_REJECT_STALE or settings.INGEST_REORDER_TOLERANCE_MS):
+        return None
+    return EventGate(
+        settings.INGEST_DEDUPE_WINDOW,
+        settings.INGEST_REJECT_STALE,
+        settings.INGEST_REORDER_TOLERANCE_MS / 1000,
+    )
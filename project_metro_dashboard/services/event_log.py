@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from config import settings
+from models.station_event import StationEvent
+from models.train_event import TrainEvent
+
+
+logger = logging.getLogger("event_log")
+
+Event = Union[TrainEvent, StationEvent]
+
+MAGIC = b"METROLOG"
+VERSION = 1
+# magic, version, record size, index interval; padded to a fixed 32-byte header
+HEADER = struct.Struct("<8sHII")
+HEADER_SIZE = 32
+
+KIND_TRAIN = 0
+KIND_STATION = 1
+
+RECORD_DTYPE = np.dtype([
+    ("kind", "u1"),
+    ("alerts", "u1"),
+    ("passengers", "<i4"),
+    ("capacity", "<i4"),
+    ("occupancy", "<i4"),
+    ("ts", "<f8"),
+    ("lat", "<f8"),
+    ("lon", "<f8"),
+    ("speed", "<f8"),
+    ("delay", "<f8"),
+    ("avg_wait", "<f8"),
+    ("id", "S40"),
+    ("entity", "S16"),
+    ("next_station", "S16"),
+    ("status", "S12"),
+])
+# Width of the fixed-size string fields; longer values lose their tail
+STRING_BYTES = {name: RECORD_DTYPE.fields[name][0].itemsize for name in ("id", "entity", "next_station", "status")}
+# Sidecar time index: one (ts, record number) entry every index interval records
+INDEX_DTYPE = np.dtype([("ts", "<f8"), ("record", "<u8")])
+
+# Station alerts are stored as a bitmask over this table; other alert strings are not kept
+ALERTS = ("High occupancy", "Long wait")
+
+
+def _alerts_mask(alerts: List[str]) -> int:
+    mask = 0
+    for bit, name in enumerate(ALERTS):
+        if name in alerts:
+            mask |= 1 << bit
+    return mask
+
+
+def _index_path(path: str) -> str:
+    return path + ".idx"
+
+
+class EventRecorder:
+    """Appends ingested events to a fixed-width binary log.
+
+    Records are packed into an in-memory block and written once the block is
+    full or ``flush_seconds`` have passed, so ``record`` stays cheap on the
+    consumer path. Reopening an existing log first cuts off a partial record
+    (and index entries past the last whole record) left by a crash.
+    """
+
+    def __init__(self, path: str, block_records: int = 4096, index_every: int = 1024, flush_seconds: float = 1.0) -> None:
+        self.path = path
+        self.index_every = index_every
+        self.flush_seconds = flush_seconds
+        self._block = np.zeros(block_records, dtype=RECORD_DTYPE)
+        self._pending = 0
+        self._truncated: Set[str] = set()
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE:
+            with open(path, "rb") as fh:
+                _, _, _, self.index_every = _read_header(fh)
+            self._records = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+            self._repair()
+        else:
+            with open(path, "wb") as fh:
+                fh.write(HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, index_every).ljust(HEADER_SIZE, b"\0"))
+            self._records = 0
+        self._fh = open(path, "ab")
+        self._index_fh = open(_index_path(path), "ab")
+        self._last_flush = time.monotonic()
+
+    def _repair(self) -> None:
+        size = HEADER_SIZE + self._records * RECORD_DTYPE.itemsize
+        if os.path.getsize(self.path) != size:
+            logger.warning("Dropping a partial record at the end of %s", self.path)
+            os.truncate(self.path, size)
+        index_path = _index_path(self.path)
+        if not os.path.exists(index_path):
+            return
+        entries = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+        index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=entries)
+        # The index is written before its block, so it can run ahead of the records
+        whole = int(np.searchsorted(index["record"], self._records, side="left"))
+        if whole * INDEX_DTYPE.itemsize != os.path.getsize(index_path):
+            os.truncate(index_path, whole * INDEX_DTYPE.itemsize)
+
+    @property
+    def records(self) -> int:
+        return self._records + self._pending
+
+    def _encode(self, field: str, value: str) -> bytes:
+        raw = value.encode()
+        if len(raw) > STRING_BYTES[field] and field not in self._truncated:
+            # Warned once per field so a misconfigured id scheme does not flood the log
+            self._truncated.add(field)
+            logger.warning(
+                "Event %s %r is longer than %d bytes and is truncated in %s", field, value, STRING_BYTES[field], self.path
+            )
+        return raw
+
+    def record(self, event: Event) -> None:
+        row = self._block[self._pending]
+        row["ts"] = event.ts.timestamp()
+        row["id"] = self._encode("id", event.id)
+        if isinstance(event, TrainEvent):
+            row["kind"] = KIND_TRAIN
+            row["entity"] = self._encode("entity", event.train_id)
+            row["lat"], row["lon"] = event.location
+            row["speed"] = event.speed_kmph
+            row["delay"] = event.delay_min
+            row["passengers"] = event.passenger_count
+            row["capacity"] = event.capacity
+            row["next_station"] = self._encode("next_station", event.next_station or "")
+            row["status"] = self._encode("status", event.status)
+        else:
+            row["kind"] = KIND_STATION
+            row["entity"] = self._encode("entity", event.station_id)
+            row["occupancy"] = event.platform_occupancy
+            row["avg_wait"] = event.avg_wait_min
+            row["alerts"] = _alerts_mask(event.alerts)
+        self._pending += 1
+        if self._pending == len(self._block) or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            block = self._block[: self._pending]
+            first = self._records
+            # Record numbers in this block that land on an index boundary
+            start = -(-first // self.index_every) * self.index_every
+            marks = np.arange(start, first + self._pending, self.index_every, dtype=np.uint64)
+            if marks.size:
+                index = np.empty(marks.size, dtype=INDEX_DTYPE)
+                index["record"] = marks
+                index["ts"] = block["ts"][(marks - first).astype(np.int64)]
+                self._index_fh.write(index.tobytes())
+            self._fh.write(block.tobytes())
+            self._records += self._pending
+            self._pending = 0
+            self._block[:] = 0
+            self._fh.flush()
+            self._index_fh.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if self._fh.closed:
+            return
+        self.flush()
+        self._fh.close()
+        self._index_fh.close()
+
+
+def _read_header(fh: BinaryIO) -> Tuple[bytes, int, int, int]:
+    magic, version, record_size, index_every = HEADER.unpack(fh.read(HEADER_SIZE)[: HEADER.size])
+    if magic != MAGIC:
+        raise ValueError("Not a metro event log")
+    if version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"Unsupported event log version={version} record_size={record_size}")
+    return magic, version, record_size, index_every
+
+
+class EventLogReader:
+    """Memory-maps an event log for zero-parse sequential or time-based access."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as fh:
+            _, _, _, self.index_every = _read_header(fh)
+        count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        index_path = _index_path(path)
+        if os.path.exists(index_path) and os.path.getsize(index_path) >= INDEX_DTYPE.itemsize:
+            self.index = np.fromfile(index_path, dtype=INDEX_DTYPE)
+        else:
+            self.index = np.zeros(0, dtype=INDEX_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def seek_time(self, ts: float) -> int:
+        """Number of the first record at or after ``ts`` (records are in ingest order)."""
+        start = 0
+        if len(self.index):
+            pos = int(np.searchsorted(self.index["ts"], ts, side="left"))
+            if pos > 0:
+                start = int(self.index["record"][pos - 1])
+        hits = np.flatnonzero(self.records["ts"][start:] >= ts)
+        return start + int(hits[0]) if hits.size else len(self.records)
+
+    def events(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Event]:
+        for row in self.records[start:stop]:
+            yield to_event(row)
+
+
+def to_event(row: np.void) -> Event:
+    ts = datetime.fromtimestamp(float(row["ts"]), tz=timezone.utc)
+    if row["kind"] == KIND_TRAIN:
+        next_station = row["next_station"].decode()
+        return TrainEvent.model_construct(
+            id=row["id"].decode(),
+            train_id=row["entity"].decode(),
+            location=(float(row["lat"]), float(row["lon"])),
+            speed_kmph=float(row["speed"]),
+            ts=ts,
+            delay_min=float(row["delay"]),
+            passenger_count=int(row["passengers"]),
+            next_station=next_station or None,
+            status=row["status"].decode(),
+            capacity=int(row["capacity"]),
+        )
+    mask = int(row["alerts"])
+    return StationEvent.model_construct(
+        id=row["id"].decode(),
+        station_id=row["entity"].decode(),
+        ts=ts,
+        platform_occupancy=int(row["occupancy"]),
+        avg_wait_min=float(row["avg_wait"]),
+        alerts=[name for bit, name in enumerate(ALERTS) if mask & (1 << bit)],
+    )
+
+
+def parse_speed(value: str) -> float:
+    """Replay speed multiplier; "max" (or 0) means no pacing at all."""
+    if value.lower() in ("max", "0"):
+        return 0.0
+    return float(value.lower().rstrip("x"))
+
+
+async def replay(queue: asyncio.Queue, path: str, speed: float = 1.0, chunk: int = 1024) -> None:
+    """Feed a recorded log into ``queue`` at ``speed`` times the original pace (0 = max)."""
+    reader = EventLogReader(path)
+    if not len(reader):
+        logger.warning("Event log %s is empty, nothing to replay", path)
+        return
+    first_ts = float(reader.records["ts"][0])
+    wall_start = time.monotonic()
+    for start in range(0, len(reader), chunk):
+        for row in reader.records[start : start + chunk]:
+            if speed > 0:
+                delay = (float(row["ts"]) - first_ts) / speed - (time.monotonic() - wall_start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await queue.put(to_event(row))
+    logger.info("Replayed %d events from %s", len(reader), path)
+
+
+def make_event_recorder() -> Optional[EventRecorder]:
+    # Never record while replaying: the source and the sink would be the same stream
+    if not settings.EVENT_LOG_PATH or settings.DATA_MODE == "replay":
+        return None
+    return EventRecorder(settings.EVENT_LOG_PATH)
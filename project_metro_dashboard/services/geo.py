@@ -0,0 +1,23 @@
+from typing import Tuple, Union
+
+import numpy as np
+
+
+# ((min_lat, min_lon), (max_lat, max_lon))
+CityBounds = Tuple[Tuple[float, float], Tuple[float, float]]
+
+# Mean Earth radius (IUGG)
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = np.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(
+    lat: Union[float, np.ndarray], lon: Union[float, np.ndarray], lats: np.ndarray, lons: np.ndarray
+) -> np.ndarray:
+    """Great-circle distances in km between (lat, lon) and arrays of points, in one NumPy pass.
+
+    Within 0.5% of geopy's ellipsoidal ``geodesic``, which is far too slow per point.
+    """
+    lat1, lon1, lat2, lon2 = np.radians(lat), np.radians(lon), np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
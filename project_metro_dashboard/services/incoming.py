@@ -0,0 +1,106 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.geo import haversine_km
+from services.stations import StationCatalog
+
+
+def estimate_arrivals(records: List[Dict], station: Tuple[float, float], min_speed_kmph: float) -> List[Dict]:
+    """ETA of every train record at ``station``, soonest first, in one vectorized pass.
+
+    Travel time is the great-circle distance at the train's reported speed,
+    floored at ``min_speed_kmph`` so trains stopped elsewhere still get an
+    ETA, counted from the train's last report. ``scheduled`` backs the
+    current delay out of the ETA.
+    """
+    if not records:
+        return []
+    n = len(records)
+    lat = np.fromiter((r["location"][0] for r in records), dtype=np.float64, count=n)
+    lon = np.fromiter((r["location"][1] for r in records), dtype=np.float64, count=n)
+    speed = np.fromiter((r["speed_kmph"] for r in records), dtype=np.float64, count=n)
+    delay = np.fromiter((r["delay_min"] for r in records), dtype=np.float64, count=n)
+    ts = np.fromiter((r["ts"].timestamp() for r in records), dtype=np.float64, count=n)
+    distance = haversine_km(station[0], station[1], lat, lon)
+    travel = distance / np.maximum(speed, min_speed_kmph) * 3600.0
+    eta = ts + travel
+    order = np.argsort(eta, kind="stable")
+    columns = zip(
+        order.tolist(),
+        distance[order].round(3).tolist(),
+        travel[order].round(1).tolist(),
+        eta[order].tolist(),
+        (eta[order] - delay[order] * 60.0).tolist(),
+    )
+    arrivals: List[Dict] = []
+    for i, km, seconds, at, due in columns:
+        r = records[i]
+        arrivals.append({
+            "train_id": r["train_id"],
+            "status": r["status"],
+            "distance_km": km,
+            "speed_kmph": r["speed_kmph"],
+            "delay_min": r["delay_min"],
+            "eta_seconds": seconds,
+            "eta": datetime.fromtimestamp(at, timezone.utc),
+            "scheduled": datetime.fromtimestamp(due, timezone.utc),
+        })
+    return arrivals
+
+
+class IncomingBoard:
+    """Per-station boards of the trains heading there, soonest ETA first.
+
+    Remembers the station every train is heading to and, per station, the
+    version of the last update to a train heading to or away from it. A
+    station's board is rebuilt from the published snapshot only once that
+    version is past the snapshot it was built from, so repeated reads
+    between updates of its incoming trains cost a dict lookup.
+    """
+
+    def __init__(self, stations: StationCatalog, min_speed_kmph: float = 20.0) -> None:
+        self.stations = stations
+        self.min_speed_kmph = min_speed_kmph
+        self._heading: Dict[str, Optional[str]] = {}
+        self._touched: Dict[str, int] = {}
+        # station_id -> (snapshot version built from, trains section version, arrivals)
+        self._boards: Dict[str, Tuple[int, int, List[Dict]]] = {}
+
+    def move(self, train_id: str, next_station: Optional[str], version: int) -> None:
+        self.move_many(((train_id, next_station, version),))
+
+    def move_many(self, moves: Iterable[Tuple[str, Optional[str], int]]) -> None:
+        heading, touched = self._heading, self._touched
+        for train_id, next_station, version in moves:
+            old = heading.get(train_id)
+            if old != next_station:
+                if old is not None:
+                    touched[old] = version
+                heading[train_id] = next_station
+            if next_station is not None:
+                touched[next_station] = version
+
+    def remove(self, train_id: str, version: int) -> None:
+        old = self._heading.pop(train_id, None)
+        if old is not None:
+            self._touched[old] = version
+
+    def board(
+        self, station_id: str, snap_version: int, trains_version: int, records: Callable[[], List[Dict]]
+    ) -> Optional[Tuple[int, List[Dict]]]:
+        """(trains version, arrivals) for a catalog station; None for unknown stations.
+
+        ``records`` returns the snapshot records of the trains heading to the
+        station and is only called when the cached board is out of date.
+        """
+        location = self.stations.location(station_id)
+        if location is None:
+            return None
+        cached = self._boards.get(station_id)
+        if cached is not None and cached[0] >= self._touched.get(station_id, 0):
+            return cached[1], cached[2]
+        arrivals = estimate_arrivals(records(), location, self.min_speed_kmph)
+        self._boards[station_id] = (snap_version, trains_version, arrivals)
+        return trains_version, arrivals
@@ -0,0 +1,64 @@
+from typing import Dict, Iterable, Optional
+
+from services.train_store import DELAY_THRESHOLD_MIN, KpiRow
+
+
+# Platform occupancy above which a station counts as crowded
+CROWDED_OCCUPANCY = 350
+
+
+class RunningKpis:
+    """Fleet KPIs kept as running sums and counters.
+
+    Each update adjusts the totals by the difference between the previous and
+    the new value for that entity, so reading the KPIs is O(1). Float sums slowly
+    accumulate rounding error; ``resync`` replaces them with a full-scan result.
+    """
+
+    def __init__(self) -> None:
+        self.train_count = 0
+        self.delay_sum = 0.0
+        self.speed_sum = 0.0
+        self.passengers_total = 0
+        self.on_time = 0
+        self.crowded_stations = 0
+
+    def apply_train(self, old: Optional[KpiRow], new: Optional[KpiRow]) -> None:
+        if old is not None:
+            delay, speed, passengers = old
+            self.train_count -= 1
+            self.delay_sum -= delay
+            self.speed_sum -= speed
+            self.passengers_total -= passengers
+            self.on_time -= delay <= DELAY_THRESHOLD_MIN
+        if new is not None:
+            delay, speed, passengers = new
+            self.train_count += 1
+            self.delay_sum += delay
+            self.speed_sum += speed
+            self.passengers_total += passengers
+            self.on_time += delay <= DELAY_THRESHOLD_MIN
+
+    def apply_station(self, old_occupancy: Optional[int], new_occupancy: Optional[int]) -> None:
+        if old_occupancy is not None:
+            self.crowded_stations -= old_occupancy > CROWDED_OCCUPANCY
+        if new_occupancy is not None:
+            self.crowded_stations += new_occupancy > CROWDED_OCCUPANCY
+
+    def resync(self, train_kpis: Dict[str, float], station_occupancies: Iterable[int]) -> None:
+        self.train_count = int(train_kpis["count"])
+        self.delay_sum = float(train_kpis["delay_sum"])
+        self.speed_sum = float(train_kpis["speed_sum"])
+        self.passengers_total = int(train_kpis["passengers_total"])
+        self.on_time = int(train_kpis["on_time"])
+        self.crowded_stations = sum(1 for occ in station_occupancies if occ > CROWDED_OCCUPANCY)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.train_count,
+            "delay_sum": self.delay_sum,
+            "speed_sum": self.speed_sum,
+            "passengers_total": self.passengers_total,
+            "on_time": self.on_time,
+            "crowded_stations": self.crowded_stations,
+        }
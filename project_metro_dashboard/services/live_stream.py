@@ -0,0 +1,208 @@
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from services.aggregator import Aggregator
+from services.metrics_exporter import stream_frames_dropped, stream_subscribers
+
+
+logger = logging.getLogger("live_stream")
+
+DROP_POLICIES = ("drop_oldest", "disconnect")
+
+
+class Frame:
+    """One serialized stream message, shared by every subscriber it is sent to."""
+
+    __slots__ = ("event", "version", "data", "_sse", "_message")
+
+    def __init__(self, event: str, version: int, data: str) -> None:
+        self.event = event
+        self.version = version
+        self.data = data
+        self._sse: Optional[bytes] = None
+        self._message: Optional[str] = None
+
+    @property
+    def sse(self) -> bytes:
+        # Server-Sent Events wire form, encoded once per frame
+        if self._sse is None:
+            self._sse = f"id: {self.version}\nevent: {self.event}\ndata: {self.data}\n\n".encode()
+        return self._sse
+
+    @property
+    def message(self) -> str:
+        # WebSocket text message: the same payload wrapped with its event name and id
+        if self._message is None:
+            self._message = f'{{"event":"{self.event}","id":{self.version},"data":{self.data}}}'
+        return self._message
+
+
+class Subscriber:
+    """Bounded per-client frame queue.
+
+    When the client falls behind, ``drop_oldest`` discards its oldest pending
+    frame and ``disconnect`` closes the subscription so the client reconnects
+    and starts again from a fresh snapshot. ``notify`` is called after every
+    new frame or close, for consumers that wait on something other than ``get``.
+    ``cursor`` is the aggregator version the client's frames cover up to.
+    """
+
+    def __init__(self, maxsize: int, drop_policy: str, notify: Optional[Callable[[], None]] = None) -> None:
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.notify = notify
+        self.closed = False
+        self.dropped = 0
+        self.cursor = 0
+        self._frames: Deque[Frame] = deque()
+        self._cond = threading.Condition()
+
+    def offer(self, frame: Frame) -> bool:
+        with self._cond:
+            if self.closed:
+                return False
+            if len(self._frames) >= self.maxsize:
+                self.dropped += 1
+                stream_frames_dropped.inc()
+                if self.drop_policy == "disconnect":
+                    self.closed = True
+                    self._cond.notify_all()
+                    self._wake()
+                    return False
+                self._frames.popleft()
+            self._frames.append(frame)
+            self._cond.notify_all()
+        self._wake()
+        return True
+
+    def get(self, timeout: float) -> Optional[Frame]:
+        """Next frame, or None on timeout. Raises EOFError once closed and drained."""
+        with self._cond:
+            if not self._frames and not self.closed:
+                self._cond.wait(timeout)
+            if self._frames:
+                return self._frames.popleft()
+            if self.closed:
+                raise EOFError("subscription closed")
+            return None
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._wake()
+
+    def _wake(self) -> None:
+        if self.notify is not None:
+            self.notify()
+
+
+class Broadcaster:
+    """Pushes coalesced aggregator changes to stream subscribers.
+
+    At most ``max_rate_hz`` times per second, if the aggregator version moved,
+    one delta covering every change since the previous push is serialized once
+    and the same frame is offered to every subscriber. Trains that changed
+    several times in between appear once, with their latest state. Each
+    subscriber keeps its own cursor, so one that joined with an older snapshot
+    gets its own delta from there instead of a gap; in steady state every
+    cursor is the same and there is one frame per push.
+    """
+
+    def __init__(
+        self,
+        aggregator: Aggregator,
+        serialize: Callable[[Any], str],
+        max_rate_hz: float = 2.0,
+        queue_size: int = 64,
+        drop_policy: str = "drop_oldest",
+    ) -> None:
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy!r}")
+        self.aggregator = aggregator
+        self.serialize = serialize
+        self.max_rate_hz = max_rate_hz
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="live-stream", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            for sub in self._subscribers:
+                sub.close()
+            self._subscribers.clear()
+
+    def subscribe(self, notify: Optional[Callable[[], None]] = None) -> Tuple[Subscriber, Frame]:
+        """Register a client; returns it with a full snapshot frame to send first."""
+        sub = Subscriber(self.queue_size, self.drop_policy, notify)
+        snap = self.aggregator.current()
+        # Deltas for this client start from its snapshot, whatever the other subscribers have seen
+        sub.cursor = snap.version
+        payload = {"version": snap.version, "trains": snap.records("trains"), "stations": snap.records("stations")}
+        frame = Frame("snapshot", snap.version, self.serialize(payload))
+        with self._lock:
+            self._subscribers.add(sub)
+            stream_subscribers.set(len(self._subscribers))
+        return sub, frame
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        sub.close()
+        with self._lock:
+            self._subscribers.discard(sub)
+            stream_subscribers.set(len(self._subscribers))
+
+    def publish_once(self) -> int:
+        """Push one coalesced delta if anything changed; returns subscribers reached."""
+        with self._lock:
+            subscribers: List[Subscriber] = list(self._subscribers)
+        # Both sections from one published snapshot, without the aggregator's writer lock
+        snap = self.aggregator.current()
+        version = snap.version
+        # Subscribers behind the snapshot, grouped by cursor: one delta and frame per group
+        behind: Dict[int, List[Subscriber]] = {}
+        for sub in subscribers:
+            if sub.cursor < version:
+                behind.setdefault(sub.cursor, []).append(sub)
+        reached = 0
+        for since, group in behind.items():
+            payload: Dict[str, Any] = {"version": version, "since": since}
+            for name in ("trains", "stations"):
+                delta = snap.delta(name, since)
+                payload[name] = {"full": delta["full"], "changed": delta["changed"], "removed": delta["removed"]}
+            frame = Frame("delta", version, self.serialize(payload))
+            for sub in group:
+                sub.cursor = version
+                if sub.offer(frame):
+                    reached += 1
+                elif sub.closed:
+                    self.unsubscribe(sub)
+        return reached
+
+    def _run(self) -> None:
+        interval = 1.0 / self.max_rate_hz
+        while not self._stop.wait(interval):
+            try:
+                self.publish_once()
+            except Exception:  # noqa: BLE001
+                logger.exception("Live stream publish failed")
@@ -7,16 +7,66 @@ from flask import Response
 
 events_ingested = Counter("metro_events_ingested_total", "Total events ingested")
 trips_completed = Counter("metro_trips_completed_total", "Total trips completed")
+train_arrivals = Counter("metro_train_arrivals_total", "Train arrivals at stations")
+train_departures = Counter("metro_train_departures_total", "Train departures from stations")
+dwell_seconds_hist = Histogram(
+    "metro_dwell_seconds", "Time trains spend at a station", buckets=(5, 10, 20, 30, 45, 60, 90, 120, 300)
+)
 
 trains_active_g = Gauge("metro_trains_active", "Number of active trains")
 avg_delay_g = Gauge("metro_avg_delay_min", "Average train delay in minutes")
 total_passengers_g = Gauge("metro_total_passengers", "Total passenger count")
 crowded_stations_g = Gauge("metro_crowded_stations", "Number of crowded stations")
+delay_quantile_g = Gauge(
+    "metro_delay_min_quantile", "Train delay quantile over the percentile window, in minutes", ["quantile"]
+)
+wait_quantile_g = Gauge(
+    "metro_platform_wait_min_quantile", "Platform wait quantile over the percentile window, in minutes", ["quantile"]
+)
 
 response_hist = Histogram(
     "metro_response_time_seconds", "API response time", buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5)
 )
 
+es_bulk_flush_seconds = Histogram(
+    "metro_es_bulk_flush_seconds",
+    "Elasticsearch _bulk request latency",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+es_bulk_batch_docs = Histogram(
+    "metro_es_bulk_batch_docs", "Documents per Elasticsearch _bulk request", buckets=(1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+es_docs_shipped = Counter("metro_es_docs_shipped_total", "Documents accepted by Elasticsearch", ["index"])
+es_docs_dropped = Counter("metro_es_docs_dropped_total", "Documents dropped before reaching Elasticsearch", ["reason"])
+es_docs_filter_shipped = Counter(
+    "metro_es_docs_filter_shipped_total", "Documents the ship filter passed on to Elasticsearch", ["index", "reason"]
+)
+es_docs_filter_suppressed = Counter(
+    "metro_es_docs_filter_suppressed_total", "Documents the ship filter kept from Elasticsearch", ["index", "reason"]
+)
+es_buffer_docs = Gauge("metro_es_buffer_docs", "Documents waiting in the Elasticsearch bulk buffer")
+es_docs_spooled = Counter("metro_es_docs_spooled_total", "Documents written to the on-disk ES spool")
+es_docs_replayed = Counter("metro_es_docs_replayed_total", "Spooled documents replayed into Elasticsearch")
+es_spool_bytes = Gauge("metro_es_spool_bytes", "Bytes waiting in the on-disk ES spool")
+stream_subscribers = Gauge("metro_stream_subscribers", "Connected live stream subscribers")
+stream_frames_dropped = Counter("metro_stream_frames_dropped_total", "Live stream frames dropped for slow consumers")
+snapshot_versions_behind_g = Gauge("metro_snapshot_versions_behind", "Updates not yet in the published read snapshot")
+ingest_events_coalesced = Counter(
+    "metro_ingest_events_coalesced_total", "Queued events replaced by a newer event for the same train/station"
+)
+ingest_events_dropped = Counter("metro_ingest_events_dropped_total", "Events dropped because the ingest queue was full")
+events_rejected = Counter(
+    "metro_events_rejected_total", "Events rejected before the aggregator (duplicate id or stale ts)", ["reason"]
+)
+ingest_queue_depth = Gauge("metro_ingest_queue_depth", "Trains/stations with an event waiting in the ingest queue")
+history_bytes = Gauge("metro_history_bytes", "Memory allocated to per-train trajectory history rings")
+history_samples_dropped = Counter(
+    "metro_history_samples_dropped_total",
+    "Train samples not kept in trajectory history (deadband, stale ts, or max trains reached)",
+    ["reason"],
+)
+snapshot_age_g = Gauge("metro_snapshot_age_seconds", "Age of the oldest update not yet in the read snapshot")
+
 
 def observe_request(duration_seconds: float) -> None:
     response_hist.observe(duration_seconds)
@@ -27,6 +77,17 @@ def update_from_stats(stats: Dict) -> None:
     avg_delay_g.set(stats.get("avg_delay_min", 0.0))
     total_passengers_g.set(stats.get("passengers_total", 0))
     crowded_stations_g.set(stats.get("crowded_stations", 0))
+    percentiles = stats.get("percentiles") or {}
+    for metric, gauge in (("delay_min", delay_quantile_g), ("wait_min", wait_quantile_g)):
+        for key, value in percentiles.get(metric, {}).items():
+            # Empty windows keep the last value rather than exporting a gap as 0
+            if key != "count" and value is not None:
+                gauge.labels(quantile=str(int(key[1:]) / 100)).set(value)
+
+
+def update_snapshot_staleness(staleness: Dict) -> None:
+    snapshot_versions_behind_g.set(staleness.get("versions_behind", 0))
+    snapshot_age_g.set(staleness.get("age_seconds", 0.0))
 
 
 def metrics_endpoint() -> Response:
@@ -0,0 +1,236 @@
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Reported by /stats and exported to Prometheus
+QUANTILES = (0.5, 0.95, 0.99)
+QUANTILE_KEYS = tuple(f"p{round(q * 100)}" for q in QUANTILES)
+# Windowed fleet-wide sketches, in /stats order
+PERCENTILE_METRICS = ("delay_min", "wait_min")
+
+
+class DDSketch:
+    """Quantile sketch with relative error guarantees (DDSketch, Masson et al. 2019).
+
+    Values are counted in logarithmic bins, so any quantile is returned within
+    ``relative_accuracy`` of the true value. Positive and negative values have
+    separate bin stores and magnitudes below ``min_value`` count as zero. Each
+    store keeps at most ``max_bins`` bins, collapsing the smallest magnitudes
+    together beyond that. Sketches merge exactly by adding bin counts.
+    """
+
+    __slots__ = ("relative_accuracy", "max_bins", "min_value", "gamma", "_log_gamma", "positive", "negative",
+                 "zero", "count")
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048, min_value: float = 1e-3) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value > self.min_value:
+            store = self.positive
+        elif value < -self.min_value:
+            store, value = self.negative, -value
+        else:
+            self.zero += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        store[index] = store.get(index, 0) + 1
+        if len(store) > self.max_bins:
+            self._collapse(store)
+
+    def add_many(self, values: np.ndarray) -> None:
+        self.count += len(values)
+        for store, magnitudes in (
+            (self.positive, values[values > self.min_value]),
+            (self.negative, -values[values < -self.min_value]),
+        ):
+            if len(magnitudes):
+                indexes = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+                for index, n in zip(*(a.tolist() for a in np.unique(indexes, return_counts=True))):
+                    store[index] = store.get(index, 0) + n
+                if len(store) > self.max_bins:
+                    self._collapse(store)
+        self.zero += int(np.count_nonzero(np.abs(values) <= self.min_value))
+
+    def _collapse(self, store: Dict[int, int]) -> None:
+        keys = sorted(store)
+        excess = len(keys) - self.max_bins
+        store[keys[excess]] += sum(store.pop(k) for k in keys[:excess])
+
+    def merge(self, other: "DDSketch") -> None:
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, n in theirs.items():
+                mine[index] = mine.get(index, 0) + n
+            if len(mine) > self.max_bins:
+                self._collapse(mine)
+        self.zero += other.zero
+        self.count += other.count
+
+    def copy(self) -> "DDSketch":
+        sketch = DDSketch(self.relative_accuracy, self.max_bins, self.min_value)
+        sketch.merge(self)
+        return sketch
+
+    def _value(self, index: int) -> float:
+        # Midpoint of the bin in relative terms, which is what bounds the error
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.positive))
+
+
+class WindowedSketch:
+    """DDSketches over a sliding event-time window: one per ``bucket_seconds`` in a ring of ``buckets``.
+
+    A query merges the buckets within the window ending at ``now``; buckets
+    that fall out of the ring are reused, so memory stays fixed.
+    """
+
+    def __init__(self, bucket_seconds: int, buckets: int, relative_accuracy: float) -> None:
+        self.bucket_seconds = bucket_seconds
+        self.relative_accuracy = relative_accuracy
+        self._ring: List[Optional[Tuple[int, DDSketch]]] = [None] * buckets
+
+    def _sketch(self, epoch: int) -> Optional[DDSketch]:
+        slot = epoch % len(self._ring)
+        entry = self._ring[slot]
+        if entry is not None and entry[0] == epoch:
+            return entry[1]
+        if entry is not None and entry[0] > epoch:
+            return None  # older than the window reaches back
+        sketch = DDSketch(self.relative_accuracy)
+        self._ring[slot] = (epoch, sketch)
+        return sketch
+
+    def add(self, ts: float, value: float) -> None:
+        sketch = self._sketch(int(ts // self.bucket_seconds))
+        if sketch is not None:
+            sketch.add(value)
+
+    def add_many(self, ts: Sequence[float], values: Sequence[float]) -> None:
+        width = self.bucket_seconds
+        first = int(min(ts) // width)
+        by_epoch: Dict[int, Sequence[float]]
+        if first == int(max(ts) // width):
+            by_epoch = {first: values}  # the usual case: a batch within one bucket
+        else:
+            by_epoch = {}
+            for t, value in zip(ts, values):
+                by_epoch.setdefault(int(t // width), []).append(value)  # type: ignore[attr-defined]
+        for epoch, batch in by_epoch.items():
+            sketch = self._sketch(epoch)
+            if sketch is None:
+                continue
+            if len(batch) == 1:
+                sketch.add(batch[0])
+            else:
+                sketch.add_many(np.asarray(batch, dtype=np.float64))
+
+    def window(self, now: float) -> DDSketch:
+        merged = DDSketch(self.relative_accuracy)
+        if now == -math.inf:
+            return merged
+        last = int(now // self.bucket_seconds)
+        for entry in self._ring:
+            if entry is not None and last - len(self._ring) < entry[0] <= last:
+                merged.merge(entry[1])
+        return merged
+
+
+class KpiSketches:
+    """Sliding-window delay and platform wait sketches, fleet-wide and per station.
+
+    Delays are sampled once per train event, waits once per station event,
+    both by event time. ``sketches`` returns merged windows, which
+    ShardProcessPool also merges across its worker processes.
+    """
+
+    def __init__(self, window_seconds: int, bucket_seconds: int, relative_accuracy: float) -> None:
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.buckets = max(1, math.ceil(window_seconds / bucket_seconds))
+        self.relative_accuracy = relative_accuracy
+        self.lock = threading.Lock()
+        self.delay = self._windowed()
+        self.wait = self._windowed()
+        self.station_wait: Dict[str, WindowedSketch] = {}
+        self.latest = -math.inf
+
+    def _windowed(self) -> WindowedSketch:
+        return WindowedSketch(self.bucket_seconds, self.buckets, self.relative_accuracy)
+
+    def add_trains(self, ts: Sequence[float], delays: Sequence[float]) -> None:
+        with self.lock:
+            self.delay.add_many(ts, delays)
+            self.latest = max(self.latest, max(ts))
+
+    def add_stations(self, ts: Sequence[float], station_ids: Sequence[str], waits: Sequence[float]) -> None:
+        with self.lock:
+            self.wait.add_many(ts, waits)
+            for t, station_id, wait in zip(ts, station_ids, waits):
+                sketch = self.station_wait.get(station_id)
+                if sketch is None:
+                    sketch = self.station_wait[station_id] = self._windowed()
+                sketch.add(t, wait)
+            self.latest = max(self.latest, max(ts))
+
+    def sketches(self, station_id: Optional[str] = None, now: Optional[float] = None) -> Optional[Dict[str, DDSketch]]:
+        """Windowed sketches by metric name (fleet, or one station's wait); None for an unknown station."""
+        with self.lock:
+            now = self.latest if now is None else now
+            if station_id is not None:
+                sketch = self.station_wait.get(station_id)
+                return None if sketch is None else {"wait_min": sketch.window(now)}
+            return dict(zip(PERCENTILE_METRICS, (self.delay.window(now), self.wait.window(now))))
+
+
+def merge_sketches(parts: Iterable[Optional[Dict[str, DDSketch]]]) -> Optional[Dict[str, DDSketch]]:
+    merged: Optional[Dict[str, DDSketch]] = None
+    for part in parts:
+        if part is None:
+            continue
+        if merged is None:
+            merged = {name: sketch.copy() for name, sketch in part.items()}
+        else:
+            for name, sketch in part.items():
+                merged[name].merge(sketch)
+    return merged
+
+
+def format_percentiles(sketches: Dict[str, DDSketch], window_seconds: int) -> Dict:
+    """{"window_seconds": ..., "<metric>": {"count": n, "p50": ..., "p95": ..., "p99": ...}}"""
+    doc: Dict = {"window_seconds": window_seconds}
+    for name, sketch in sketches.items():
+        entry: Dict = {"count": sketch.count}
+        for q, key in zip(QUANTILES, QUANTILE_KEYS):
+            value = sketch.quantile(q)
+            entry[key] = round(value, 2) if value is not None else None
+        doc[name] = entry
+    return doc
@@ -0,0 +1,64 @@
+import gzip
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class CachedBody:
+    """One encoded response body for a given data version."""
+
+    __slots__ = ("version", "etag", "body", "_gzipped", "_gzip_level")
+
+    def __init__(self, version: int, etag: str, body: bytes, gzip_level: int) -> None:
+        self.version = version
+        self.etag = etag
+        self.body = body
+        self._gzipped: Optional[bytes] = None
+        self._gzip_level = gzip_level
+
+    def gzipped(self) -> bytes:
+        # Compressed at most once per version; a duplicate compression under a race is harmless
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=self._gzip_level, mtime=0)
+        return self._gzipped
+
+
+class SnapshotCache:
+    """Caches serialized snapshot sections keyed by the aggregator version they reflect.
+
+    Readers whose version matches the cached entry get the stored bytes without
+    touching the aggregator; otherwise one thread per section rebuilds the entry.
+    ETags embed a per-process token so versions from a previous run never match.
+    """
+
+    def __init__(self, serialize: Callable[[Any], bytes], gzip_level: int = 5) -> None:
+        self.serialize = serialize
+        self.gzip_level = gzip_level
+        self._token = os.urandom(4).hex()
+        self._entries: Dict[str, CachedBody] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, name: str) -> threading.Lock:
+        lock = self._locks.get(name)
+        if lock is None:
+            with self._locks_guard:
+                lock = self._locks.setdefault(name, threading.Lock())
+        return lock
+
+    def get(self, name: str, version: int, build: Callable[[], Tuple[int, Any]]) -> CachedBody:
+        entry = self._entries.get(name)
+        if entry is not None and entry.version >= version:
+            return entry
+        with self._lock_for(name):
+            entry = self._entries.get(name)
+            if entry is not None and entry.version >= version:
+                return entry
+            built_version, data = build()
+            entry = self.encode(name, built_version, data)
+            self._entries[name] = entry
+            return entry
+
+    def encode(self, name: str, version: int, data: Any) -> CachedBody:
+        """Serialize ``data`` into a standalone entry without touching the cache."""
+        return CachedBody(version, f"{self._token}-{name}-{version}", self.serialize(data), self.gzip_level)
@@ -0,0 +1,308 @@
+import math
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Row 0 of every store accumulates all entities
+FLEET = "fleet"
+
+# (bucket width in seconds, number of buckets) per resolution
+Tier = Tuple[int, int]
+
+# Batches at least this large pre-reduce the fleet row with numpy
+FLEET_VECTORIZE_MIN = 32
+
+
+def parse_tiers(spec: str) -> List[Tier]:
+    """"1:60,60:60" -> [(1, 60), (60, 60)], finest first."""
+    tiers = []
+    for part in spec.split(","):
+        if part.strip():
+            seconds, buckets = part.split(":")
+            tiers.append((int(seconds), int(buckets)))
+    return sorted(tiers)
+
+
+# An open bucket: [epoch, count, sum_0, min_0, max_0, sum_1, ...]; epoch counts buckets since 1970
+Bucket = List[float]
+
+
+def _new_bucket(epoch: int, metrics: int) -> Bucket:
+    return [epoch, 0] + [0.0, math.inf, -math.inf] * metrics
+
+
+def _fold_values(bucket: Bucket, values: Sequence[float]) -> None:
+    bucket[1] += 1
+    i = 2
+    for value in values:
+        bucket[i] += value
+        if value < bucket[i + 1]:
+            bucket[i + 1] = value
+        if value > bucket[i + 2]:
+            bucket[i + 2] = value
+        i += 3
+
+
+def _fold(into: Bucket, other: Bucket) -> None:
+    into[1] += other[1]
+    for i in range(2, len(into), 3):
+        into[i] += other[i]
+        if other[i + 1] < into[i + 1]:
+            into[i + 1] = other[i + 1]
+        if other[i + 2] > into[i + 2]:
+            into[i + 2] = other[i + 2]
+
+
+class _Ring:
+    """Closed buckets of one resolution: a ring of ``size`` slots per row, tagged with their epoch.
+
+    A slot is simply overwritten when its turn comes round again; the epoch
+    tag tells a reused slot from a current one, so nothing has to expire.
+    Each row is one flat ``array('d')`` of Bucket-shaped slots, allocated when
+    the row first closes a bucket: 8 bytes per value and cheap scalar writes.
+    """
+
+    def __init__(self, resolution: int, size: int, metrics: int) -> None:
+        self.resolution = resolution
+        self.size = size
+        self.width = 2 + 3 * metrics
+        self.rows: List[Optional[array]] = []
+
+    @property
+    def span(self) -> int:
+        return self.resolution * self.size
+
+    def store(self, row: int, bucket: Bucket) -> None:
+        rows = self.rows
+        while len(rows) <= row:
+            rows.append(None)
+        slots = rows[row]
+        if slots is None:
+            slots = rows[row] = array("d", [-1.0]) * (self.size * self.width)
+        start = int(bucket[0]) % self.size * self.width
+        slots[start : start + self.width] = array("d", bucket)
+
+    def clear(self, row: int) -> None:
+        if row < len(self.rows):
+            self.rows[row] = None
+
+    def buckets(self, row: int, first: int, last: int) -> List[Bucket]:
+        slots = self.rows[row] if row < len(self.rows) else None
+        if slots is None:
+            return []
+        width = self.width
+        return [
+            slots[i : i + width].tolist()
+            for i in range(0, len(slots), width)
+            if first <= slots[i] <= last
+        ]
+
+
+class RollupStore:
+    """Fixed-memory count/sum/min/max of a few metrics per entity and fleet-wide.
+
+    Each row (an entity, plus row 0 for the whole fleet) keeps one open bucket
+    per resolution tier as a small list. An event only updates the row's
+    finest open bucket; when an event lands in a later bucket, the closed one
+    is written to that tier's ring and folded into the next tier's open
+    bucket, and so on up. That is O(1) per event with one array write per
+    closed bucket, and memory is fixed per entity. Large batches fold into
+    the fleet row once per bucket, pre-reduced with numpy. ``remove`` frees an
+    entity's row and the next new entity reuses it.
+
+    Bucket times come from event ``ts`` and "now" is the newest event time
+    seen, so sim-fast and replay roll up in simulated time. An event older
+    than its row's open bucket is counted in that bucket. ``query`` answers
+    from the finest tier whose ring covers the requested window.
+    """
+
+    def __init__(self, metrics: Sequence[str], tiers: Sequence[Tier]) -> None:
+        if not tiers:
+            raise ValueError("at least one rollup tier is required")
+        self.metrics = tuple(metrics)
+        self.lock = threading.Lock()
+        self._rows: Dict[str, int] = {FLEET: 0}
+        self._open: List[List[Optional[Bucket]]] = [[None] * len(tiers)]
+        self._free: List[int] = []
+        self.rings = [_Ring(res, size, len(self.metrics)) for res, size in sorted(tiers)]
+        self.latest = -math.inf
+
+    def __contains__(self, entity_id: object) -> bool:
+        return entity_id in self._rows
+
+    def _row(self, entity_id: str) -> int:
+        row = self._rows.get(entity_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                row = len(self._open)
+                self._open.append([None] * len(self.rings))
+            self._rows[entity_id] = row
+        return row
+
+    def remove(self, entity_id: str) -> bool:
+        """Forget an entity's buckets; the fleet row keeps what it already counted."""
+        if entity_id == FLEET:
+            return False
+        with self.lock:
+            row = self._rows.pop(entity_id, None)
+            if row is None:
+                return False
+            self._open[row] = [None] * len(self.rings)
+            for ring in self.rings:
+                ring.clear(row)
+            self._free.append(row)
+            return True
+
+    def _close(self, row: int, tier: int, bucket: Bucket) -> None:
+        self.rings[tier].store(row, bucket)
+        if tier + 1 == len(self.rings):
+            return
+        epoch = bucket[0] * self.rings[tier].resolution // self.rings[tier + 1].resolution
+        opened = self._open[row]
+        parent = opened[tier + 1]
+        if parent is None or epoch > parent[0]:
+            if parent is not None:
+                self._close(row, tier + 1, parent)
+            parent = opened[tier + 1] = _new_bucket(epoch, len(self.metrics))
+        _fold(parent, bucket)
+
+    def _open_bucket(self, row: int, epoch: int) -> Bucket:
+        """The row's finest open bucket for ``epoch``, closing the previous one if it is older."""
+        opened = self._open[row]
+        bucket = opened[0]
+        if bucket is None or epoch > bucket[0]:
+            if bucket is not None:
+                self._close(row, 0, bucket)
+            bucket = opened[0] = _new_bucket(epoch, len(self.metrics))
+        return bucket
+
+    def add(self, entity_id: str, ts: float, values: Sequence[float]) -> None:
+        self.add_many((entity_id,), (ts,), (values,))
+
+    def add_many(self, entity_ids: Sequence[str], ts: Sequence[float], values: Sequence[Sequence[float]]) -> None:
+        resolution = self.rings[0].resolution
+        with self.lock:
+            if len(entity_ids) < FLEET_VECTORIZE_MIN:
+                epochs = [int(t // resolution) for t in ts]
+                for epoch, vals in zip(epochs, values):
+                    _fold_values(self._open_bucket(0, epoch), vals)
+            else:
+                ts_arr = np.fromiter(ts, dtype=np.float64, count=len(entity_ids))
+                epoch_arr = (ts_arr // resolution).astype(np.int64)
+                self._add_fleet(epoch_arr, np.asarray(values, dtype=np.float64))
+                epochs = epoch_arr.tolist()
+            for entity_id, epoch, vals in zip(entity_ids, epochs, values):
+                _fold_values(self._open_bucket(self._row(entity_id), epoch), vals)
+            latest = max(ts)
+            if latest > self.latest:
+                self.latest = latest
+
+    def _add_fleet(self, epochs: np.ndarray, values: np.ndarray) -> None:
+        # One pre-reduced bucket per distinct epoch instead of one fleet update per event
+        order = np.argsort(epochs, kind="stable")
+        epochs, values = epochs[order], values[order]
+        starts = np.flatnonzero(np.concatenate(([True], epochs[1:] != epochs[:-1])))
+        counts = np.diff(np.append(starts, len(epochs)))
+        stats = np.empty((len(starts), 3 * values.shape[1]))
+        stats[:, 0::3] = np.add.reduceat(values, starts)
+        stats[:, 1::3] = np.minimum.reduceat(values, starts)
+        stats[:, 2::3] = np.maximum.reduceat(values, starts)
+        for epoch, count, reduced in zip(epochs[starts].tolist(), counts.tolist(), stats.tolist()):
+            _fold(self._open_bucket(0, epoch), [epoch, count] + reduced)
+
+    def query(
+        self, entity_id: str, window_seconds: float, series: bool = False, now: Optional[float] = None
+    ) -> Optional[Dict]:
+        """Raw rollup of ``entity_id`` (or FLEET) over the last ``window_seconds``; None if never seen.
+
+        ``now`` defaults to the newest event time in this store.
+        """
+        with self.lock:
+            row = self._rows.get(entity_id)
+            if row is None:
+                return None
+            now = self.latest if now is None else now
+            tier = next((i for i, r in enumerate(self.rings) if r.span >= window_seconds), len(self.rings) - 1)
+            ring = self.rings[tier]
+            buckets = max(1, min(ring.size, math.ceil(window_seconds / ring.resolution)))
+            by_epoch: Dict[int, Bucket] = {}
+            if now > -math.inf:
+                last = int(now // ring.resolution)
+                first = last - buckets + 1
+                # Closed buckets of this tier, plus whatever finer tiers have not folded up yet
+                pending = ring.buckets(row, first, last)
+                for finer, bucket in enumerate(self._open[row][: tier + 1]):
+                    if bucket is not None:
+                        epoch = bucket[0] * self.rings[finer].resolution // ring.resolution
+                        if first <= epoch <= last:
+                            pending.append([epoch] + bucket[1:])
+                for bucket in pending:
+                    merged = by_epoch.get(bucket[0])
+                    if merged is None:
+                        by_epoch[bucket[0]] = list(bucket)
+                    else:
+                        _fold(merged, bucket)
+            total = _new_bucket(0, len(self.metrics))
+            for bucket in by_epoch.values():
+                _fold(total, bucket)
+            result = {
+                "window_seconds": buckets * ring.resolution,
+                "resolution_seconds": ring.resolution,
+                "count": int(total[1]),
+                "metrics": _stats(self.metrics, total),
+            }
+            if series:
+                result["series"] = [
+                    {
+                        "start": float(epoch * ring.resolution),
+                        "count": int(bucket[1]),
+                        "metrics": _stats(self.metrics, bucket),
+                    }
+                    for epoch, bucket in sorted(by_epoch.items())
+                ]
+            return result
+
+
+def _stats(metrics: Sequence[str], bucket: Bucket) -> Dict[str, Dict[str, float]]:
+    return {
+        name: {"sum": bucket[2 + 3 * m], "min": bucket[3 + 3 * m], "max": bucket[4 + 3 * m]}
+        for m, name in enumerate(metrics)
+    }
+
+
+def format_rollup(raw: Dict) -> Dict:
+    """Turn a raw rollup into the /rollups document: averages added, empty min/max as null."""
+
+    def metrics(count: int, stats: Dict[str, Dict[str, float]]) -> Dict[str, Dict]:
+        return {
+            name: {
+                "avg": round(s["sum"] / count, 3) if count else None,
+                "min": s["min"] if count else None,
+                "max": s["max"] if count else None,
+                "sum": round(s["sum"], 3),
+            }
+            for name, s in stats.items()
+        }
+
+    doc = {
+        "window_seconds": raw["window_seconds"],
+        "resolution_seconds": raw["resolution_seconds"],
+        "count": raw["count"],
+        "metrics": metrics(raw["count"], raw["metrics"]),
+    }
+    if "series" in raw:
+        doc["series"] = [
+            {
+                "start": datetime.fromtimestamp(b["start"], tz=timezone.utc).isoformat(),
+                "count": b["count"],
+                "metrics": metrics(b["count"], b["metrics"]),
+            }
+            for b in raw["series"]
+        ]
+    return doc
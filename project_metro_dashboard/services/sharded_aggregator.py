@@ -0,0 +1,127 @@
+import multiprocessing as mp
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import settings
+from models.station_event import StationEvent
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator, Event, format_stats, with_percentiles
+from services.quantiles import format_percentiles, merge_sketches
+
+
+def shard_of(key: str, shards: int) -> int:
+    # crc32 rather than hash(): str hashes are salted per process
+    return zlib.crc32(key.encode()) % shards
+
+
+def shard_key(event: Event) -> str:
+    return event.train_id if isinstance(event, TrainEvent) else event.station_id  # type: ignore[union-attr]
+
+
+def merge_kpis(parts: Iterable[Dict[str, float]]) -> Dict[str, float]:
+    """Sum per-shard running KPI totals; every KPI the aggregator keeps is additive."""
+    merged: Dict[str, float] = {}
+    for part in parts:
+        for key, value in part.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+# Events cross the pipe as (is_train, field values): about half the pickling cost of
+# models, and the router is the one serial stage of the pool
+_TRAIN_FIELDS = tuple(TrainEvent.model_fields)
+_STATION_FIELDS = tuple(StationEvent.model_fields)
+PackedEvent = Tuple[bool, Tuple[Any, ...]]
+
+
+def _pack(event: Event) -> PackedEvent:
+    return isinstance(event, TrainEvent), tuple(event.__dict__.values())
+
+
+def _unpack(packed: PackedEvent) -> Event:
+    is_train, values = packed
+    if is_train:
+        return TrainEvent.model_construct(**dict(zip(_TRAIN_FIELDS, values)))
+    return StationEvent.model_construct(**dict(zip(_STATION_FIELDS, values)))
+
+
+def _shard_process(conn: Any, backend: Optional[str]) -> None:
+    aggregator = Aggregator(backend=backend)
+    while True:
+        op, arg = conn.recv()
+        if op == "update":
+            aggregator.update_many([_unpack(packed) for packed in arg])
+        elif op == "kpis":
+            conn.send(aggregator.kpis.as_dict())
+        elif op == "records":
+            conn.send(aggregator.live_records(arg))
+        elif op == "latest":
+            conn.send(aggregator.sketches.latest if aggregator.sketches is not None else None)
+        elif op == "sketches":
+            conn.send(aggregator.percentile_sketches(None, arg))
+        elif op == "close":
+            conn.close()
+            return
+
+
+class ShardProcessPool:
+    """Shards in worker processes, for ingest beyond what one interpreter lock allows.
+
+    Events are routed by a hash of their train/station id and sent to their
+    shard in batches of ``batch_size``. Reads are request/response over each
+    shard's pipe after flushing pending batches. Shards keep independent
+    version counters, so this pool serves stats and records but not delta
+    cursors; the app keeps a single Aggregator for that reason.
+    """
+
+    def __init__(self, shards: int = 4, backend: Optional[str] = None, batch_size: int = 256) -> None:
+        self.batch_size = batch_size
+        self._conns: List[Any] = []
+        self._procs: List[mp.Process] = []
+        for i in range(shards):
+            parent, child = mp.Pipe()
+            proc = mp.Process(target=_shard_process, args=(child, backend), name=f"aggregator-shard-{i}", daemon=True)
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+        self._pending: List[List[PackedEvent]] = [[] for _ in range(shards)]
+
+    def submit(self, event: Event) -> None:
+        i = shard_of(shard_key(event), len(self._conns))
+        batch = self._pending[i]
+        batch.append(_pack(event))
+        if len(batch) >= self.batch_size:
+            self._conns[i].send(("update", batch))
+            self._pending[i] = []
+
+    def flush(self) -> None:
+        for i, batch in enumerate(self._pending):
+            if batch:
+                self._conns[i].send(("update", batch))
+                self._pending[i] = []
+
+    def _ask(self, op: str, arg: Any = None) -> List[Any]:
+        self.flush()
+        for conn in self._conns:
+            conn.send((op, arg))
+        return [conn.recv() for conn in self._conns]
+
+    def compute_stats(self, now: Optional[datetime] = None) -> Dict:
+        stats = format_stats(merge_kpis(self._ask("kpis")), now)
+        latest = [t for t in self._ask("latest") if t is not None]
+        if not latest:
+            return stats
+        merged = merge_sketches(self._ask("sketches", max(latest)))
+        return with_percentiles(stats, format_percentiles(merged, settings.PERCENTILE_WINDOW_SECONDS))
+
+    def section(self, name: str) -> List[Dict]:
+        return [record for part in self._ask("records", name) for record in part]
+
+    def close(self) -> None:
+        self.flush()
+        for conn in self._conns:
+            conn.send(("close", None))
+        for proc in self._procs:
+            proc.join(5)
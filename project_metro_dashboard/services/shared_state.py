@@ -0,0 +1,427 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import settings
+from services.aggregator import AggregatorSnapshot, format_stats, heading_records, with_percentiles
+from services.event_log import ALERTS, KIND_STATION, KIND_TRAIN, RECORD_DTYPE
+from services.incoming import estimate_arrivals
+from services.quantiles import PERCENTILE_METRICS, QUANTILE_KEYS
+from services.stations import StationCatalog, make_station_catalog
+from services.train_index import filter_records
+
+
+logger = logging.getLogger("shared_state")
+
+MAGIC = b"METROSHM"
+KPI_DTYPES = [
+    ("count", "<i8"),
+    ("delay_sum", "<f8"),
+    ("speed_sum", "<f8"),
+    ("passengers_total", "<i8"),
+    ("on_time", "<i8"),
+    ("crowded_stations", "<i8"),
+]
+KPI_FIELDS = tuple(name for name, _ in KPI_DTYPES)
+# The fleet-wide /stats percentiles as of the publish; window 0 means none, NaN an empty quantile
+PERCENTILE_DTYPES = [("pct_window", "<i8")] + [
+    (f"{metric}_{key}", "<i8" if key == "count" else "<f8")
+    for metric in PERCENTILE_METRICS
+    for key in ("count",) + QUANTILE_KEYS
+]
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("seq", "<i8"), ("active", "<i8"), ("max_trains", "<i8"), ("max_stations", "<i8")])
+SLOT_DTYPE = np.dtype(
+    [("version", "<i8"), ("trains_version", "<i8"), ("stations_version", "<i8"), ("n_trains", "<i8"), ("n_stations", "<i8")]
+    + [("published_at", "<f8")]
+    + KPI_DTYPES
+    + PERCENTILE_DTYPES
+)
+# Segments created by publishers in this process; readers must not untrack those
+_owned: Set[str] = set()
+
+
+def _layout(max_trains: int, max_stations: int) -> Tuple[int, int, int]:
+    """(slot offset of slot 0, bytes per slot, total size) for the given capacities."""
+    slot_size = SLOT_DTYPE.itemsize + (max_trains + max_stations) * RECORD_DTYPE.itemsize
+    return HEADER_DTYPE.itemsize, slot_size, HEADER_DTYPE.itemsize + 2 * slot_size
+
+
+class _Segment:
+    """Typed views over a shared memory segment: a header and two data slots."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, max_trains: int, max_stations: int) -> None:
+        self.shm = shm
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=shm.buf)
+        first, slot_size, _ = _layout(max_trains, max_stations)
+        self.slots = []
+        for i in range(2):
+            base = first + i * slot_size
+            meta = np.ndarray((), SLOT_DTYPE, buffer=shm.buf, offset=base)
+            records_at = base + SLOT_DTYPE.itemsize
+            trains = np.ndarray((max_trains,), RECORD_DTYPE, buffer=shm.buf, offset=records_at)
+            stations = np.ndarray(
+                (max_stations,), RECORD_DTYPE, buffer=shm.buf, offset=records_at + max_trains * RECORD_DTYPE.itemsize
+            )
+            self.slots.append((meta, trains, stations))
+
+    def release(self) -> None:
+        # Views must go before the mapping can be closed
+        self.header = None  # type: ignore[assignment]
+        self.slots = []
+        self.shm.close()
+
+
+def _timestamps(records: List[Dict]) -> List[float]:
+    return [r["ts"].timestamp() if isinstance(r["ts"], datetime) else float(r["ts"]) for r in records]
+
+
+def _pack_trains(records: List[Dict], out: np.ndarray) -> None:
+    n = len(records)
+    out[:n] = np.zeros(n, RECORD_DTYPE)
+    out["kind"][:n] = KIND_TRAIN
+    out["id"][:n] = [r["id"] for r in records]
+    out["entity"][:n] = [r["train_id"] for r in records]
+    out["lat"][:n] = [r["location"][0] for r in records]
+    out["lon"][:n] = [r["location"][1] for r in records]
+    out["speed"][:n] = [r["speed_kmph"] for r in records]
+    out["ts"][:n] = _timestamps(records)
+    out["delay"][:n] = [r["delay_min"] for r in records]
+    out["passengers"][:n] = [r["passenger_count"] for r in records]
+    out["capacity"][:n] = [r["capacity"] for r in records]
+    out["next_station"][:n] = [r["next_station"] or "" for r in records]
+    out["status"][:n] = [r["status"] for r in records]
+
+
+def _pack_stations(records: List[Dict], out: np.ndarray) -> None:
+    n = len(records)
+    out[:n] = np.zeros(n, RECORD_DTYPE)
+    out["kind"][:n] = KIND_STATION
+    out["id"][:n] = [r["id"] for r in records]
+    out["entity"][:n] = [r["station_id"] for r in records]
+    out["ts"][:n] = _timestamps(records)
+    out["occupancy"][:n] = [r["platform_occupancy"] for r in records]
+    out["avg_wait"][:n] = [r["avg_wait_min"] for r in records]
+    out["alerts"][:n] = [sum(1 << bit for bit, name in enumerate(ALERTS) if name in r["alerts"]) for r in records]
+
+
+def _pack_percentiles(percentiles: Optional[Dict], meta: np.ndarray) -> None:
+    meta["pct_window"] = percentiles["window_seconds"] if percentiles is not None else 0
+    for metric in PERCENTILE_METRICS:
+        entry = percentiles.get(metric, {}) if percentiles is not None else {}
+        meta[f"{metric}_count"] = entry.get("count", 0)
+        for key in QUANTILE_KEYS:
+            value = entry.get(key)
+            meta[f"{metric}_{key}"] = np.nan if value is None else value
+
+
+def _unpack_percentiles(meta: np.ndarray) -> Optional[Dict]:
+    if not meta["pct_window"]:
+        return None
+    percentiles: Dict = {"window_seconds": meta["pct_window"].item()}
+    for metric in PERCENTILE_METRICS:
+        entry: Dict = {"count": meta[f"{metric}_count"].item()}
+        for key in QUANTILE_KEYS:
+            value = meta[f"{metric}_{key}"].item()
+            entry[key] = None if np.isnan(value) else value
+        percentiles[metric] = entry
+    return percentiles
+
+
+def _decode(column: np.ndarray) -> List[str]:
+    return np.char.decode(column, "utf-8").tolist()
+
+
+def _unpack_trains(rows: np.ndarray) -> Dict[str, Dict]:
+    ts = [datetime.fromtimestamp(t, tz=timezone.utc) for t in rows["ts"].tolist()]
+    train_ids = _decode(rows["entity"])
+    fields = zip(
+        _decode(rows["id"]), train_ids, rows["lat"].tolist(), rows["lon"].tolist(), rows["speed"].tolist(), ts,
+        rows["delay"].tolist(), rows["passengers"].tolist(), _decode(rows["next_station"]), _decode(rows["status"]),
+        rows["capacity"].tolist(),
+    )
+    return {
+        train_id: {
+            "id": eid, "train_id": train_id, "location": (lat, lon), "speed_kmph": speed, "ts": t,
+            "delay_min": delay, "passenger_count": passengers, "next_station": nxt or None, "status": status,
+            "capacity": capacity,
+        }
+        for eid, train_id, lat, lon, speed, t, delay, passengers, nxt, status, capacity in fields
+    }
+
+
+def _unpack_stations(rows: np.ndarray) -> Dict[str, Dict]:
+    ts = [datetime.fromtimestamp(t, tz=timezone.utc) for t in rows["ts"].tolist()]
+    fields = zip(
+        _decode(rows["id"]), _decode(rows["entity"]), ts, rows["occupancy"].tolist(), rows["avg_wait"].tolist(),
+        rows["alerts"].tolist(),
+    )
+    return {
+        station_id: {
+            "id": eid, "station_id": station_id, "ts": t, "platform_occupancy": occupancy, "avg_wait_min": wait,
+            "alerts": [name for bit, name in enumerate(ALERTS) if mask & (1 << bit)],
+        }
+        for eid, station_id, t, occupancy, wait, mask in fields
+    }
+
+
+class SharedStatePublisher:
+    """Writes the aggregator's published snapshot into a shared memory segment.
+
+    The segment holds a header and two slots. Each publish fills the inactive
+    slot, then flips ``active`` inside a seqlock: ``seq`` is odd while the
+    header changes, and readers retry whenever it moved under them. Records
+    use the event log's fixed-width row layout, so alert strings outside
+    ``event_log.ALERTS`` are not carried over.
+    """
+
+    def __init__(
+        self,
+        aggregator: Any,
+        name: str,
+        max_trains: int = 50000,
+        max_stations: int = 5000,
+        interval_seconds: float = 0.5,
+    ) -> None:
+        self.aggregator = aggregator
+        self.name = name
+        self.interval_seconds = interval_seconds
+        _, _, size = _layout(max_trains, max_stations)
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by an ingest process that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        _owned.add(shm.name)
+        self._segment = _Segment(shm, max_trains, max_stations)
+        header = self._segment.header
+        header["max_trains"], header["max_stations"] = max_trains, max_stations
+        header["seq"], header["active"] = 0, 0
+        header["magic"] = MAGIC
+        self.published_version = -1
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self) -> bool:
+        """Copy the current snapshot in if it changed; returns True if a new slot went live."""
+        snap: AggregatorSnapshot = self.aggregator.current()
+        if snap.version == self.published_version:
+            return False
+        header = self._segment.header
+        max_trains, max_stations = int(header["max_trains"]), int(header["max_stations"])
+        if len(snap.trains) > max_trains or len(snap.stations) > max_stations:
+            logger.error(
+                "Fleet (%d trains, %d stations) exceeds shared state capacity (%d, %d); not publishing",
+                len(snap.trains), len(snap.stations), max_trains, max_stations,
+            )
+            return False
+        target = 1 - int(header["active"])
+        meta, trains, stations = self._segment.slots[target]
+        _pack_trains(snap.records("trains"), trains)
+        _pack_stations(snap.records("stations"), stations)
+        meta["version"] = snap.version
+        meta["trains_version"] = snap.section_versions["trains"]
+        meta["stations_version"] = snap.section_versions["stations"]
+        meta["n_trains"], meta["n_stations"] = len(snap.trains), len(snap.stations)
+        for field in KPI_FIELDS:
+            meta[field] = snap.kpis[field]
+        _pack_percentiles(self.aggregator.percentiles(), meta)
+        meta["published_at"] = time.time()
+        header["seq"] += 1
+        header["active"] = target
+        header["seq"] += 1
+        self.published_version = snap.version
+        return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="shared-state", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def close(self) -> None:
+        self.stop()
+        shm = self._segment.shm
+        self._segment.release()
+        shm.unlink()
+        _owned.discard(shm.name)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.publish()
+            except Exception:  # noqa: BLE001
+                logger.exception("Shared state publish failed")
+
+
+class SharedStateReader:
+    """Read-only aggregator stand-in backed by a SharedStatePublisher segment.
+
+    Offers the read API the HTTP handlers use (``current``, ``snapshot``,
+    ``section``, ``compute_stats``, ``delta``, ``staleness``). A read first
+    checks the header; rows are copied and decoded only when the published
+    version changed, once per process. Until the ingest process has created
+    the segment, reads return an empty snapshot.
+    """
+
+    def __init__(self, name: str, max_retries: int = 100) -> None:
+        self.name = name
+        self.max_retries = max_retries
+        self.lock = threading.RLock()  # only guards the local cache; never shared with ingest
+        self._segment: Optional[_Segment] = None
+        self._snap = AggregatorSnapshot(0, {"trains": 0, "stations": 0}, {}, {}, {f: 0 for f in KPI_FIELDS})
+        self._published_at = 0.0
+        self._percentiles: Optional[Dict] = None
+        self._stations: Optional[StationCatalog] = None
+        # station_id -> (snapshot version, (trains version, arrivals))
+        self._incoming: Dict[str, Tuple[int, Tuple[int, List[Dict]]]] = {}
+
+    def _attach(self) -> Optional[_Segment]:
+        if self._segment is None:
+            try:
+                shm = shared_memory.SharedMemory(self.name)
+            except FileNotFoundError:
+                return None
+            # Attaching registers the segment with this process's resource tracker, which
+            # would unlink it on exit; the ingest process owns its lifetime
+            if shm.name not in _owned:
+                resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+            header = np.ndarray((), HEADER_DTYPE, buffer=shm.buf)
+            if bytes(header["magic"]) != MAGIC:
+                del header
+                shm.close()
+                return None
+            max_trains, max_stations = int(header["max_trains"]), int(header["max_stations"])
+            del header
+            self._segment = _Segment(shm, max_trains, max_stations)
+        return self._segment
+
+    def _read(self, segment: _Segment) -> Optional[AggregatorSnapshot]:
+        header = segment.header
+        for _ in range(self.max_retries):
+            seq = int(header["seq"])
+            if seq % 2:
+                continue
+            meta, trains, stations = segment.slots[int(header["active"])]
+            version = int(meta["version"])
+            if version == self._snap.version and int(header["seq"]) == seq:
+                return self._snap
+            meta = meta.copy()
+            published_at = float(meta["published_at"])
+            train_rows = trains[: int(meta["n_trains"])].copy()
+            station_rows = stations[: int(meta["n_stations"])].copy()
+            if int(header["seq"]) != seq:
+                continue
+            self._published_at = published_at
+            self._percentiles = _unpack_percentiles(meta)
+            return AggregatorSnapshot(
+                version,
+                {"trains": int(meta["trains_version"]), "stations": int(meta["stations_version"])},
+                _unpack_trains(train_rows),
+                _unpack_stations(station_rows),
+                {field: meta[field].item() for field in KPI_FIELDS},
+            )
+        logger.warning("Shared state kept changing during %d read attempts", self.max_retries)
+        return None
+
+    @property
+    def version(self) -> int:
+        return self.current().version
+
+    @property
+    def section_versions(self) -> Dict[str, int]:
+        return self.current().section_versions
+
+    def current(self) -> AggregatorSnapshot:
+        segment = self._attach()
+        if segment is None:
+            return self._snap
+        with self.lock:
+            snap = self._read(segment)
+            if snap is not None:
+                self._snap = snap
+            return self._snap
+
+    def publish(self) -> AggregatorSnapshot:
+        return self.current()
+
+    def snapshot(self) -> Dict:
+        snap = self.current()
+        return {"trains": snap.records("trains"), "stations": snap.records("stations")}
+
+    def section(self, name: str) -> Tuple[int, List[Dict]]:
+        snap = self.current()
+        return snap.section_versions[name], snap.records(name)
+
+    def compute_stats(self, full_scan: bool = False, now: Optional[datetime] = None) -> Dict:
+        snap = self.current()
+        return with_percentiles(format_stats(snap.kpis, now), self._percentiles)
+
+    def delta(self, name: str, since: int) -> Dict:
+        # No change history crosses the segment: unchanged cursors get an empty delta, anything else a full resync
+        return self.current().delta(name, since)
+
+    def rollup(self, name: str, entity_id: str, window_seconds: float, series: bool = False) -> Optional[Dict]:
+        # Rollups stay in the ingest process
+        return None
+
+    def history(
+        self, train_id: str, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Optional[List[Dict]]:
+        # Trajectory history stays in the ingest process
+        return None
+
+    def trains_in_bbox(
+        self, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+    ) -> Optional[Tuple[int, List[Dict]]]:
+        # The spatial index stays in the ingest process
+        return None
+
+    def nearest_trains(self, lat: float, lon: float, k: int) -> Optional[Tuple[int, List[Dict]]]:
+        return None
+
+    def query_trains(self, filters: Dict[str, object]) -> Tuple[int, List[Dict]]:
+        # Secondary indexes stay in the ingest process; filter the published records
+        snap = self.current()
+        return snap.section_versions["trains"], filter_records(snap.trains.values(), filters)
+
+    def incoming_trains(self, station_id: str) -> Optional[Tuple[int, List[Dict]]]:
+        # No next_station index crosses the segment; scan the published records once per version and station
+        if self._stations is None:
+            self._stations = make_station_catalog()
+        location = self._stations.location(station_id)
+        if location is None:
+            return None
+        snap = self.current()
+        cached = self._incoming.get(station_id)
+        if cached is not None and cached[0] == snap.version:
+            return cached[1]
+        arrivals = estimate_arrivals(heading_records(snap, station_id, None), location, settings.ETA_MIN_SPEED_KMPH)
+        result = snap.section_versions["trains"], arrivals
+        self._incoming[station_id] = (snap.version, result)
+        return result
+
+    def percentiles(self, station_id: Optional[str] = None) -> Optional[Dict]:
+        # Only the fleet-wide percentiles are published; per-station sketches stay in the ingest process
+        self.current()
+        return self._percentiles if station_id is None else None
+
+    def staleness(self) -> Dict[str, float]:
+        # Only the ingest process knows its live version; age is time since its last publish
+        snap = self.current()
+        age = time.time() - self._published_at if self._published_at else 0.0
+        return {"version": snap.version, "versions_behind": 0, "age_seconds": round(age, 3)}
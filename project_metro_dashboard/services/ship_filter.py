@@ -0,0 +1,132 @@
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+from config import settings
+from services.geo import KM_PER_DEG_LAT
+from services.metrics_exporter import es_docs_filter_shipped, es_docs_filter_suppressed
+
+
+class ShipPolicy:
+    """How often documents of one index are worth shipping, per entity (``key`` field).
+
+    A document always ships for a new entity or when any ``on_change`` field
+    differs from the entity's last shipped document. Otherwise it is held back
+    until ``min_interval_seconds`` passed since that document, and then ships
+    only if a ``deadband`` field moved by more than its threshold (``location``
+    in metres, other fields in their own units) or ``max_interval_seconds``
+    passed. Without a deadband, every document past the minimum interval ships.
+    Intervals are in event time (the document's ``ts``).
+    """
+
+    def __init__(
+        self,
+        key: str,
+        on_change: Sequence[str] = (),
+        deadband: Optional[Mapping[str, float]] = None,
+        min_interval_seconds: float = 0.0,
+        max_interval_seconds: float = 0.0,
+    ) -> None:
+        self.key = key
+        self.on_change = tuple(on_change)
+        self.deadband: Dict[str, float] = dict(deadband or {})
+        self.location_m = self.deadband.pop("location", None)
+        self.min_interval_seconds = min_interval_seconds
+        self.max_interval_seconds = max_interval_seconds
+
+    @classmethod
+    def from_dict(cls, spec: Mapping[str, Any]) -> "ShipPolicy":
+        return cls(
+            spec["key"],
+            spec.get("on_change", ()),
+            spec.get("deadband"),
+            float(spec.get("min_interval_seconds", 0)),
+            float(spec.get("max_interval_seconds", 0)),
+        )
+
+    def verdict(self, doc: Mapping[str, Any], ts: float, last: Optional[Tuple[float, Mapping[str, Any]]]) -> str:
+        """Why ``doc`` ships ("first", "changed", "heartbeat", "moved", "sampled") or is held ("rate", "deadband")."""
+        if last is None:
+            return "first"
+        last_ts, shipped = last
+        for field in self.on_change:
+            if doc.get(field) != shipped.get(field):
+                return "changed"
+        elapsed = ts - last_ts
+        if elapsed < self.min_interval_seconds:
+            return "rate"
+        if self.max_interval_seconds and elapsed >= self.max_interval_seconds:
+            return "heartbeat"
+        if not self.deadband and self.location_m is None:
+            return "sampled"
+        for field, threshold in self.deadband.items():
+            value, before = doc.get(field), shipped.get(field)
+            if value != before and (value is None or before is None or abs(value - before) > threshold):
+                return "moved"
+        if self.location_m is not None and _moved_m(doc.get("location"), shipped.get("location")) > self.location_m:
+            return "moved"
+        return "deadband"
+
+
+# Verdicts that keep a document out of Elasticsearch
+SUPPRESSED = frozenset(("rate", "deadband"))
+
+
+def _moved_m(location: Any, before: Any) -> float:
+    if location is None or before is None:
+        return math.inf
+    # Equirectangular approximation: well within a metre at deadband distances
+    dlat = location[0] - before[0]
+    dlon = (location[1] - before[1]) * math.cos(math.radians(location[0]))
+    return math.hypot(dlat, dlon) * KM_PER_DEG_LAT * 1000
+
+
+class ShipFilter:
+    """Per-index deadband and sampling filter in front of ``ElasticLogger.index``.
+
+    Remembers the last shipped document per entity of every index with a
+    ShipPolicy; documents of other indexes always ship. O(1) per document.
+    """
+
+    def __init__(self, policies: Mapping[str, ShipPolicy]) -> None:
+        self.policies = dict(policies)
+        self.lock = threading.Lock()
+        self._last: Dict[str, Dict[Any, Tuple[float, Mapping[str, Any]]]] = {index: {} for index in self.policies}
+        self._counters: Dict[Tuple[str, str], Any] = {}
+        self.shipped = 0
+        self.suppressed = 0
+
+    def _count(self, index: str, verdict: str) -> None:
+        counter = self._counters.get((index, verdict))
+        if counter is None:
+            metric = es_docs_filter_suppressed if verdict in SUPPRESSED else es_docs_filter_shipped
+            counter = self._counters[(index, verdict)] = metric.labels(index=index, reason=verdict)
+        counter.inc()
+
+    def admit(self, index: str, doc: Mapping[str, Any]) -> bool:
+        """Whether ``doc`` should be shipped; remembers it as its entity's last shipped document if so."""
+        policy = self.policies.get(index)
+        if policy is None:
+            return True
+        stamp = doc.get("ts")
+        ts = stamp.timestamp() if isinstance(stamp, datetime) else time.time()
+        entity = doc.get(policy.key)
+        with self.lock:
+            last = self._last[index]
+            verdict = policy.verdict(doc, ts, last.get(entity))
+            ship = verdict not in SUPPRESSED
+            if ship:
+                last[entity] = (ts, doc)
+                self.shipped += 1
+            else:
+                self.suppressed += 1
+            self._count(index, verdict)
+        return ship
+
+
+def make_ship_filter() -> Optional[ShipFilter]:
+    if not settings.ES_SHIP_POLICIES:
+        return None
+    return ShipFilter({index: ShipPolicy.from_dict(spec) for index, spec in settings.ES_SHIP_POLICIES.items()})
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+
+class WallClock:
+    """Real time: ticks are stamped with datetime.now and paced with asyncio.sleep."""
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+
+class _Timer:
+    def __init__(self, interval: timedelta, next_due: datetime, callback: Callable[[datetime], None]) -> None:
+        self.interval = interval
+        self.next_due = next_due
+        self.callback = callback
+
+
+class VirtualClock:
+    """Simulated time that only moves when the simulator sleeps.
+
+    ``sleep`` first waits for ``queue`` to be fully consumed, then advances the
+    clock without real waiting, so ticks run as fast as the consumer absorbs them
+    and the aggregator state at every tick boundary is reproducible. Callbacks
+    registered with ``every`` fire on simulated time, like interval jobs.
+    """
+
+    def __init__(self, start: datetime, queue: Optional[asyncio.Queue] = None) -> None:
+        self._now = start
+        self.queue = queue
+        self._timers: List[_Timer] = []
+
+    def now(self) -> datetime:
+        return self._now
+
+    def every(self, seconds: float, callback: Callable[[datetime], None]) -> None:
+        interval = timedelta(seconds=seconds)
+        self._timers.append(_Timer(interval, self._now + interval, callback))
+
+    async def sleep(self, seconds: float) -> None:
+        if self.queue is not None:
+            await self.queue.join()
+        self._now += timedelta(seconds=seconds)
+        for timer in self._timers:
+            while timer.next_due <= self._now:
+                timer.callback(timer.next_due)
+                timer.next_due += timer.interval
+        # Let other tasks (HTTP handlers, the consumer) run between ticks
+        await asyncio.sleep(0)
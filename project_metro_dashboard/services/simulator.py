@@ -3,28 +3,50 @@ import math
 import random
 import time
 import uuid
-from datetime import datetime, timezone
-from typing import Dict, List, Tuple
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
 
-from geopy.distance import geodesic
+import numpy as np
 
 from config import settings
 from models.station_event import StationEvent
 from models.train_event import TrainEvent
+from services.geo import KM_PER_DEG_LAT, CityBounds
+from services.sim_clock import VirtualClock, WallClock
+from services.stations import StationCatalog, layout_stations, make_station_catalog
 
 
-CityBounds = Tuple[Tuple[float, float], Tuple[float, float]]
+Event = Union[TrainEvent, StationEvent]
+Clock = Union[WallClock, VirtualClock]
 
+# Seconds a train stays at a station, drawn uniformly per stop
+DWELL_SECONDS = (10.0, 40.0)
 
-def _random_point(bounds: CityBounds) -> Tuple[float, float]:
+
+def _station_alerts(occupancy: int, avg_wait: float) -> List[str]:
+    alerts: List[str] = []
+    if occupancy > 350:
+        alerts.append("High occupancy")
+    if avg_wait > 6:
+        alerts.append("Long wait")
+    return alerts
+
+
+def _random_point(bounds: CityBounds, rng: random.Random) -> Tuple[float, float]:
     (min_lat, min_lon), (max_lat, max_lon) = bounds
     return (
-        random.uniform(min_lat, max_lat),
-        random.uniform(min_lon, max_lon),
+        rng.uniform(min_lat, max_lat),
+        rng.uniform(min_lon, max_lon),
     )
 
 
 class Simulator:
+    """Trains run between the stations of their route, dwelling at each before heading to the next.
+
+    Stations come from ``stations`` or, by default, ``layout_stations`` over the
+    city bounds; ``station_count`` is then taken from the catalog.
+    """
+
     def __init__(
         self,
         train_count: int,
@@ -32,68 +54,90 @@ class Simulator:
         train_capacity: int,
         city_bounds: CityBounds = ((28.40, 77.00), (28.90, 77.40)),
         tick_seconds: float = 2.0,
+        seed: Optional[int] = None,
+        stations: Optional[StationCatalog] = None,
     ) -> None:
+        self.stations = stations if stations is not None else layout_stations(station_count, city_bounds)
         self.train_count = train_count
-        self.station_count = station_count
+        self.station_count = len(self.stations)
         self.train_capacity = train_capacity
         self.city_bounds = city_bounds
         self.tick_seconds = tick_seconds
-        self.station_ids: List[str] = [f"STN-{i:03d}" for i in range(station_count)]
+        self.station_ids: List[str] = self.stations.ids
         self.train_ids: List[str] = [f"TRN-{i:03d}" for i in range(train_count)]
         self.train_state: Dict[str, Dict] = {}
+        self.random = random.Random(seed)
+        self.seeded = seed is not None
 
     def _init_trains(self) -> None:
         for t in self.train_ids:
-            start = _random_point(self.city_bounds)
-            planned_stops = random.sample(self.station_ids, k=min(10, len(self.station_ids)))
+            rng = self.random
+            start = _random_point(self.city_bounds, rng)
+            planned_stops = rng.sample(self.station_ids, k=min(10, len(self.station_ids)))
+            route_pos = rng.randrange(len(planned_stops)) if planned_stops else 0
             self.train_state[t] = {
                 "location": start,
-                "speed_kmph": random.uniform(20.0, 60.0),
-                "delay_min": random.uniform(-1.0, 8.0),
-                "passenger_count": random.randint(20, self.train_capacity),
-                "next_station": random.choice(planned_stops),
+                "speed_kmph": rng.uniform(20.0, 60.0),
+                "delay_min": rng.uniform(-1.0, 8.0),
+                "passenger_count": rng.randint(20, self.train_capacity),
+                "next_station": planned_stops[route_pos] if planned_stops else None,
                 "status": "running",
                 "route": planned_stops,
+                "route_pos": route_pos,
+                "dwell_left": 0.0,
                 "capacity": self.train_capacity,
             }
 
-    async def run(self, queue: asyncio.Queue) -> None:
-        self._init_trains()
-        while True:
-            ts = datetime.now(timezone.utc)
-            # Update trains
-            for train_id in self.train_ids:
-                st = self.train_state[train_id]
-                lat, lon = st["location"]
-                # Move by small random delta
-                bearing = random.uniform(0, 360)
-                step_km = st["speed_kmph"] * self.tick_seconds / 3600.0
-                dlat = (step_km / 111.0) * math.cos(math.radians(bearing))
-                dlon = (step_km / (111.0 * math.cos(math.radians(lat)))) * math.sin(
-                    math.radians(bearing)
-                )
-                new_loc = (lat + dlat, lon + dlon)
-                # Wrap within bounds lightly
-                (min_lat, min_lon), (max_lat, max_lon) = self.city_bounds
-                new_loc = (
-                    max(min_lat, min(max_lat, new_loc[0])),
-                    max(min_lon, min(max_lon, new_loc[1])),
-                )
-                st["location"] = new_loc
-                st["speed_kmph"] = max(0.0, min(80.0, st["speed_kmph"] + random.uniform(-2, 2)))
-                st["delay_min"] += random.uniform(-0.2, 0.5)
-                # Passenger churn
-                delta_p = random.randint(-10, 12)
-                st["passenger_count"] = max(0, st["passenger_count"] + delta_p)
-                # Occasionally advance to next stop
-                if random.random() < 0.15 and st["route"]:
-                    st["next_station"] = random.choice(st["route"])  # simplification
-
-                ev = TrainEvent(
-                    id=str(uuid.uuid4()),
+    def _event_id(self) -> str:
+        # Seeded runs draw ids from the simulator's RNG so the whole stream is reproducible
+        if self.seeded:
+            return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+        return str(uuid.uuid4())
+
+    def _move_towards_next(self, st: Dict, rng: random.Random) -> None:
+        lat, lon = st["location"]
+        target_lat, target_lon = self.stations.location(st["next_station"])  # type: ignore[misc]
+        # Flat-earth approximation; stations are at most a city apart
+        north_km = (target_lat - lat) * KM_PER_DEG_LAT
+        east_km = (target_lon - lon) * KM_PER_DEG_LAT * math.cos(math.radians(lat))
+        remaining_km = math.hypot(north_km, east_km)
+        step_km = st["speed_kmph"] * self.tick_seconds / 3600.0
+        if step_km >= remaining_km:
+            st["location"] = (target_lat, target_lon)
+            st["dwell_left"] = rng.uniform(*DWELL_SECONDS)
+            st["status"] = "dwelling"
+        else:
+            frac = step_km / remaining_km
+            st["location"] = (lat + (target_lat - lat) * frac, lon + (target_lon - lon) * frac)
+
+    def step(self, ts: datetime) -> List[Event]:
+        """Advance every train by one tick and return the events it produced."""
+        rng = self.random
+        events: List[Event] = []
+        # Update trains
+        for train_id in self.train_ids:
+            st = self.train_state[train_id]
+            if st["dwell_left"] > 0:
+                st["dwell_left"] -= self.tick_seconds
+                if st["dwell_left"] <= 0:
+                    # Dwell over: head for the next stop of the route, wrapping around
+                    st["route_pos"] = (st["route_pos"] + 1) % len(st["route"])
+                    st["next_station"] = st["route"][st["route_pos"]]
+                    st["status"] = "running"
+            if st["dwell_left"] <= 0 and st["route"]:
+                self._move_towards_next(st, rng)
+            st["speed_kmph"] = max(0.0, min(80.0, st["speed_kmph"] + rng.uniform(-2, 2)))
+            st["delay_min"] += rng.uniform(-0.2, 0.5)
+            # Passenger churn
+            delta_p = rng.randint(-10, 12)
+            st["passenger_count"] = max(0, st["passenger_count"] + delta_p)
+
+            events.append(
+                TrainEvent(
+                    id=self._event_id(),
                     train_id=train_id,
-                    location=new_loc,
-                    speed_kmph=st["speed_kmph"],
+                    location=st["location"],
+                    speed_kmph=0.0 if st["status"] == "dwelling" else st["speed_kmph"],
                     ts=ts,
                     delay_min=max(-2.0, st["delay_min"]),
                     passenger_count=st["passenger_count"],
@@ -101,35 +145,193 @@ class Simulator:
                     status=st.get("status", "running"),
                     capacity=st.get("capacity", self.train_capacity),
                 )
-                await queue.put(ev)
+            )
 
-            # Update a subset of stations
-            for stn in random.sample(self.station_ids, k=min(5, len(self.station_ids))):
-                occ = random.randint(0, 500)
-                avg_wait = max(0.0, random.gauss(3.5, 1.0))
-                alerts: List[str] = []
-                if occ > 350:
-                    alerts.append("High occupancy")
-                if avg_wait > 6:
-                    alerts.append("Long wait")
-                sev = StationEvent(
-                    id=str(uuid.uuid4()),
+        # Update a subset of stations
+        for stn in rng.sample(self.station_ids, k=min(5, len(self.station_ids))):
+            occ = rng.randint(0, 500)
+            avg_wait = max(0.0, rng.gauss(3.5, 1.0))
+            events.append(
+                StationEvent(
+                    id=self._event_id(),
                     station_id=stn,
                     ts=ts,
                     platform_occupancy=occ,
                     avg_wait_min=avg_wait,
-                    alerts=alerts,
+                    alerts=_station_alerts(occ, avg_wait),
                 )
-                await queue.put(sev)
+            )
+        return events
+
+    async def run(
+        self, queue: asyncio.Queue, clock: Optional[Clock] = None, max_ticks: Optional[int] = None
+    ) -> None:
+        clock = clock or WallClock()
+        self._init_trains()
+        ticks = 0
+        while max_ticks is None or ticks < max_ticks:
+            ts = clock.now()
+            for ev in self.step(ts):
+                await queue.put(ev)
+            ticks += 1
+            await clock.sleep(self.tick_seconds)
+
 
-            await asyncio.sleep(self.tick_seconds)
+class VectorSimulator(Simulator):
+    """NumPy engine: every train advances in one batched step per tick.
 
+    Train state lives in per-field arrays and all randomness comes from a seeded
+    ``numpy.random.Generator``. ``advance`` only touches arrays; TrainEvent and
+    StationEvent objects are built in ``step`` when the tick is handed to the queue.
+    """
 
-async def simulate(queue: asyncio.Queue) -> None:
-    sim = Simulator(
+    def __init__(
+        self,
+        train_count: int,
+        station_count: int,
+        train_capacity: int,
+        city_bounds: CityBounds = ((28.40, 77.00), (28.90, 77.40)),
+        tick_seconds: float = 2.0,
+        seed: Optional[int] = None,
+        stations: Optional[StationCatalog] = None,
+    ) -> None:
+        super().__init__(train_count, station_count, train_capacity, city_bounds, tick_seconds, seed, stations)
+        self.rng = np.random.default_rng(seed)
+        # Event ids are a per-run prefix plus a counter instead of one uuid4 per event
+        self._id_prefix = f"{int(self.rng.integers(2 ** 48)):012x}"
+        self._event_seq = 0
+        self._station_sample = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+
+    def _init_trains(self) -> None:
+        n, rng = self.train_count, self.rng
+        (min_lat, min_lon), (max_lat, max_lon) = self.city_bounds
+        self.lat = rng.uniform(min_lat, max_lat, n)
+        self.lon = rng.uniform(min_lon, max_lon, n)
+        self.speed = rng.uniform(20.0, 60.0, n)
+        self.delay = rng.uniform(-1.0, 8.0, n)
+        self.passengers = rng.integers(20, self.train_capacity + 1, n)
+        route_len = min(10, self.station_count)
+        # Per-train planned stops: the first route_len entries of a random permutation
+        self.routes = np.argsort(rng.random((n, self.station_count)), axis=1)[:, :route_len]
+        self.route_pos = rng.integers(0, route_len, n) if route_len else np.zeros(n, dtype=np.int64)
+        if route_len:
+            self.next_station = self.routes[np.arange(n), self.route_pos]
+        else:
+            self.next_station = np.full(n, -1, dtype=np.int64)
+        self.dwell_left = np.zeros(n)
+
+    def advance(self) -> None:
+        """Move every train one tick and sample this tick's station updates."""
+        n, rng = self.train_count, self.rng
+        route_len = self.routes.shape[1]
+        dwell = rng.uniform(*DWELL_SECONDS, n)
+        if route_len:
+            dwelling = self.dwell_left > 0
+            self.dwell_left[dwelling] -= self.tick_seconds
+            leaving = np.flatnonzero(dwelling & (self.dwell_left <= 0))
+            self.route_pos[leaving] = (self.route_pos[leaving] + 1) % route_len
+            self.next_station[leaving] = self.routes[leaving, self.route_pos[leaving]]
+            moving = self.dwell_left <= 0
+            target_lat, target_lon = self.stations.lat[self.next_station], self.stations.lon[self.next_station]
+            dlat, dlon = target_lat - self.lat, target_lon - self.lon
+            # Flat-earth approximation, as in the per-train engine
+            remaining_km = np.hypot(dlat, dlon * np.cos(np.radians(self.lat))) * KM_PER_DEG_LAT
+            step_km = self.speed * (self.tick_seconds / 3600.0)
+            arrived = moving & (step_km >= remaining_km)
+            frac = np.where(moving, np.minimum(step_km / np.maximum(remaining_km, 1e-12), 1.0), 0.0)
+            self.lat += dlat * frac
+            self.lon += dlon * frac
+            # Snap onto the platform and start the dwell
+            self.lat[arrived], self.lon[arrived] = target_lat[arrived], target_lon[arrived]
+            self.dwell_left[arrived] = dwell[arrived]
+        np.clip(self.speed + rng.uniform(-2.0, 2.0, n), 0.0, 80.0, out=self.speed)
+        self.delay += rng.uniform(-0.2, 0.5, n)
+        np.maximum(self.passengers + rng.integers(-10, 13, n), 0, out=self.passengers)
+        k = min(5, self.station_count)
+        self._station_sample = (
+            rng.choice(self.station_count, size=k, replace=False),
+            rng.integers(0, 501, k),
+            np.maximum(rng.normal(3.5, 1.0, k), 0.0),
+        )
+
+    def _next_ids(self, count: int) -> List[str]:
+        start = self._event_seq
+        self._event_seq += count
+        prefix = self._id_prefix
+        return [f"{prefix}-{i}" for i in range(start, start + count)]
+
+    def materialize(self, ts: datetime) -> List[Event]:
+        """Build the events for the current array state."""
+        station_ids, train_ids = self.station_ids, self.train_ids
+        capacity = self.train_capacity
+        dwelling = self.dwell_left > 0
+        events: List[Event] = [
+            TrainEvent.model_construct(
+                id=ev_id,
+                train_id=train_ids[i],
+                location=(lat, lon),
+                speed_kmph=speed,
+                ts=ts,
+                delay_min=delay,
+                passenger_count=pax,
+                next_station=station_ids[stn] if stn >= 0 else None,
+                status="dwelling" if stopped else "running",
+                capacity=capacity,
+            )
+            for i, (ev_id, lat, lon, speed, delay, pax, stn, stopped) in enumerate(
+                zip(
+                    self._next_ids(self.train_count),
+                    self.lat.tolist(),
+                    self.lon.tolist(),
+                    np.where(dwelling, 0.0, self.speed).tolist(),
+                    np.maximum(self.delay, -2.0).tolist(),
+                    self.passengers.tolist(),
+                    self.next_station.tolist(),
+                    dwelling.tolist(),
+                )
+            )
+        ]
+        chosen, occupancy, wait = self._station_sample
+        for ev_id, stn, occ, avg_wait in zip(
+            self._next_ids(len(chosen)), chosen.tolist(), occupancy.tolist(), wait.tolist()
+        ):
+            events.append(
+                StationEvent(
+                    id=ev_id,
+                    station_id=station_ids[stn],
+                    ts=ts,
+                    platform_occupancy=occ,
+                    avg_wait_min=avg_wait,
+                    alerts=_station_alerts(occ, avg_wait),
+                )
+            )
+        return events
+
+    def step(self, ts: datetime) -> List[Event]:
+        self.advance()
+        return self.materialize(ts)
+
+
+def make_simulator() -> Simulator:
+    kwargs = dict(
         train_count=settings.SIM_TRAIN_COUNT,
         station_count=settings.SIM_STATION_COUNT,
         train_capacity=settings.TRAIN_CAPACITY,
+        city_bounds=settings.CITY_BOUNDS,
+        stations=make_station_catalog(),
     )
-    await sim.run(queue)
+    seed = settings.SIM_SEED
+    if seed is None and settings.DATA_MODE == "sim-fast":
+        # Fast-forward runs are meant to be compared across versions, so never unseeded
+        seed = 0
+    if settings.SIM_ENGINE == "numpy":
+        return VectorSimulator(**kwargs, seed=seed)
+    if settings.SIM_ENGINE != "python":
+        raise ValueError(f"Unknown simulator engine: {settings.SIM_ENGINE!r}")
+    return Simulator(**kwargs, seed=seed)
+
 
+async def simulate(queue: asyncio.Queue, clock: Optional[Clock] = None, duration_seconds: float = 0.0) -> None:
+    sim = make_simulator()
+    max_ticks = int(duration_seconds / sim.tick_seconds) if duration_seconds > 0 else None
+    await sim.run(queue, clock, max_ticks)
@@ -0,0 +1,196 @@
+import math
+import threading
+from typing import Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from services.geo import KM_PER_DEG_LAT, CityBounds, haversine_km
+
+
+class GridIndex:
+    """Uniform lat/lon grid of square-ish ``cell_km`` cells over the city bounds, holding train positions.
+
+    Positions live in NumPy columns (one slot per train) and every cell keeps
+    the set of slots inside it, so a move is O(1) and only touches the cell
+    sets when the train crosses a cell border. Points outside the bounds are
+    kept in the nearest edge cell. Queries visit only the cells that can
+    contain an answer, then refine the candidates exactly in one vectorized
+    pass: a bounds test for ``bbox``, haversine distance for ``nearest``.
+    """
+
+    # Below this many trains a batch is cheaper as single moves than as array work
+    VECTORIZE_MIN = 24
+
+    def __init__(self, bounds: CityBounds, cell_km: float = 1.0, initial_capacity: int = 1024) -> None:
+        (self.min_lat, self.min_lon), (self.max_lat, self.max_lon) = bounds
+        # Longitude degrees shrink away from the equator; size cells for the worst latitude in the bounds
+        widest = math.cos(math.radians(max(abs(self.min_lat), abs(self.max_lat))))
+        self.cell_lat = cell_km / KM_PER_DEG_LAT
+        self.cell_lon = cell_km / (KM_PER_DEG_LAT * widest)
+        self.rows = max(1, math.ceil((self.max_lat - self.min_lat) / self.cell_lat))
+        self.cols = max(1, math.ceil((self.max_lon - self.min_lon) / self.cell_lon))
+        # Every cell is at least this wide in either direction
+        self.cell_km = cell_km
+        self.lock = threading.Lock()
+        self._slots: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._cells: Dict[int, Set[int]] = {}
+        self.lat = np.zeros(max(1, initial_capacity), dtype=np.float64)
+        self.lon = np.zeros(max(1, initial_capacity), dtype=np.float64)
+        self.cell = np.zeros(max(1, initial_capacity), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _row_col(self, lat: float, lon: float) -> Tuple[int, int]:
+        row = min(max(int((lat - self.min_lat) // self.cell_lat), 0), self.rows - 1)
+        col = min(max(int((lon - self.min_lon) // self.cell_lon), 0), self.cols - 1)
+        return row, col
+
+    def _cells_of(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        rows = np.clip(((lats - self.min_lat) // self.cell_lat).astype(np.int64), 0, self.rows - 1)
+        cols = np.clip(((lons - self.min_lon) // self.cell_lon).astype(np.int64), 0, self.cols - 1)
+        return rows * self.cols + cols
+
+    def _grow(self) -> None:
+        for name in ("lat", "lon", "cell"):
+            column = getattr(self, name)
+            grown = np.zeros(len(column) * 2, dtype=column.dtype)
+            grown[: len(column)] = column
+            setattr(self, name, grown)
+
+    def _slot(self, train_id: str) -> int:
+        """Slot of ``train_id``, allocated outside every cell (-1) if new."""
+        slot = self._slots.get(train_id)
+        if slot is None:
+            slot = len(self._ids)
+            if slot == len(self.lat):
+                self._grow()
+            self._slots[train_id] = slot
+            self._ids.append(train_id)
+            self.cell[slot] = -1
+        return slot
+
+    def _enter(self, slot: int, cell: int) -> None:
+        old = int(self.cell[slot])
+        if old == cell:
+            return
+        if old >= 0:
+            self._cells[old].discard(slot)
+        self._cells.setdefault(cell, set()).add(slot)
+        self.cell[slot] = cell
+
+    def move(self, train_id: str, lat: float, lon: float) -> None:
+        row, col = self._row_col(lat, lon)
+        with self.lock:
+            slot = self._slot(train_id)
+            self._enter(slot, row * self.cols + col)
+            self.lat[slot], self.lon[slot] = lat, lon
+
+    def move_many(self, train_ids: Sequence[str], lats: Sequence[float], lons: Sequence[float]) -> None:
+        """Move a batch; for repeated ids the last position wins."""
+        if len(train_ids) < self.VECTORIZE_MIN:
+            for train_id, lat, lon in zip(train_ids, lats, lons):
+                self.move(train_id, lat, lon)
+            return
+        lat_arr = np.asarray(lats, dtype=np.float64)
+        lon_arr = np.asarray(lons, dtype=np.float64)
+        cells = self._cells_of(lat_arr, lon_arr)
+        with self.lock:
+            get = self._slots.get
+            found = [get(t) for t in train_ids]
+            if None in found:
+                found = [self._slot(t) if slot is None else slot for t, slot in zip(train_ids, found)]
+            slots = np.array(found, dtype=np.int64)
+            if len(np.unique(slots)) == len(slots):
+                # Most trains stay in their cell; only border crossings touch the cell sets
+                crossed = np.flatnonzero(self.cell[slots] != cells)
+            else:
+                crossed = np.arange(len(slots))
+            for slot, cell in zip(slots[crossed].tolist(), cells[crossed].tolist()):
+                self._enter(slot, cell)
+            self.lat[slots] = lat_arr
+            self.lon[slots] = lon_arr
+
+    def remove(self, train_id: str) -> bool:
+        with self.lock:
+            slot = self._slots.pop(train_id, None)
+            if slot is None:
+                return False
+            self._cells[int(self.cell[slot])].discard(slot)
+            last = len(self._ids) - 1
+            if slot != last:
+                # Move the last slot into the hole so the columns stay dense
+                moved = self._ids[last]
+                cell = int(self.cell[last])
+                self._cells[cell].discard(last)
+                self._cells[cell].add(slot)
+                self.lat[slot], self.lon[slot], self.cell[slot] = self.lat[last], self.lon[last], cell
+                self._ids[slot] = moved
+                self._slots[moved] = slot
+            self._ids.pop()
+            return True
+
+    def _gather(self, cells: Sequence[int]) -> np.ndarray:
+        slots: List[int] = []
+        for cell in cells:
+            members = self._cells.get(cell)
+            if members:
+                slots.extend(members)
+        return np.fromiter(slots, dtype=np.int64, count=len(slots))
+
+    def bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[str]:
+        """Ids of trains with min_lat <= lat <= max_lat and min_lon <= lon <= max_lon."""
+        r0, c0 = self._row_col(min_lat, min_lon)
+        r1, c1 = self._row_col(max_lat, max_lon)
+        with self.lock:
+            slots = self._gather([r * self.cols + c for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)])
+            lat, lon = self.lat[slots], self.lon[slots]
+            hits = slots[(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)]
+            ids = self._ids
+            return [ids[slot] for slot in hits.tolist()]
+
+    def _ring(self, row: int, col: int, r: int) -> List[int]:
+        """Cells at Chebyshev distance exactly ``r`` from (row, col), clipped to the grid."""
+        if r == 0:
+            return [row * self.cols + col]
+        cells = []
+        for rr in range(max(row - r, 0), min(row + r, self.rows - 1) + 1):
+            if abs(rr - row) == r:
+                cells.extend(rr * self.cols + cc for cc in range(max(col - r, 0), min(col + r, self.cols - 1) + 1))
+            else:
+                cells.extend(rr * self.cols + cc for cc in (col - r, col + r) if 0 <= cc < self.cols)
+        return cells
+
+    def nearest(self, lat: float, lon: float, k: int) -> List[Tuple[str, float]]:
+        """Up to ``k`` (train_id, distance_km) pairs closest to (lat, lon), nearest first.
+
+        Rings of cells are searched outwards until the k-th best distance is
+        within the radius the searched square is guaranteed to cover.
+        """
+        with self.lock:
+            n = len(self._ids)
+            k = min(k, n)
+            if k <= 0:
+                return []
+            inside = self.min_lat <= lat <= self.max_lat and self.min_lon <= lon <= self.max_lon
+            if not inside:
+                # Ring radii only bound distances from inside the grid; outside, check everyone
+                slots = np.arange(n)
+            else:
+                row, col = self._row_col(lat, lon)
+                last_ring = max(row, self.rows - 1 - row, col, self.cols - 1 - col)
+                found: List[int] = []
+                for r in range(last_ring + 1):
+                    found.extend(self._gather(self._ring(row, col, r)).tolist())
+                    if len(found) >= k:
+                        candidates = np.asarray(found, dtype=np.int64)
+                        distances = haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+                        if np.partition(distances, k - 1)[k - 1] <= r * self.cell_km:
+                            break
+                slots = np.asarray(found, dtype=np.int64)
+            distances = haversine_km(lat, lon, self.lat[slots], self.lon[slots])
+            best = np.argpartition(distances, k - 1)[:k] if k < len(slots) else np.arange(len(slots))
+            best = best[np.argsort(distances[best], kind="stable")]
+            ids = self._ids
+            return [(ids[slot], distance) for slot, distance in zip(slots[best].tolist(), distances[best].tolist())]
@@ -0,0 +1,72 @@
+import csv
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+from services.geo import CityBounds
+
+
+class StationCatalog:
+    """Station ids with their coordinates, as NumPy columns addressed by a dense station code.
+
+    Codes are positions in ``ids``; ``codes`` maps station ids to them in one
+    pass (-1 for ids not in the catalog) so per-train station lookups can be
+    vectorized against ``lat``/``lon``.
+    """
+
+    def __init__(self, ids: Sequence[str], lats: Sequence[float], lons: Sequence[float]) -> None:
+        if not len(ids) == len(lats) == len(lons):
+            raise ValueError("Station ids and coordinates must have the same length")
+        self.ids: List[str] = list(ids)
+        self.lat = np.asarray(lats, dtype=np.float64)
+        self.lon = np.asarray(lons, dtype=np.float64)
+        self._codes: Dict[str, int] = {station_id: code for code, station_id in enumerate(self.ids)}
+        if len(self._codes) != len(self.ids):
+            raise ValueError("Duplicate station id in catalog")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, station_id: object) -> bool:
+        return station_id in self._codes
+
+    def location(self, station_id: str) -> Optional[Tuple[float, float]]:
+        code = self._codes.get(station_id)
+        if code is None:
+            return None
+        return float(self.lat[code]), float(self.lon[code])
+
+    def codes(self, station_ids: Sequence[Optional[str]]) -> np.ndarray:
+        get = self._codes.get
+        return np.fromiter((get(s, -1) for s in station_ids), dtype=np.int64, count=len(station_ids))
+
+
+def layout_stations(count: int, bounds: CityBounds, seed: int = 0) -> StationCatalog:
+    """``count`` stations ``STN-000``... spread over the bounds; the same layout for the same arguments."""
+    (min_lat, min_lon), (max_lat, max_lon) = bounds
+    rng = np.random.default_rng(seed)
+    # Keep stations off the edges so trains approaching them stay inside the bounds
+    margin_lat, margin_lon = (max_lat - min_lat) * 0.05, (max_lon - min_lon) * 0.05
+    lats = rng.uniform(min_lat + margin_lat, max_lat - margin_lat, count)
+    lons = rng.uniform(min_lon + margin_lon, max_lon - margin_lon, count)
+    return StationCatalog([f"STN-{i:03d}" for i in range(count)], lats, lons)
+
+
+def load_stations(path: str) -> StationCatalog:
+    """Read a CSV with ``station_id,lat,lon`` columns (header row required)."""
+    ids: List[str] = []
+    lats: List[float] = []
+    lons: List[float] = []
+    with open(path, newline="") as fh:
+        for row in csv.DictReader(fh):
+            ids.append(row["station_id"])
+            lats.append(float(row["lat"]))
+            lons.append(float(row["lon"]))
+    return StationCatalog(ids, lats, lons)
+
+
+def make_station_catalog() -> StationCatalog:
+    if settings.STATIONS_PATH:
+        return load_stations(settings.STATIONS_PATH)
+    return layout_stations(settings.SIM_STATION_COUNT, settings.CITY_BOUNDS)
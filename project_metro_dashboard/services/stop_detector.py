@@ -0,0 +1,125 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+from models.stop_event import StopEvent
+from models.train_event import TrainEvent
+from services.batching import slot_rounds
+from services.geo import haversine_km
+from services.metrics_exporter import dwell_seconds_hist, train_arrivals, train_departures
+from services.stations import StationCatalog, make_station_catalog
+
+
+class StopDetector:
+    """Derives station arrivals and departures from the train event stream.
+
+    A train arrives when it is within ``radius_km`` of its ``next_station`` and
+    departs once it is outside that radius again or heads for another station;
+    departures carry the dwell time since the arrival. Each batch takes one
+    vectorized haversine pass over every train in it against its next station,
+    with per-train state (current station, arrival time) in NumPy columns.
+    """
+
+    def __init__(self, stations: StationCatalog, radius_km: float = 0.15, initial_capacity: int = 1024) -> None:
+        self.stations = stations
+        self.radius_km = radius_km
+        self._slots: Dict[str, int] = {}
+        self.at_station = np.full(max(1, initial_capacity), -1, dtype=np.int64)
+        self.arrived_ts = np.zeros(max(1, initial_capacity), dtype=np.float64)
+        self.arrivals = 0
+        self.departures = 0
+
+    def _slot(self, train_id: str) -> int:
+        slot = self._slots.get(train_id)
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self.at_station):
+                self.at_station = np.concatenate([self.at_station, np.full(slot, -1, dtype=np.int64)])
+                self.arrived_ts = np.concatenate([self.arrived_ts, np.zeros(slot)])
+            self._slots[train_id] = slot
+        return slot
+
+    def station_of(self, train_id: str) -> Optional[str]:
+        """Station the train is currently stopped at, if any."""
+        slot = self._slots.get(train_id)
+        if slot is None or self.at_station[slot] < 0:
+            return None
+        return self.stations.ids[int(self.at_station[slot])]
+
+    def observe_arrays(
+        self, slots: np.ndarray, lats: np.ndarray, lons: np.ndarray, next_codes: np.ndarray, ts: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Advance the per-train state for one sample per train (``slots`` must be unique).
+
+        Returns the rows that departed, the station codes they left, their
+        dwell seconds, and the rows that arrived at their ``next_codes``
+        station. A row can both depart and arrive, in that order.
+        """
+        known = next_codes >= 0
+        target = np.where(known, next_codes, 0)
+        distance = haversine_km(lats, lons, self.stations.lat[target], self.stations.lon[target])
+        near = known & (distance <= self.radius_km)
+        current = self.at_station[slots]
+        departed = np.flatnonzero((current >= 0) & ((next_codes != current) | ~near))
+        left = current[departed]
+        dwell = ts[departed] - self.arrived_ts[slots[departed]]
+        self.at_station[slots[departed]] = -1
+        arrived = np.flatnonzero(near & (self.at_station[slots] < 0))
+        self.at_station[slots[arrived]] = next_codes[arrived]
+        self.arrived_ts[slots[arrived]] = ts[arrived]
+        return departed, left, dwell, arrived
+
+    def observe(self, events: Sequence[object]) -> List[StopEvent]:
+        """Stop events for a batch of ingested events, in event order per train."""
+        trains: List[TrainEvent] = [e for e in events if isinstance(e, TrainEvent)]
+        if not trains:
+            return []
+        slots = np.fromiter((self._slot(e.train_id) for e in trains), dtype=np.int64, count=len(trains))
+        lats = np.fromiter((e.location[0] for e in trains), dtype=np.float64, count=len(trains))
+        lons = np.fromiter((e.location[1] for e in trains), dtype=np.float64, count=len(trains))
+        ts = _epochs(trains)
+        next_codes = self.stations.codes([e.next_station for e in trains])
+        ids = self.stations.ids
+        stops: List[StopEvent] = []
+        for rows in slot_rounds(slots):
+            departed, left, dwell, arrived = self.observe_arrays(
+                slots[rows], lats[rows], lons[rows], next_codes[rows], ts[rows]
+            )
+            for row, code, seconds in zip(rows[departed].tolist(), left.tolist(), dwell.tolist()):
+                ev = trains[row]
+                stops.append(StopEvent(
+                    id=f"{ev.id}:dep", train_id=ev.train_id, station_id=ids[code], kind="departure",
+                    ts=ev.ts, delay_min=ev.delay_min, dwell_seconds=seconds,
+                ))
+                dwell_seconds_hist.observe(seconds)
+            for row in rows[arrived].tolist():
+                ev = trains[row]
+                stops.append(StopEvent(
+                    id=f"{ev.id}:arr", train_id=ev.train_id, station_id=ev.next_station, kind="arrival",
+                    ts=ev.ts, delay_min=ev.delay_min,
+                ))
+            self.departures += len(departed)
+            self.arrivals += len(arrived)
+            if len(departed):
+                train_departures.inc(len(departed))
+            if len(arrived):
+                train_arrivals.inc(len(arrived))
+        return stops
+
+
+def _epochs(trains: List[TrainEvent]) -> np.ndarray:
+    # A batch is mostly whole ticks sharing one datetime; convert each distinct object once
+    out: List[float] = []
+    last, value = None, 0.0
+    for ev in trains:
+        if ev.ts is not last:
+            last, value = ev.ts, ev.ts.timestamp()
+        out.append(value)
+    return np.array(out, dtype=np.float64)
+
+
+def make_stop_detector() -> Optional[StopDetector]:
+    if settings.STOP_RADIUS_M <= 0:
+        return None
+    return StopDetector(make_station_catalog(), settings.STOP_RADIUS_M / 1000)
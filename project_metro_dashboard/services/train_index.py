@@ -0,0 +1,123 @@
+import heapq
+import threading
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from models.train_event import TrainEvent
+from services.train_store import DELAY_THRESHOLD_MIN
+
+
+# Fields trains are indexed by, in IndexKey order; is_delayed/is_overcrowded are the TrainEvent properties
+INDEX_FIELDS = ("status", "next_station", "is_delayed", "is_overcrowded")
+IndexKey = Tuple[str, Optional[str], bool, bool]
+
+_POSITION = {field: i for i, field in enumerate(INDEX_FIELDS)}
+_EMPTY: Set[str] = set()
+
+
+def event_key(event: TrainEvent) -> IndexKey:
+    return event.status, event.next_station, event.delay_min > DELAY_THRESHOLD_MIN, event.passenger_count > event.capacity
+
+
+def record_key(record: Mapping) -> IndexKey:
+    return (
+        record["status"],
+        record["next_station"],
+        record["delay_min"] > DELAY_THRESHOLD_MIN,
+        record["passenger_count"] > record["capacity"],
+    )
+
+
+def matches(record: Mapping, filters: Mapping[str, object]) -> bool:
+    key = record_key(record)
+    return all(key[_POSITION[field]] == value for field, value in filters.items())
+
+
+def filter_records(records: Iterable[Dict], filters: Mapping[str, object]) -> List[Dict]:
+    """Full-scan fallback for ``TrainIndex.lookup``, over /trains records."""
+    return [r for r in records if matches(r, filters)]
+
+
+class TrainIndex:
+    """Inverted indexes from each of INDEX_FIELDS to the set of train ids with that value.
+
+    Kept up to date on every upsert: a train whose indexed values did not
+    change costs one tuple comparison, otherwise it moves between the sets of
+    the fields that changed. ``lookup`` intersects starting from the smallest
+    matching set, so it costs O(smallest set), not O(fleet).
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self._keys: Dict[str, IndexKey] = {}
+        self._postings: List[Dict[object, Set[str]]] = [{} for _ in INDEX_FIELDS]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _set(self, train_id: str, key: IndexKey) -> None:
+        old = self._keys.get(train_id)
+        if old == key:
+            return
+        for postings, before, after in zip(self._postings, old or (None,) * len(key), key):
+            if old is not None and before == after:
+                continue
+            if old is not None:
+                members = postings[before]
+                members.discard(train_id)
+                if not members:
+                    del postings[before]
+            postings.setdefault(after, set()).add(train_id)
+        self._keys[train_id] = key
+
+    def update(self, train_id: str, key: IndexKey) -> None:
+        with self.lock:
+            self._set(train_id, key)
+
+    def update_many(self, entries: Iterable[Tuple[str, IndexKey]]) -> None:
+        with self.lock:
+            keys = self._keys
+            for train_id, key in entries:
+                if keys.get(train_id) != key:
+                    self._set(train_id, key)
+
+    def remove(self, train_id: str) -> bool:
+        with self.lock:
+            old = self._keys.pop(train_id, None)
+            if old is None:
+                return False
+            for postings, value in zip(self._postings, old):
+                members = postings[value]
+                members.discard(train_id)
+                if not members:
+                    del postings[value]
+            return True
+
+    def candidates(self, filters: Mapping[str, object]) -> int:
+        """Size of the smallest set ``lookup`` would start from."""
+        with self.lock:
+            return min(len(self._postings[_POSITION[f]].get(v, _EMPTY)) for f, v in filters.items())
+
+    def lookup(self, filters: Mapping[str, object]) -> List[str]:
+        """Ids of trains matching every ``field: value`` filter (at least one)."""
+        with self.lock:
+            sets = sorted((self._postings[_POSITION[f]].get(v, _EMPTY) for f, v in filters.items()), key=len)
+            first, rest = sets[0], sets[1:]
+            return [t for t in first if all(t in s for s in rest)]
+
+
+def sort_page(
+    records: List[Dict], field: str, descending: bool = False, offset: int = 0, limit: Optional[int] = None
+) -> List[Dict]:
+    """``records[offset:offset + limit]`` in ``field`` order, ties by train_id; None values sort last.
+
+    A page near the front costs O(n log(offset + limit)) instead of a full sort.
+    """
+
+    def key(record: Dict) -> Tuple:
+        value = record[field]
+        return (value is None) != descending, value, record["train_id"]
+
+    if limit is not None and offset + limit < len(records):
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        return pick(offset + limit, records, key=key)[offset:]
+    return sorted(records, key=key, reverse=descending)[offset : None if limit is None else offset + limit]
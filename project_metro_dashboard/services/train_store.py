@@ -0,0 +1,306 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from models.train_event import TrainEvent
+
+
+# Delay threshold used by TrainEvent.is_delayed, mirrored for vectorized reductions
+DELAY_THRESHOLD_MIN = 3.0
+
+# (delay_min, speed_kmph, passenger_count) for one train, used for KPI deltas
+KpiRow = Tuple[float, float, int]
+
+
+class DictTrainStore:
+    """Keeps the latest TrainEvent per train in a plain dict."""
+
+    def __init__(self) -> None:
+        self._trains: Dict[str, TrainEvent] = {}
+
+    def __len__(self) -> int:
+        return len(self._trains)
+
+    def __contains__(self, train_id: object) -> bool:
+        return train_id in self._trains
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._trains)
+
+    def upsert(self, event: TrainEvent) -> None:
+        self._trains[event.train_id] = event
+
+    def upsert_many(self, events: List[TrainEvent]) -> None:
+        trains = self._trains
+        for event in events:
+            trains[event.train_id] = event
+
+    def remove(self, train_id: str) -> bool:
+        return self._trains.pop(train_id, None) is not None
+
+    def get(self, train_id: str) -> Optional[TrainEvent]:
+        return self._trains.get(train_id)
+
+    def kpi_row(self, train_id: str) -> Optional[KpiRow]:
+        t = self._trains.get(train_id)
+        if t is None:
+            return None
+        return t.delay_min, t.speed_kmph, t.passenger_count
+
+    def values(self) -> List[TrainEvent]:
+        return list(self._trains.values())
+
+    def records(self) -> List[Dict]:
+        return [t.model_dump() for t in self._trains.values()]
+
+    def records_for(self, train_ids: List[str]) -> List[Dict]:
+        return [self._trains[t].model_dump() for t in train_ids]
+
+    def kpis(self) -> Dict[str, float]:
+        trains = self._trains.values()
+        return {
+            "count": len(self._trains),
+            "delay_sum": sum(t.delay_min for t in trains),
+            "speed_sum": sum(t.speed_kmph for t in trains),
+            "passengers_total": sum(t.passenger_count for t in trains),
+            "on_time": sum(1 for t in trains if not t.is_delayed),
+        }
+
+
+class ColumnarTrainStore:
+    """Struct-of-arrays train state: one NumPy column per field, one row per train.
+
+    Rows are addressed through a train_id -> row index, updates are in-place row
+    writes and KPIs are single reductions over the populated prefix of each column.
+    String fields (status, next_station) are interned to small integer codes.
+    """
+
+    COLUMNS = ("lat", "lon", "speed", "delay", "ts", "passengers", "capacity", "status", "next_station")
+    # Below this many events a batch is cheaper as row writes than as column writes
+    VECTORIZE_MIN = 48
+
+    def __init__(self, initial_capacity: int = 1024) -> None:
+        self._size = 0
+        self._rows: Dict[str, int] = {}
+        self._train_ids: List[str] = []
+        self._event_ids: List[str] = []
+        self._status_names: List[str] = []
+        self._status_codes: Dict[str, int] = {}
+        self._station_names: List[str] = []
+        self._station_codes: Dict[str, int] = {}
+        self._alloc(max(1, initial_capacity))
+
+    def _alloc(self, capacity: int) -> None:
+        self._capacity = capacity
+        self.lat = np.zeros(capacity, dtype=np.float64)
+        self.lon = np.zeros(capacity, dtype=np.float64)
+        self.speed = np.zeros(capacity, dtype=np.float64)
+        self.delay = np.zeros(capacity, dtype=np.float64)
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.passengers = np.zeros(capacity, dtype=np.int64)
+        self.capacity = np.zeros(capacity, dtype=np.int64)
+        self.status = np.zeros(capacity, dtype=np.int16)
+        self.next_station = np.full(capacity, -1, dtype=np.int32)
+
+    def _grow(self) -> None:
+        old = {name: getattr(self, name) for name in self.COLUMNS}
+        self._alloc(self._capacity * 2)
+        for name, column in old.items():
+            getattr(self, name)[: len(column)] = column
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, train_id: object) -> bool:
+        return train_id in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._train_ids[: self._size])
+
+    def row_of(self, train_id: str) -> Optional[int]:
+        return self._rows.get(train_id)
+
+    def _status_code(self, status: str) -> int:
+        code = self._status_codes.get(status)
+        if code is None:
+            code = len(self._status_names)
+            self._status_names.append(status)
+            self._status_codes[status] = code
+        return code
+
+    def _station_code(self, station_id: Optional[str]) -> int:
+        if station_id is None:
+            return -1
+        code = self._station_codes.get(station_id)
+        if code is None:
+            code = len(self._station_names)
+            self._station_names.append(station_id)
+            self._station_codes[station_id] = code
+        return code
+
+    def status_code(self, status: str) -> Optional[int]:
+        return self._status_codes.get(status)
+
+    def station_code(self, station_id: str) -> Optional[int]:
+        return self._station_codes.get(station_id)
+
+    def upsert(self, event: TrainEvent) -> None:
+        row = self._rows.get(event.train_id)
+        if row is None:
+            if self._size == self._capacity:
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._rows[event.train_id] = row
+            self._train_ids.append(event.train_id)
+            self._event_ids.append(event.id)
+        else:
+            self._event_ids[row] = event.id
+        self.lat[row], self.lon[row] = event.location
+        self.speed[row] = event.speed_kmph
+        self.delay[row] = event.delay_min
+        self.ts[row] = event.ts.timestamp()
+        self.passengers[row] = event.passenger_count
+        self.capacity[row] = event.capacity
+        self.status[row] = self._status_code(event.status)
+        self.next_station[row] = self._station_code(event.next_station)
+
+    def upsert_many(self, events: List[TrainEvent]) -> None:
+        """Upsert a batch with one write per column; for repeated ids the last event wins."""
+        if len(events) < self.VECTORIZE_MIN:
+            for event in events:
+                self.upsert(event)
+            return
+        rows = self._rows
+        out = np.empty(len(events), dtype=np.int64)
+        for i, event in enumerate(events):
+            row = rows.get(event.train_id)
+            if row is None:
+                if self._size == self._capacity:
+                    self._grow()
+                row = self._size
+                self._size += 1
+                rows[event.train_id] = row
+                self._train_ids.append(event.train_id)
+                self._event_ids.append(event.id)
+            else:
+                self._event_ids[row] = event.id
+            out[i] = row
+        locations = np.array([e.location for e in events], dtype=np.float64).reshape(-1, 2)
+        self.lat[out] = locations[:, 0]
+        self.lon[out] = locations[:, 1]
+        self.speed[out] = [e.speed_kmph for e in events]
+        self.delay[out] = [e.delay_min for e in events]
+        self.ts[out] = [e.ts.timestamp() for e in events]
+        self.passengers[out] = [e.passenger_count for e in events]
+        self.capacity[out] = [e.capacity for e in events]
+        self.status[out] = [self._status_code(e.status) for e in events]
+        self.next_station[out] = [self._station_code(e.next_station) for e in events]
+
+    def remove(self, train_id: str) -> bool:
+        row = self._rows.pop(train_id, None)
+        if row is None:
+            return False
+        last = self._size - 1
+        if row != last:
+            # Move the last row into the hole so the populated prefix stays dense
+            for name in self.COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+            moved = self._train_ids[last]
+            self._train_ids[row] = moved
+            self._event_ids[row] = self._event_ids[last]
+            self._rows[moved] = row
+        self._train_ids.pop()
+        self._event_ids.pop()
+        self.next_station[last] = -1
+        self._size = last
+        return True
+
+    def _event_at(self, row: int) -> TrainEvent:
+        station = int(self.next_station[row])
+        return TrainEvent.model_construct(
+            id=self._event_ids[row],
+            train_id=self._train_ids[row],
+            location=(float(self.lat[row]), float(self.lon[row])),
+            speed_kmph=float(self.speed[row]),
+            ts=datetime.fromtimestamp(float(self.ts[row]), tz=timezone.utc),
+            delay_min=float(self.delay[row]),
+            passenger_count=int(self.passengers[row]),
+            next_station=self._station_names[station] if station >= 0 else None,
+            status=self._status_names[int(self.status[row])],
+            capacity=int(self.capacity[row]),
+        )
+
+    def get(self, train_id: str) -> Optional[TrainEvent]:
+        row = self._rows.get(train_id)
+        return None if row is None else self._event_at(row)
+
+    def kpi_row(self, train_id: str) -> Optional[KpiRow]:
+        row = self._rows.get(train_id)
+        if row is None:
+            return None
+        return float(self.delay[row]), float(self.speed[row]), int(self.passengers[row])
+
+    def values(self) -> List[TrainEvent]:
+        return [self._event_at(row) for row in range(self._size)]
+
+    def records(self, rows: Optional[np.ndarray] = None) -> List[Dict]:
+        """Materialize rows (default: all) as dicts shaped like TrainEvent.model_dump()."""
+        if rows is None:
+            rows = np.arange(self._size)
+        stations = self._station_names
+        statuses = self._status_names
+        out: List[Dict] = []
+        for row, lat, lon, speed, delay, ts, pax, cap, status, station in zip(
+            rows.tolist(),
+            self.lat[rows].tolist(),
+            self.lon[rows].tolist(),
+            self.speed[rows].tolist(),
+            self.delay[rows].tolist(),
+            self.ts[rows].tolist(),
+            self.passengers[rows].tolist(),
+            self.capacity[rows].tolist(),
+            self.status[rows].tolist(),
+            self.next_station[rows].tolist(),
+        ):
+            out.append({
+                "id": self._event_ids[row],
+                "train_id": self._train_ids[row],
+                "location": (lat, lon),
+                "speed_kmph": speed,
+                "ts": datetime.fromtimestamp(ts, tz=timezone.utc),
+                "delay_min": delay,
+                "passenger_count": pax,
+                "next_station": stations[station] if station >= 0 else None,
+                "status": statuses[status],
+                "capacity": cap,
+            })
+        return out
+
+    def records_for(self, train_ids: List[str]) -> List[Dict]:
+        rows = self._rows
+        return self.records(np.fromiter((rows[t] for t in train_ids), dtype=np.int64, count=len(train_ids)))
+
+    def kpis(self) -> Dict[str, float]:
+        n = self._size
+        delay = self.delay[:n]
+        return {
+            "count": n,
+            "delay_sum": float(delay.sum()),
+            "speed_sum": float(self.speed[:n].sum()),
+            "passengers_total": int(self.passengers[:n].sum()),
+            "on_time": int(np.count_nonzero(delay <= DELAY_THRESHOLD_MIN)),
+        }
+
+
+TrainStore = Union[DictTrainStore, ColumnarTrainStore]
+
+
+def make_train_store(backend: str) -> TrainStore:
+    if backend == "dict":
+        return DictTrainStore()
+    if backend == "columnar":
+        return ColumnarTrainStore()
+    raise ValueError(f"Unknown aggregator backend: {backend!r}")
@@ -0,0 +1,278 @@
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from services.batching import slot_rounds
+from services.geo import haversine_km
+from services.metrics_exporter import history_bytes, history_samples_dropped
+
+
+# Columns of a trajectory sample, in storage order: 28 bytes per sample
+TRAJECTORY_COLUMNS = (
+    ("ts", np.float64),
+    ("lat", np.float32),
+    ("lon", np.float32),
+    ("speed_kmph", np.float32),
+    ("delay_min", np.float32),
+    ("passenger_count", np.int32),
+)
+SAMPLE_BYTES = sum(np.dtype(dtype).itemsize for _, dtype in TRAJECTORY_COLUMNS)
+
+
+class TrajectoryStore:
+    """Fixed-capacity ring of recent samples per train, one NumPy column per field.
+
+    Row ``r`` of every column is train ``r``'s ring; ``head`` is the slot the
+    next sample goes to and ``count`` how many are held, so the oldest sample
+    is overwritten once the ring is full. Rows are allocated in doubling
+    chunks up to ``max_trains`` and reused after a train is removed, so memory
+    never exceeds ``max_trains * capacity * SAMPLE_BYTES``; trains past that
+    are not recorded.
+
+    With a deadband, a sample is only kept when the train moved more than
+    ``deadband_m`` or its delay changed by more than ``deadband_delay_min``
+    (whichever is positive) since the last kept sample, or ``max_gap_seconds``
+    passed since it.
+    Samples older than a train's last kept one are dropped, so each ring stays
+    sorted by ``ts`` and ranges are found by binary search.
+    """
+
+    # Below this many samples a batch is cheaper as scalar writes than as column writes
+    VECTORIZE_MIN = 32
+
+    def __init__(
+        self,
+        capacity: int = 256,
+        max_trains: int = 10000,
+        deadband_m: float = 0.0,
+        deadband_delay_min: float = 0.0,
+        max_gap_seconds: float = 60.0,
+        initial_trains: int = 64,
+    ) -> None:
+        if capacity < 1 or max_trains < 1:
+            raise ValueError("capacity and max_trains must be >= 1")
+        self.capacity = capacity
+        self.max_trains = max_trains
+        self.deadband_km = deadband_m / 1000
+        self.deadband_delay_min = deadband_delay_min
+        self.max_gap_seconds = max_gap_seconds
+        self.lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        rows = min(max(1, initial_trains), max_trains)
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.zeros((rows, capacity), dtype=dtype) for name, dtype in TRAJECTORY_COLUMNS
+        }
+        self.head = np.zeros(rows, dtype=np.int64)
+        self.count = np.zeros(rows, dtype=np.int64)
+        # inc, not set: every store in the process adds to the same gauge
+        history_bytes.inc(self.nbytes)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, train_id: object) -> bool:
+        return train_id in self._rows
+
+    @property
+    def nbytes(self) -> int:
+        return sum(col.nbytes for col in self.columns.values()) + self.head.nbytes + self.count.nbytes
+
+    def _grow(self) -> bool:
+        rows = len(self.head)
+        if rows >= self.max_trains:
+            return False
+        extra = min(rows, self.max_trains - rows)
+        before = self.nbytes
+        for name, col in self.columns.items():
+            self.columns[name] = np.concatenate([col, np.zeros((extra, self.capacity), dtype=col.dtype)])
+        self.head = np.concatenate([self.head, np.zeros(extra, dtype=np.int64)])
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        history_bytes.inc(self.nbytes - before)
+        return True
+
+    def _row(self, train_id: str) -> int:
+        """The train's row, allocating one if needed; -1 once ``max_trains`` rows are in use."""
+        row = self._rows.get(train_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            elif len(self._rows) < len(self.head) or self._grow():
+                row = len(self._rows)
+            else:
+                return -1
+            self._rows[train_id] = row
+        return row
+
+    def append(
+        self,
+        train_id: str,
+        ts: float,
+        lat: float,
+        lon: float,
+        speed: float,
+        delay: float,
+        passengers: int,
+    ) -> bool:
+        """Record one sample; returns whether it was kept."""
+        with self.lock:
+            row = self._row(train_id)
+            if row < 0:
+                history_samples_dropped.labels(reason="full").inc()
+                return False
+            return self._append_one(row, (ts, lat, lon, speed, delay, passengers))
+
+    def _append_one(self, row: int, values: Sequence[float]) -> bool:
+        # Scalar twin of _append_round: same stale and deadband rules for a single sample
+        cols = self.columns
+        count, head = int(self.count[row]), int(self.head[row])
+        if count:
+            last = (head - 1) % self.capacity
+            last_ts = float(cols["ts"][row, last])
+            ts = values[0]
+            if ts < last_ts:
+                history_samples_dropped.labels(reason="stale").inc()
+                return False
+            if (self.deadband_km > 0 or self.deadband_delay_min > 0) and ts - last_ts < self.max_gap_seconds:
+                moved = self.deadband_km > 0 and float(
+                    haversine_km(values[1], values[2], cols["lat"][row, last], cols["lon"][row, last])
+                ) > self.deadband_km
+                delayed = (
+                    self.deadband_delay_min > 0
+                    and abs(values[4] - float(cols["delay_min"][row, last])) > self.deadband_delay_min
+                )
+                if not (moved or delayed):
+                    history_samples_dropped.labels(reason="deadband").inc()
+                    return False
+        for col, value in zip(cols.values(), values):
+            col[row, head] = value
+        self.head[row] = (head + 1) % self.capacity
+        self.count[row] = min(count + 1, self.capacity)
+        return True
+
+    def append_many(
+        self,
+        train_ids: Sequence[str],
+        ts: Sequence[float],
+        lats: Sequence[float],
+        lons: Sequence[float],
+        speeds: Sequence[float],
+        delays: Sequence[float],
+        passengers: Sequence[int],
+    ) -> int:
+        """Record a batch of samples in order; returns how many were kept."""
+        if not train_ids:
+            return 0
+        if len(train_ids) < self.VECTORIZE_MIN:
+            with self.lock:
+                kept = 0
+                for sample in zip(train_ids, ts, lats, lons, speeds, delays, passengers):
+                    row = self._row(sample[0])
+                    if row < 0:
+                        history_samples_dropped.labels(reason="full").inc()
+                    elif self._append_one(row, sample[1:]):
+                        kept += 1
+                return kept
+        with self.lock:
+            rows = np.fromiter((self._row(t) for t in train_ids), dtype=np.int64, count=len(train_ids))
+            tracked = np.flatnonzero(rows >= 0)
+            if len(tracked) < len(rows):
+                history_samples_dropped.labels(reason="full").inc(len(rows) - len(tracked))
+            values = {
+                "ts": np.asarray(ts, dtype=np.float64)[tracked],
+                "lat": np.asarray(lats, dtype=np.float64)[tracked],
+                "lon": np.asarray(lons, dtype=np.float64)[tracked],
+                "speed_kmph": np.asarray(speeds, dtype=np.float64)[tracked],
+                "delay_min": np.asarray(delays, dtype=np.float64)[tracked],
+                "passenger_count": np.asarray(passengers, dtype=np.int64)[tracked],
+            }
+            rows = rows[tracked]
+            kept = 0
+            for batch in slot_rounds(rows):
+                kept += self._append_round(rows[batch], {name: v[batch] for name, v in values.items()})
+            return kept
+
+    def _append_round(self, rows: np.ndarray, values: Dict[str, np.ndarray]) -> int:
+        # At most one sample per row, so the fancy-indexed reads and writes below do not collide
+        count = self.count[rows]
+        last = (self.head[rows] - 1) % self.capacity
+        seen = count > 0
+        last_ts = np.where(seen, self.columns["ts"][rows, last], -np.inf)
+        fresh = values["ts"] >= last_ts
+        keep = fresh.copy()
+        if self.deadband_km > 0 or self.deadband_delay_min > 0:
+            # A band of 0 turns that check off rather than keeping every change
+            changed = values["ts"] - last_ts >= self.max_gap_seconds
+            if self.deadband_km > 0:
+                changed |= haversine_km(
+                    values["lat"], values["lon"], self.columns["lat"][rows, last], self.columns["lon"][rows, last]
+                ) > self.deadband_km
+            if self.deadband_delay_min > 0:
+                delta = np.abs(values["delay_min"] - self.columns["delay_min"][rows, last])
+                changed |= delta > self.deadband_delay_min
+            keep &= ~seen | changed
+            if (fresh & ~keep).any():
+                history_samples_dropped.labels(reason="deadband").inc(int((fresh & ~keep).sum()))
+        if not fresh.all():
+            history_samples_dropped.labels(reason="stale").inc(int((~fresh).sum()))
+        picked = np.flatnonzero(keep)
+        rows, slots = rows[picked], self.head[rows[picked]]
+        for name, col in self.columns.items():
+            col[rows, slots] = values[name][picked]
+        self.head[rows] = (slots + 1) % self.capacity
+        self.count[rows] = np.minimum(count[picked] + 1, self.capacity)
+        return len(picked)
+
+    def remove(self, train_id: str) -> bool:
+        with self.lock:
+            row = self._rows.pop(train_id, None)
+            if row is None:
+                return False
+            self.head[row] = self.count[row] = 0
+            self._free.append(row)
+            return True
+
+    def range(
+        self, train_id: str, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """Columns of the train's samples with ``start <= ts <= end``, oldest first; None if never seen."""
+        with self.lock:
+            row = self._rows.get(train_id)
+            if row is None:
+                return None
+            count, head, capacity = int(self.count[row]), int(self.head[row]), self.capacity
+            first = (head - count) % capacity
+            # The ring holds one sorted run, or two once it has wrapped: [first:] then [:head]
+            runs = [(first, first + count)] if first + count <= capacity else [(first, capacity), (0, head)]
+            ts = self.columns["ts"][row]
+            spans = []
+            for lo, hi in runs:
+                run = ts[lo:hi]
+                a = lo if start is None else lo + int(run.searchsorted(start, "left"))
+                b = hi if end is None else lo + int(run.searchsorted(end, "right"))
+                if a < b:
+                    spans.append((a, b))
+            if len(spans) < 2:
+                a, b = spans[0] if spans else (0, 0)
+                return {name: col[row, a:b].copy() for name, col in self.columns.items()}
+            # Both runs matched: the samples are contiguous in ring order, wrapping at capacity
+            (a, b), (_, c) = spans
+            index = np.arange(a, a + (b - a) + c) % capacity
+            return {name: col[row].take(index) for name, col in self.columns.items()}
+
+
+def format_trajectory(columns: Dict[str, np.ndarray]) -> List[Dict]:
+    """Samples as /trains/<id>/history records, float32 columns rounded to their precision (about 1 m)."""
+    times = np.datetime_as_string((columns["ts"] * 1e3).astype("datetime64[ms]"), timezone="UTC")
+    return [
+        {"ts": ts, "lat": lat, "lon": lon, "speed_kmph": speed, "delay_min": delay, "passenger_count": pax}
+        for ts, lat, lon, speed, delay, pax in zip(
+            times.tolist(),
+            columns["lat"].astype(np.float64).round(5).tolist(),
+            columns["lon"].astype(np.float64).round(5).tolist(),
+            columns["speed_kmph"].astype(np.float64).round(2).tolist(),
+            columns["delay_min"].astype(np.float64).round(2).tolist(),
+            columns["passenger_count"].tolist(),
+        )
+    ]
@@ -0,0 +1,15 @@
+import threading
+
+import pytest
+
+from tests.helpers import FakeES
+
+
+@pytest.fixture
+def fake_es():
+    fake = FakeES()
+    thread = threading.Thread(target=fake.server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield fake
+    fake.server.shutdown()
+    fake.server.server_close()
@@ -0,0 +1,104 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from models.station_event import StationEvent
+from models.train_event import TrainEvent
+
+TS = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def make_train(i: int = 0, delay: float = 1.0, seconds: float = 0.0, **fields: Any) -> TrainEvent:
+    """Event ``ev-<i>`` of train ``TRN-<i:03d>`` at ``TS + seconds``; ``fields`` override any other field."""
+    values: Dict[str, Any] = dict(
+        id=f"ev-{i}",
+        train_id=f"TRN-{i:03d}",
+        location=(28.5, 77.1),
+        speed_kmph=30.0,
+        ts=TS + timedelta(seconds=seconds),
+        delay_min=delay,
+        passenger_count=100,
+        next_station="STN-001",
+    )
+    values.update(fields)
+    return TrainEvent(**values)
+
+
+def make_station(i: int = 0, occupancy: int = 10, wait: float = 2.0, **fields: Any) -> StationEvent:
+    """Event ``st-<i>`` of station ``STN-<i:03d>`` at ``TS``; ``fields`` override any other field."""
+    values: Dict[str, Any] = dict(
+        id=f"st-{i}", station_id=f"STN-{i:03d}", ts=TS, platform_occupancy=occupancy, avg_wait_min=wait
+    )
+    values.update(fields)
+    return StationEvent(**values)
+
+
+class FakeES:
+    """Minimal Elasticsearch HTTP stand-in: answers info and _bulk requests.
+
+    ``fail_statuses`` is consumed one status per bulk item before items succeed,
+    which lets tests script partial failures.
+    """
+
+    def __init__(self) -> None:
+        self.docs: Dict[str, List[dict]] = {}
+        self.bulk_requests = 0
+        self.fail_statuses: List[int] = []
+        self.down = False
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def count(self, index: str) -> int:
+        with self.lock:
+            return len(self.docs.get(index, []))
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def _reply(self, code: int, body: dict) -> None:
+                payload = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("X-Elastic-Product", "Elasticsearch")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self) -> None:
+                if fake.down:
+                    self._reply(503, {"error": "unavailable"})
+                    return
+                self._reply(200, {"version": {"number": "8.14.0"}, "tagline": "You Know, for Search"})
+
+            do_HEAD = do_GET
+
+            def do_POST(self) -> None:
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if fake.down:
+                    self._reply(503, {"error": "unavailable"})
+                    return
+                lines = [json.loads(line) for line in raw.decode().splitlines() if line.strip()]
+                default_index = self.path.strip("/").split("/")[0]
+                items, errors = [], False
+                with fake.lock:
+                    fake.bulk_requests += 1
+                    for action, doc in zip(lines[::2], lines[1::2]):
+                        index = action["index"].get("_index", default_index)
+                        status = fake.fail_statuses.pop(0) if fake.fail_statuses else 201
+                        if status < 300:
+                            fake.docs.setdefault(index, []).append(doc)
+                        else:
+                            errors = True
+                        items.append({"index": {"_index": index, "status": status}})
+                self._reply(200, {"took": 1, "errors": errors, "items": items})
+
+            do_PUT = do_POST
+
+        return Handler
@@ -0,0 +1,221 @@
+import random
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator
+from services.train_store import ColumnarTrainStore
+from tests.helpers import make_station, make_train
+
+
+def _train(i: int, delay: float = 1.0, **kwargs) -> TrainEvent:
+    # Spread out per train so the stats, sort orders and boards are not all ties
+    fields = dict(location=(28.5 + i * 0.01, 77.1), speed_kmph=30.0 + i, passenger_count=100 + i,
+                  next_station=f"STN-{i % 3:03d}")
+    fields.update(kwargs)
+    return make_train(i, delay, **fields)
+
+
+@pytest.mark.parametrize("backend", ["dict", "columnar"])
+def test_backends_agree_on_stats_and_snapshot(backend):
+    agg = Aggregator(backend=backend)
+    for i in range(6):
+        agg.update(_train(i, delay=float(i)))
+    agg.update(_train(2, delay=9.0, status="halted"))
+    agg.update(make_station(1, occupancy=400, ts=datetime.now(timezone.utc)))
+    stats = agg.compute_stats()
+    assert stats["trains_active"] == 6
+    assert stats["avg_delay_min"] == round((0 + 1 + 9 + 3 + 4 + 5) / 6, 2)
+    assert stats["passengers_total"] == sum(100 + i for i in range(6))
+    assert stats["crowded_stations"] == 1
+    assert stats["on_time_percent"] == 50.0
+    trains = {t["train_id"]: t for t in agg.snapshot()["trains"]}
+    assert trains["TRN-002"] == _train(2, delay=9.0, status="halted").model_dump()
+
+
+def test_columnar_store_grows_and_removes():
+    store = ColumnarTrainStore(initial_capacity=2)
+    for i in range(5):
+        store.upsert(_train(i))
+    assert len(store) == 5
+    assert store.remove("TRN-001")
+    assert not store.remove("TRN-001")
+    assert sorted(store) == ["TRN-000", "TRN-002", "TRN-003", "TRN-004"]
+    assert store.get("TRN-004") == _train(4)
+    assert store.kpis()["passengers_total"] == 100 + 102 + 103 + 104
+
+
+def test_columnar_upsert_many_grows_and_keeps_last_event_per_train():
+    store = ColumnarTrainStore(initial_capacity=2)
+    events = [_train(i % 60, delay=float(i)) for i in range(120)]
+    store.upsert_many(events)
+    assert len(store) == 60
+    assert store.get("TRN-005") == _train(5, delay=65.0)
+
+
+@pytest.mark.parametrize("backend", ["dict", "columnar"])
+def test_running_kpis_match_full_scan_over_random_stream(backend):
+    rng = random.Random(1234)
+    agg = Aggregator(backend=backend, kpi_resync_interval=0)
+    for n in range(20_000):
+        if rng.random() < 0.8:
+            agg.update(_train(rng.randrange(300), delay=rng.uniform(-2.0, 8.0),
+                              speed_kmph=rng.uniform(0.0, 80.0), passenger_count=rng.randint(0, 250)))
+        else:
+            agg.update(make_station(rng.randrange(20), rng.randint(0, 500), 3.0, id=f"s-{n}"))
+        if n % 997 == 0:
+            running, scanned = agg.kpis.as_dict(), agg.scan_kpis()
+            for key in ("count", "passengers_total", "on_time", "crowded_stations"):
+                assert running[key] == scanned[key]
+            assert running["delay_sum"] == pytest.approx(scanned["delay_sum"])
+            assert running["speed_sum"] == pytest.approx(scanned["speed_sum"])
+    fast, full = agg.compute_stats(), agg.compute_stats(full_scan=True)
+    fast.pop("ts"), full.pop("ts")
+    assert fast == full
+
+
+@pytest.mark.parametrize("backend", ["dict", "columnar"])
+def test_update_many_matches_update_per_event(backend):
+    rng = random.Random(99)
+    events = []
+    for n in range(3_000):
+        if rng.random() < 0.8:
+            events.append(_train(rng.randrange(50), delay=rng.uniform(-2.0, 8.0), id=f"ev-{n}",
+                                 status=rng.choice(["running", "halted"])))
+        else:
+            events.append(make_station(rng.randrange(8), rng.randint(0, 500), 3.0, id=f"s-{n}"))
+    single, batched = Aggregator(backend=backend), Aggregator(backend=backend)
+    for ev in events:
+        single.update(ev)
+    for start in range(0, len(events), 333):
+        batched.update_many(events[start : start + 333])
+    assert batched.version == single.version
+    assert batched.section_versions == single.section_versions
+    assert batched.kpis.as_dict() == pytest.approx(single.kpis.as_dict())
+    assert batched.snapshot() == single.snapshot()
+    assert batched.delta("trains", 2_000) == single.delta("trains", 2_000)
+
+
+def test_kpi_resync_runs_every_interval():
+    agg = Aggregator(backend="dict", kpi_resync_interval=5)
+    for i in range(4):
+        agg.update(_train(i))
+    agg.kpis.delay_sum += 100.0  # simulated drift
+    agg.update(_train(4))
+    assert agg.kpis.delay_sum == pytest.approx(5.0)
+
+
+@pytest.mark.parametrize("backend", ["dict", "columnar"])
+def test_delta_returns_changes_and_removals_after_cursor(backend):
+    agg = Aggregator(backend=backend)
+    for i in range(5):
+        agg.update(_train(i))
+    cursor = agg.version
+    agg.update(_train(3, delay=7.0))
+    agg.update(_train(1, delay=2.0))
+    agg.update(_train(3, delay=8.0))
+    assert agg.remove_train("TRN-004")
+    delta = agg.delta("trains", cursor)
+    assert not delta["full"]
+    assert [t["train_id"] for t in delta["changed"]] == ["TRN-001", "TRN-003"]
+    assert delta["changed"][1]["delay_min"] == 8.0
+    assert delta["removed"] == ["TRN-004"]
+    assert agg.compute_stats()["trains_active"] == 4
+
+    assert agg.delta("trains", delta["version"])["changed"] == []
+    assert agg.delta("trains", agg.version + 10)["full"]
+
+
+def test_delta_requires_full_resync_past_pruned_tombstones():
+    agg = Aggregator(backend="dict")
+    agg.train_changes.max_tombstones = 1
+    for i in range(3):
+        agg.update(_train(i))
+    cursor = agg.version
+    agg.remove_train("TRN-000")
+    agg.remove_train("TRN-001")
+    delta = agg.delta("trains", cursor)
+    assert delta["full"] and [t["train_id"] for t in delta["changed"]] == ["TRN-002"]
+
+
+def test_snapshot_published_every_n_updates():
+    agg = Aggregator(backend="dict", snapshot_interval_seconds=60.0, snapshot_every_updates=3)
+    agg.update(_train(0))
+    agg.update(_train(1))
+    assert agg.snapshot()["trains"] == []
+    assert agg.staleness()["versions_behind"] == 2
+    agg.update(_train(2))
+    assert len(agg.snapshot()["trains"]) == 3
+    assert agg.staleness() == {"version": 3, "versions_behind": 0, "age_seconds": 0.0}
+
+
+@pytest.mark.parametrize("backend", ["dict", "columnar"])
+def test_published_snapshots_are_immutable_and_share_unchanged_records(backend):
+    agg = Aggregator(backend=backend)
+    for i in range(3):
+        agg.update(_train(i))
+    first = agg.current()
+    agg.update(_train(1, delay=9.0))
+    agg.remove_train("TRN-002")
+    second = agg.current()
+    assert first.trains["TRN-001"]["delay_min"] == 1.0 and "TRN-002" in first.trains
+    assert second.trains["TRN-001"]["delay_min"] == 9.0 and "TRN-002" not in second.trains
+    assert second.trains["TRN-000"] is first.trains["TRN-000"]
+    assert agg.compute_stats()["trains_active"] == 2
+
+
+def test_readers_do_not_wait_for_a_held_write_lock():
+    agg = Aggregator(backend="dict")
+    agg.update(_train(0))
+    agg.current()
+    agg.update(_train(1))
+    held, release = threading.Event(), threading.Event()
+
+    def writer():
+        with agg.lock:
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    held.wait(5)
+    try:
+        # The lock is busy, so the reader keeps the previous snapshot instead of blocking
+        assert len(agg.snapshot()["trains"]) == 1
+        delta = agg.delta("trains", 0)
+        assert delta["version"] == 1 and [t["train_id"] for t in delta["changed"]] == ["TRN-000"]
+    finally:
+        release.set()
+        thread.join()
+    assert len(agg.snapshot()["trains"]) == 2
+
+
+def test_delta_spans_several_publishes_until_history_is_cut(monkeypatch):
+    monkeypatch.setattr("services.change_log.HISTORY_MAX_ENTRIES", 4)
+    agg = Aggregator(backend="dict")
+    for i in range(3):
+        agg.update(_train(i))
+        agg.publish()
+    agg.update(_train(0, delay=5.0))
+    agg.remove_train("TRN-001")
+    delta = agg.delta("trains", 1)
+    assert [t["train_id"] for t in delta["changed"]] == ["TRN-002", "TRN-000"] and delta["removed"] == ["TRN-001"]
+    assert agg.delta("trains", 3)["changed"][0]["delay_min"] == 5.0
+    for step in range(12):
+        agg.update(_train(2, delay=float(step)))
+        agg.publish()
+    assert agg.delta("trains", 1)["full"]
+    assert [t["train_id"] for t in agg.delta("trains", agg.version - 1)["changed"]] == ["TRN-002"]
+
+
+def test_snapshot_rebuilds_past_pruned_tombstones():
+    agg = Aggregator(backend="dict")
+    agg.train_changes.max_tombstones = 1
+    for i in range(3):
+        agg.update(_train(i))
+    agg.current()
+    agg.remove_train("TRN-000")
+    agg.remove_train("TRN-001")
+    assert list(agg.current().trains) == ["TRN-002"]
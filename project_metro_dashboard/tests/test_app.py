@@ -0,0 +1,178 @@
+import asyncio
+import gzip
+import json
+import os
+
+os.environ.setdefault("ES_ENABLED", "false")
+
+import pytest
+
+import app as app_module
+from services.aggregator import Aggregator
+from services.event_gate import EventGate
+from tests.helpers import make_station, make_train
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, "_bootstrap_done", True)
+    monkeypatch.setattr(app_module, "aggregator", Aggregator(backend="dict"))
+    app_module.app.config["TESTING"] = True
+    return app_module.app.test_client()
+
+
+def test_trains_served_from_cache_with_etag(client):
+    agg = app_module.aggregator
+    agg.update(make_train(1))
+    first = client.get("/trains")
+    assert first.status_code == 200
+    with app_module.app.app_context():
+        assert first.data == app_module.jsonify(agg.snapshot()["trains"]).data
+    etag = first.headers["ETag"]
+
+    assert client.get("/trains", headers={"If-None-Match": etag}).status_code == 304
+    # A station update does not invalidate the trains section
+    agg.update(make_station(1, wait=1.0, id="s"))
+    assert client.get("/trains", headers={"If-None-Match": etag}).status_code == 304
+
+    agg.update(make_train(1, delay=5.0))
+    changed = client.get("/trains", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert json.loads(changed.data)[0]["delay_min"] == 5.0
+
+
+def test_large_sections_are_gzipped_on_request(client):
+    for i in range(50):
+        app_module.aggregator.update(make_train(i))
+    plain = client.get("/trains")
+    zipped = client.get("/trains", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(zipped.data) == plain.data
+    assert len(json.loads(plain.data)) == 50
+
+
+def test_trains_since_returns_delta(client):
+    agg = app_module.aggregator
+    for i in range(3):
+        agg.update(make_train(i))
+    full = client.get("/trains?since=0").get_json()
+    assert len(full["changed"]) == 3 and not full["full"]
+    agg.update(make_train(2, delay=9.0))
+    delta = client.get(f"/trains?since={full['version']}").get_json()
+    assert [t["train_id"] for t in delta["changed"]] == ["TRN-002"]
+    assert delta["removed"] == [] and delta["version"] == agg.version
+
+
+def test_stream_starts_with_snapshot_frame(client, monkeypatch):
+    monkeypatch.setattr(app_module.broadcaster, "aggregator", app_module.aggregator)
+    monkeypatch.setattr(app_module.broadcaster, "start", lambda: None)
+    app_module.aggregator.update(make_train(7))
+    resp = client.get("/stream")
+    assert resp.mimetype == "text/event-stream"
+    first = next(resp.response)
+    resp.close()
+    assert first.startswith(b"id: 1\nevent: snapshot\n")
+    assert app_module.broadcaster.subscriber_count == 0
+
+
+def test_rollup_endpoint(client):
+    app_module.aggregator.update(make_train(1, delay=4.0))
+    body = client.get("/rollups/trains/TRN-001?window=60&series=1").get_json()
+    assert body["id"] == "TRN-001" and body["count"] == 1
+    assert body["metrics"]["delay_min"]["avg"] == 4.0
+    assert len(body["series"]) == 1
+    assert client.get("/rollups/trains/fleet").get_json()["count"] == 1
+    assert client.get("/rollups/trains/TRN-404").status_code == 404
+    assert client.get("/rollups/trains/TRN-001?window=-1").status_code == 400
+    assert client.get("/rollups/buses/TRN-001").status_code == 404
+
+
+def test_stats_and_station_percentiles(client):
+    for i in range(1, 5):
+        app_module.aggregator.update(make_train(i, delay=float(i)))
+    app_module.aggregator.update(make_station(1, occupancy=120))
+    percentiles = client.get("/stats").get_json()["percentiles"]
+    assert percentiles["delay_min"]["count"] == 4
+    assert abs(percentiles["delay_min"]["p50"] - 2.0) <= 0.02
+    body = client.get("/stations/STN-001/percentiles").get_json()
+    assert body["id"] == "STN-001" and body["wait_min"]["count"] == 1
+    assert client.get("/stations/STN-404/percentiles").status_code == 404
+
+
+def test_trains_bbox_and_nearest(client):
+    agg = app_module.aggregator
+    for i, location in enumerate([(28.50, 77.10), (28.52, 77.12), (28.80, 77.35)]):
+        agg.update(make_train(i, delay=0.0, location=location))
+    body = client.get("/trains?bbox=28.49,77.09,28.53,77.13").get_json()
+    assert body["count"] == 2 and {t["train_id"] for t in body["trains"]} == {"TRN-000", "TRN-001"}
+    nearest = client.get("/trains/nearest?lat=28.79&lon=77.34&k=2").get_json()["trains"]
+    assert [t["train_id"] for t in nearest] == ["TRN-002", "TRN-001"]
+    assert 0 < nearest[0]["distance_km"] < nearest[1]["distance_km"]
+    assert client.get("/trains?bbox=28.6,77.1").status_code == 400
+    assert client.get("/trains/nearest?lat=28.6").status_code == 400
+    assert client.get("/trains/nearest?lat=28.6&lon=77.1&k=0").status_code == 400
+
+
+def test_trains_filters_projection_sort_and_paging(client):
+    agg = app_module.aggregator
+    for i in range(12):
+        agg.update(make_train(i, delay=float(i), next_station=f"STN-{i % 2:03d}",
+                              passenger_count=250 if i % 3 == 0 else 100))
+    body = client.get("/trains?is_delayed=true&next_station=STN-001&sort=-delay_min&limit=2&offset=1").get_json()
+    assert body["count"] == 4 and (body["offset"], body["limit"]) == (1, 2)
+    assert [t["train_id"] for t in body["trains"]] == ["TRN-009", "TRN-007"]
+    body = client.get("/trains?is_overcrowded=1&fields=train_id,passenger_count").get_json()
+    assert body["trains"] == [{"train_id": f"TRN-{i:03d}", "passenger_count": 250} for i in (0, 3, 6, 9)]
+    assert client.get("/trains?limit=3").get_json()["count"] == 12
+    assert client.get("/trains?status=halted").get_json()["trains"] == []
+    assert client.get("/trains?is_delayed=maybe").status_code == 400
+    assert client.get("/trains?fields=train_id,nope").status_code == 400
+    assert client.get("/trains?sort=-nope").status_code == 400
+    assert client.get("/trains?limit=-1").status_code == 400
+
+
+def test_station_incoming(client):
+    agg = app_module.aggregator
+    lat, lon = agg.boards.stations.location("STN-001")
+    for i, offset in enumerate([0.05, 0.01, 0.03]):
+        agg.update(make_train(i, location=(lat + offset, lon)))
+    agg.update(make_train(3, next_station="STN-002"))
+    body = client.get("/stations/STN-001/incoming?limit=2").get_json()
+    assert body["id"] == "STN-001" and body["count"] == 3 and body["version"] == agg.version
+    assert [t["train_id"] for t in body["trains"]] == ["TRN-001", "TRN-002"]
+    assert client.get("/stations/STN-404/incoming").status_code == 404
+    assert client.get("/stations/STN-001/incoming?limit=0").status_code == 400
+
+
+def test_train_history(client):
+    agg = app_module.aggregator
+    for second in range(5):
+        agg.update(make_train(1, delay=float(second), seconds=second, id=f"ev-{second}"))
+    body = client.get("/trains/TRN-001/history?from=2025-01-01T00:00:01&to=1735689603").get_json()
+    assert body["id"] == "TRN-001" and body["count"] == 3
+    assert [s["delay_min"] for s in body["samples"]] == [1.0, 2.0, 3.0]
+    assert body["samples"][0]["ts"] == "2025-01-01T00:00:01.000Z"
+    assert client.get("/trains/TRN-001/history").get_json()["count"] == 5
+    assert client.get("/trains/TRN-404/history").status_code == 404
+    assert client.get("/trains/TRN-001/history?from=yesterday").status_code == 400
+    assert client.get("/trains/TRN-001/history?from=1735689603&to=1735689601").status_code == 400
+
+
+def test_queue_join_waits_for_events_the_gate_holds(monkeypatch):
+    agg = Aggregator(backend="dict")
+    monkeypatch.setattr(app_module, "aggregator", agg)
+
+    async def run() -> int:
+        queue: asyncio.Queue = asyncio.Queue()
+        gate = EventGate(reorder_tolerance_seconds=60.0)
+        task = asyncio.create_task(app_module.consumer(queue, archive_events=False, gate=gate, idle_flush_seconds=0.0))
+        for i in range(3):
+            await queue.put(make_train(i))
+        await asyncio.wait_for(queue.join(), 5)
+        applied = len(agg.snapshot()["trains"])
+        task.cancel()
+        return applied
+
+    assert asyncio.run(run()) == 3
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("ES_ENABLED", "false")
+
+import pytest
+
+import app as app_module
+import asgi
+from services.aggregator import Aggregator
+from tests.helpers import make_train
+
+
+def _call(scope: Dict, stop_after: int = 0) -> List[Dict]:
+    """Run the ASGI app; the client disconnects once ``stop_after`` body/ws messages arrived."""
+    sent: List[Dict] = []
+
+    async def run() -> None:
+        gone = asyncio.Event()
+        connected = False
+
+        async def receive() -> Dict:
+            nonlocal connected
+            if scope["type"] == "websocket" and not connected:
+                connected = True
+                return {"type": "websocket.connect"}
+            if not stop_after:
+                return {"type": "http.request", "body": b""}
+            await gone.wait()
+            return {"type": "http.disconnect" if scope["type"] == "http" else "websocket.disconnect"}
+
+        async def send(message: Dict) -> None:
+            sent.append(message)
+            if stop_after and sum(m["type"] in ("http.response.body", "websocket.send") for m in sent) >= stop_after:
+                gone.set()
+
+        await asyncio.wait_for(asgi.app(scope, receive, send), 5)
+
+    asyncio.run(run())
+    return sent
+
+
+def _get(path: str, query: str = "", headers: Tuple = (), method: str = "GET") -> Tuple[int, Dict[bytes, bytes], bytes]:
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(),
+             "headers": [(k.lower().encode(), v.encode()) for k, v in headers]}
+    messages = _call(scope)
+    return messages[0]["status"], dict(messages[0]["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    agg = Aggregator(backend="dict")
+    monkeypatch.setattr(app_module, "aggregator", agg)
+    monkeypatch.setattr(app_module.broadcaster, "aggregator", agg)
+    monkeypatch.setattr(app_module.broadcaster, "start", lambda: None)
+    monkeypatch.setattr(asgi, "views", asgi.ViewPublisher())
+    return agg
+
+
+def test_trains_view_with_etag(fresh_state):
+    fresh_state.update(make_train(1))
+    status, headers, body = _get("/trains")
+    assert status == 200
+    assert json.loads(body)[0]["train_id"] == "TRN-001"
+    etag = headers[b"etag"].decode()
+    assert _get("/trains", headers=(("If-None-Match", etag),))[0] == 304
+
+
+def test_view_changes_only_when_refreshed(fresh_state):
+    fresh_state.update(make_train(1))
+    _get("/trains")
+    fresh_state.update(make_train(2))
+    # Readers keep the published body until the publisher swaps in a new one
+    assert len(json.loads(_get("/trains")[2])) == 1
+    asyncio.run(asgi.views.refresh())
+    assert len(json.loads(_get("/trains")[2])) == 2
+
+
+def test_trains_since_and_unknown_paths(fresh_state):
+    for i in range(3):
+        fresh_state.update(make_train(i))
+    delta = json.loads(_get("/trains", query="since=2")[2])
+    assert [t["train_id"] for t in delta["changed"]] == ["TRN-002"]
+    assert _get("/nope")[0] == 404
+    assert "/ws" in json.loads(_get("/")[2])["endpoints"]
+
+
+def test_head_sends_headers_without_a_body(fresh_state):
+    fresh_state.update(make_train(1))
+    for query in ("", "is_delayed=true", "since=0"):
+        _, get_headers, get_body = _get("/trains", query)
+        status, headers, body = _get("/trains", query, method="HEAD")
+        assert status == 200 and body == b""
+        assert headers[b"content-length"] == get_headers[b"content-length"] == str(len(get_body)).encode()
+    status, headers, body = _get("/stream", method="HEAD")
+    assert (status, headers[b"content-type"], body) == (200, b"text/event-stream", b"")
+    assert app_module.broadcaster.subscriber_count == 0
+
+
+def test_documents_are_built_off_the_event_loop(fresh_state, monkeypatch):
+    threads = []
+    nearest = app_module.nearest_document
+
+    def record(*args):
+        threads.append(threading.current_thread())
+        return nearest(*args)
+
+    monkeypatch.setattr(app_module, "nearest_document", record)
+    fresh_state.update(make_train(1))
+    assert _get("/trains/nearest", query="lat=28.5&lon=77.1")[0] == 200
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_trains_bbox_and_nearest(fresh_state):
+    for i in range(3):
+        fresh_state.update(make_train(i))
+    body = json.loads(_get("/trains", query="bbox=28.4,77.0,28.6,77.2")[2])
+    assert body["count"] == 3
+    nearest = json.loads(_get("/trains/nearest", query="lat=28.5&lon=77.1&k=2")[2])
+    assert len(nearest["trains"]) == 2 and nearest["trains"][0]["distance_km"] == 0.0
+    assert _get("/trains/nearest", query="lat=x&lon=77.1")[0] == 400
+
+
+def test_trains_query(fresh_state):
+    for i in range(5):
+        fresh_state.update(make_train(i, delay=float(i)))
+    body = json.loads(_get("/trains", query="is_delayed=true&fields=train_id&sort=-delay_min")[2])
+    assert body["count"] == 1 and body["trains"] == [{"train_id": "TRN-004"}]
+    assert _get("/trains", query="offset=x")[0] == 400
+
+
+def test_station_incoming(fresh_state):
+    for i in range(3):
+        fresh_state.update(make_train(i))
+    body = json.loads(_get("/stations/STN-001/incoming", query="limit=1")[2])
+    assert body["count"] == 3 and len(body["trains"]) == 1
+    assert _get("/stations/STN-404/incoming")[0] == 404
+    assert _get("/stations/STN-001/incoming", query="limit=x")[0] == 400
+
+
+def test_train_history(fresh_state):
+    for i in range(3):
+        fresh_state.update(make_train(1, delay=float(i)))
+    body = json.loads(_get("/trains/TRN-001/history", query="from=2025-01-01T00:00:00Z")[2])
+    assert body["count"] == 3 and [s["delay_min"] for s in body["samples"]] == [0.0, 1.0, 2.0]
+    assert _get("/trains/TRN-404/history")[0] == 404
+
+
+def test_stream_sends_snapshot_and_unsubscribes_on_disconnect(fresh_state):
+    fresh_state.update(make_train(7))
+    scope = {"type": "http", "method": "GET", "path": "/stream", "query_string": b"", "headers": []}
+    messages = _call(scope, stop_after=1)
+    assert dict(messages[0]["headers"])[b"content-type"] == b"text/event-stream"
+    assert messages[1]["body"].startswith(b"id: 1\nevent: snapshot\n")
+    assert app_module.broadcaster.subscriber_count == 0
+
+
+def test_websocket_sends_snapshot_message(fresh_state):
+    fresh_state.update(make_train(7))
+    messages = _call({"type": "websocket", "path": "/ws", "headers": []}, stop_after=1)
+    assert messages[0] == {"type": "websocket.accept"}
+    frame = json.loads(messages[1]["text"])
+    assert frame["event"] == "snapshot" and frame["id"] == 1
+    assert frame["data"]["trains"][0]["train_id"] == "TRN-007"
+    assert app_module.broadcaster.subscriber_count == 0
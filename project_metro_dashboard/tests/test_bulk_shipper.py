@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+from elasticsearch import Elasticsearch
+
+from services.bulk_shipper import BulkShipper
+from services.elastic_logger import ElasticLogger
+from services.metrics_exporter import es_docs_dropped
+
+
+def _client(fake_es) -> Elasticsearch:
+    return Elasticsearch(hosts=[fake_es.url], max_retries=0)
+
+
+def _dropped(reason: str) -> float:
+    return es_docs_dropped.labels(reason=reason)._value.get()  # type: ignore[attr-defined]
+
+
+def test_flushes_on_size_and_time(fake_es):
+    shipper = BulkShipper(_client(fake_es), max_docs=10, flush_seconds=0.2)
+    shipper.start()
+    try:
+        for i in range(25):
+            shipper.submit("metro-train-events", {"n": i})
+        shipper.submit("metro-kpis", {"n": 0})
+        deadline = time.monotonic() + 3
+        while fake_es.count("metro-train-events") < 25 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        shipper.stop()
+    assert fake_es.count("metro-train-events") == 25
+    assert fake_es.count("metro-kpis") == 1
+    assert [d["n"] for d in fake_es.docs["metro-train-events"]] == list(range(25))
+
+
+def test_retries_partial_failures(fake_es):
+    fake_es.fail_statuses = [201, 429, 400, 503]
+    before = _dropped("rejected")
+    shipper = BulkShipper(_client(fake_es), max_docs=100, retry_backoff_seconds=0.01)
+    for i in range(4):
+        shipper.submit("idx", {"n": i})
+    shipper.flush()
+    # 429/503 are retried, the 400 is a permanent rejection
+    assert sorted(d["n"] for d in fake_es.docs["idx"]) == [0, 1, 3]
+    assert fake_es.bulk_requests == 2
+    assert _dropped("rejected") == before + 1
+
+
+def test_exhausted_retries_go_to_dead_letter(fake_es):
+    fake_es.down = True
+    dead = []
+    shipper = BulkShipper(
+        _client(fake_es), max_retries=1, retry_backoff_seconds=0.01,
+        dead_letter=lambda index, docs: dead.append((index, docs)),
+    )
+    shipper.submit("idx", {"n": 1})
+    shipper.flush()
+    assert dead == [("idx", [{"n": 1}])]
+
+
+def test_overflow_policies():
+    newest = BulkShipper(client=None, buffer_max=2, overflow_policy="drop_newest")
+    assert newest.submit("i", {"n": 1}) and newest.submit("i", {"n": 2})
+    assert not newest.submit("i", {"n": 3})
+    assert list(newest._buffers["i"]) == [{"n": 1}, {"n": 2}]
+
+    oldest = BulkShipper(client=None, buffer_max=2, overflow_policy="drop_oldest")
+    for n in range(3):
+        assert oldest.submit("i", {"n": n})
+    assert list(oldest._buffers["i"]) == [{"n": 1}, {"n": 2}]
+
+    blocking = BulkShipper(client=None, buffer_max=1, overflow_policy="block", block_timeout_seconds=0.05)
+    assert blocking.submit("i", {"n": 1})
+    assert not blocking.submit("i", {"n": 2})
+
+
+def test_block_policy_never_waits_on_the_event_loop():
+    blocking = BulkShipper(client=None, buffer_max=1, overflow_policy="block", block_timeout_seconds=5.0)
+    assert blocking.submit("i", {"n": 1})
+
+    async def submit() -> bool:
+        return blocking.submit("i", {"n": 2})
+
+    start = time.monotonic()
+    assert not asyncio.run(submit())
+    assert time.monotonic() - start < 1.0
+
+
+def test_elastic_logger_routes_through_bulk_shipper(fake_es):
+    es = ElasticLogger(fake_es.url, enabled=True, bulk=True)
+    assert es.shipper is not None
+    es.index("metro-kpis", {"trains_active": 3})
+    es.close()
+    assert fake_es.docs["metro-kpis"] == [{"trains_active": 3}]
@@ -0,0 +1,31 @@
+import random
+
+from services.chunked_map import CHUNK_SIZE, ChunkedMap
+
+
+def test_patched_matches_a_dict_and_keeps_insertion_order():
+    rng = random.Random(5)
+    model = {f"k{i}": i for i in range(3 * CHUNK_SIZE)}
+    current = ChunkedMap.from_items(model.items())
+    for step in range(200):
+        removed = rng.sample(list(model), rng.randrange(0, 20)) if model else []
+        changed = [(f"k{rng.randrange(4 * CHUNK_SIZE)}", step) for _ in range(rng.randrange(0, 40))]
+        before = dict(current)
+        patched = current.patched(changed, removed)
+        for key in removed:
+            model.pop(key, None)
+        model.update(changed)
+        assert list(patched.items()) == list(model.items())
+        assert dict(current) == before
+        current = patched
+    assert len(current) == len(model) and all(current[k] == v for k, v in model.items())
+    assert current.get("missing") is None and "missing" not in current
+
+
+def test_patched_copies_only_touched_chunks():
+    base = ChunkedMap.from_items((f"k{i}", i) for i in range(4 * CHUNK_SIZE))
+    patched = base.patched([("k0", -1)])
+    shared = [a is b for a, b in zip(base._chunks, patched._chunks)]
+    assert shared == [False, True, True, True]
+    assert patched._where is base._where
+    assert patched["k0"] == -1 and base["k0"] == 0
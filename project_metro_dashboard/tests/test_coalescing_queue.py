@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from models.train_event import TrainEvent
+from services.coalescing_queue import CoalescingQueue
+from tests.helpers import make_station, make_train
+
+
+def _train(i: int, seq: int) -> TrainEvent:
+    return make_train(i, 0.0, id=f"ev-{i}-{seq}")
+
+
+def test_latest_event_wins_and_keeps_its_place():
+    raw = []
+
+    async def run():
+        q = CoalescingQueue(on_put=raw.append)
+        for seq in range(3):
+            await q.put(_train(1, seq))
+            await q.put(_train(2, seq))
+        await q.put(make_station(1))
+        assert q.qsize() == 3 and q.coalesced == 4
+        return [(await q.get()).id for _ in range(3)]
+
+    assert asyncio.run(run()) == ["ev-1-2", "ev-2-2", "st-1"]
+    assert len(raw) == 7
+
+
+def test_join_counts_only_queued_events():
+    async def run():
+        q = CoalescingQueue()
+        for seq in range(5):
+            q.put_nowait(_train(1, seq))
+        joined = asyncio.create_task(q.join())
+        await q.get()
+        await asyncio.sleep(0)
+        assert not joined.done()
+        q.task_done()
+        await asyncio.wait_for(joined, 1)
+        with pytest.raises(ValueError):
+            q.task_done()
+
+    asyncio.run(run())
+
+
+def test_full_queue_blocks_new_ids_but_merges_known_ones():
+    async def run():
+        q = CoalescingQueue(maxsize=1)
+        await q.put(_train(1, 0))
+        await asyncio.wait_for(q.put(_train(1, 1)), 1)
+        blocked = asyncio.create_task(q.put(_train(2, 0)))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        assert (await q.get()).id == "ev-1-1"
+        await asyncio.wait_for(blocked, 1)
+        assert (await q.get()).id == "ev-2-0"
+
+    asyncio.run(run())
+
+
+def test_drop_newest_discards_new_ids_when_full():
+    async def run():
+        q = CoalescingQueue(maxsize=1, overflow_policy="drop_newest")
+        await q.put(_train(1, 0))
+        await q.put(_train(2, 0))
+        assert q.dropped == 1 and q.qsize() == 1
+
+    asyncio.run(run())
@@ -0,0 +1,48 @@
+import asyncio
+
+from models.train_event import TrainEvent
+from services.coalescing_queue import CoalescingQueue
+from services.event_gate import EventGate
+from tests.helpers import make_train
+
+
+def _train(ev_id: str, train: int, second: float) -> TrainEvent:
+    return make_train(train, 0.0, second, id=ev_id, next_station=None)
+
+
+def test_duplicates_and_stale_events_are_rejected():
+    gate = EventGate(dedupe_window=10)
+    admitted = gate.push([_train("a", 1, 5), _train("a", 1, 5), _train("b", 1, 3), _train("c", 2, 1)])
+    assert [e.id for e in admitted] == ["a", "c"]
+    assert (gate.duplicates, gate.stale) == (1, 1)
+    # Same ts for the same train is not stale
+    assert [e.id for e in gate.push([_train("d", 1, 5)])] == ["d"]
+
+
+def test_dedupe_window_is_bounded():
+    gate = EventGate(dedupe_window=2, reject_stale=False)
+    gate.push([_train("a", 1, 0), _train("b", 1, 0), _train("c", 1, 0)])
+    # "a" fell out of the window, so it is accepted again
+    assert [e.id for e in gate.push([_train("a", 1, 0), _train("c", 1, 0)])] == ["a"]
+
+
+def test_reorder_buffer_applies_late_arrivals_in_ts_order():
+    gate = EventGate(reorder_tolerance_seconds=2.0)
+    assert gate.push([_train("a", 1, 10), _train("b", 1, 9)]) == []
+    assert gate.pending == 2
+    released = gate.push([_train("c", 2, 12)])
+    assert [e.id for e in released] == ["b", "a"]
+    # Later than the tolerance: rejected as stale once released
+    assert gate.push([_train("d", 1, 8)]) == []
+    assert [e.id for e in gate.flush()] == ["c"]
+    assert gate.stale == 1 and gate.pending == 0
+
+
+def test_coalescing_queue_keeps_newer_pending_event():
+    async def run():
+        q = CoalescingQueue()
+        await q.put(_train("new", 1, 10))
+        await q.put(_train("old", 1, 5))
+        return (await q.get()).id
+
+    assert asyncio.run(run()) == "new"
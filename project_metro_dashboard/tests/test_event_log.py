@@ -0,0 +1,106 @@
+import asyncio
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from services.event_log import INDEX_DTYPE, RECORD_DTYPE, EventLogReader, EventRecorder, parse_speed, replay
+from tests.helpers import TS, make_station, make_train
+
+
+def _events(n: int):
+    events = []
+    for i in range(n):
+        ts = TS + timedelta(seconds=i)
+        if i % 5 == 4:
+            events.append(make_station(1, 400, 6.5, id=f"s-{i}", ts=ts, alerts=["High occupancy", "Long wait"]))
+        else:
+            events.append(make_train(i % 3, -1.25, i, id=f"t-{i}", location=(28.5, 77.2 + i / 1000), speed_kmph=40.5,
+                                     passenger_count=i, next_station=None if i % 2 else "STN-004", status="halted"))
+    return events
+
+
+def test_round_trip_and_append(tmp_path):
+    path = str(tmp_path / "events.mlog")
+    events = _events(30)
+    recorder = EventRecorder(path, block_records=8, index_every=4)
+    for ev in events[:20]:
+        recorder.record(ev)
+    recorder.close()
+    recorder = EventRecorder(path, block_records=8)
+    for ev in events[20:]:
+        recorder.record(ev)
+    recorder.close()
+
+    reader = EventLogReader(path)
+    assert len(reader) == 30
+    assert [e.model_dump() for e in reader.events()] == [e.model_dump() for e in events]
+    assert list(reader.index["record"]) == list(range(0, 30, 4))
+
+
+def test_reopen_drops_a_torn_record_and_index_entries_past_it(tmp_path):
+    path = str(tmp_path / "events.mlog")
+    events = _events(12)
+    recorder = EventRecorder(path, block_records=8, index_every=4)
+    for ev in events[:8]:
+        recorder.record(ev)
+    recorder.close()
+    # A crash mid-flush: the index entry for record 8 landed, half of the record did not
+    with open(path, "ab") as fh:
+        fh.write(b"\1" * (RECORD_DTYPE.itemsize // 2))
+    with open(path + ".idx", "ab") as fh:
+        fh.write(np.array([(0.0, 8)], dtype=INDEX_DTYPE).tobytes())
+    recorder = EventRecorder(path, block_records=8)
+    assert recorder.records == 8
+    for ev in events[8:]:
+        recorder.record(ev)
+    recorder.close()
+    recorder.close()
+
+    reader = EventLogReader(path)
+    assert [e.model_dump() for e in reader.events()] == [e.model_dump() for e in events]
+    assert list(reader.index["record"]) == [0, 4, 8]
+
+
+def test_overlong_strings_are_truncated_with_a_warning(tmp_path, caplog):
+    recorder = EventRecorder(str(tmp_path / "events.mlog"))
+    ev = _events(1)[0].model_copy(update={"train_id": "TRAIN-WITH-A-LONG-NAME"})
+    with caplog.at_level("WARNING", logger="event_log"):
+        recorder.record(ev)
+        recorder.record(ev)
+    recorder.close()
+    assert len([r for r in caplog.records if "truncated" in r.message]) == 1
+    assert next(EventLogReader(recorder.path).events()).train_id == "TRAIN-WITH-A-LONG-NAME"[:16]
+
+
+def test_seek_time_uses_index(tmp_path):
+    path = str(tmp_path / "events.mlog")
+    recorder = EventRecorder(path, index_every=10)
+    for ev in _events(100):
+        recorder.record(ev)
+    recorder.close()
+    reader = EventLogReader(path)
+    assert reader.seek_time((TS + timedelta(seconds=37)).timestamp()) == 37
+    assert reader.seek_time((TS + timedelta(seconds=36.5)).timestamp()) == 37
+    assert reader.seek_time(TS.timestamp() - 1) == 0
+    assert reader.seek_time((TS + timedelta(days=1)).timestamp()) == 100
+
+
+@pytest.mark.asyncio
+async def test_replay_at_max_and_scaled_speed(tmp_path):
+    path = str(tmp_path / "events.mlog")
+    recorder = EventRecorder(path)
+    for ev in _events(11):  # spans 10 seconds of recorded time
+        recorder.record(ev)
+    recorder.close()
+
+    queue: asyncio.Queue = asyncio.Queue()
+    await replay(queue, path, speed=parse_speed("max"))
+    assert queue.qsize() == 11
+
+    queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await replay(queue, path, speed=parse_speed("50x"))
+    assert queue.qsize() == 11
+    assert 0.15 <= loop.time() - start < 1.0
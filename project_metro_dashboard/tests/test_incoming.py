@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+import pytest
+
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator
+from services.incoming import estimate_arrivals
+from services.stations import StationCatalog
+from tests.helpers import TS, make_train
+
+STATIONS = StationCatalog(["STN-A", "STN-B"], [28.5, 28.7], [77.1, 77.1])
+KM_PER_DEG_LAT = 111.195
+
+
+def _train(train_id: str, north_km: float, speed: float = 60.0, delay: float = 0.0, station: str = "STN-A",
+           seconds: float = 0.0) -> TrainEvent:
+    return make_train(0, delay, seconds, id=f"{train_id}-{seconds}", train_id=train_id,
+                      location=(28.5 + north_km / KM_PER_DEG_LAT, 77.1), speed_kmph=speed, next_station=station)
+
+
+def test_estimate_arrivals_orders_by_eta():
+    records = [
+        _train("far-fast", 10.0, speed=120.0).model_dump(),
+        _train("near-slow", 2.0, speed=30.0, delay=3.0).model_dump(),
+        _train("stopped", 1.0, speed=0.0).model_dump(),
+    ]
+    arrivals = estimate_arrivals(records, (28.5, 77.1), min_speed_kmph=20.0)
+    assert [a["train_id"] for a in arrivals] == ["stopped", "near-slow", "far-fast"]
+    stopped, near, far = arrivals
+    # Stopped trains travel at the floor speed: 1 km at 20 km/h
+    assert stopped["eta_seconds"] == pytest.approx(180.0, abs=0.5)
+    assert near["eta_seconds"] == pytest.approx(240.0, abs=0.5)
+    assert far["distance_km"] == pytest.approx(10.0, abs=0.01)
+    assert (near["eta"] - TS).total_seconds() == pytest.approx(near["eta_seconds"], abs=0.1)
+    assert near["scheduled"] == near["eta"] - timedelta(minutes=3)
+    assert estimate_arrivals([], (28.5, 77.1), 20.0) == []
+
+
+@pytest.mark.parametrize("backend", ["dict", "columnar"])
+def test_board_cached_until_an_incoming_train_updates(backend):
+    agg = Aggregator(backend=backend, stations=STATIONS, snapshot_interval_seconds=0)
+    agg.update_many([_train("T1", 3.0), _train("T2", 1.0), _train("T3", 5.0, station="STN-B")])
+    version, board = agg.incoming_trains("STN-A")
+    assert [a["train_id"] for a in board] == ["T2", "T1"]
+    assert version == agg.version
+    # Unrelated updates keep the cached list
+    agg.update(_train("T3", 6.0, station="STN-B", seconds=2))
+    assert agg.incoming_trains("STN-A")[1] is board
+    assert [a["train_id"] for a in agg.incoming_trains("STN-B")[1]] == ["T3"]
+    # An incoming train moving rebuilds the board
+    agg.update(_train("T1", 0.5, seconds=4))
+    rebuilt = agg.incoming_trains("STN-A")[1]
+    assert rebuilt is not board and [a["train_id"] for a in rebuilt] == ["T1", "T2"]
+    # ... and so does a train heading elsewhere, arriving or leaving
+    agg.update(_train("T2", 1.0, station="STN-B", seconds=6))
+    assert [a["train_id"] for a in agg.incoming_trains("STN-A")[1]] == ["T1"]
+    assert {a["train_id"] for a in agg.incoming_trains("STN-B")[1]} == {"T2", "T3"}
+    agg.remove_train("T1")
+    assert agg.incoming_trains("STN-A")[1] == []
+    assert agg.incoming_trains("STN-404") is None
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_board_matches_with_and_without_index(indexed):
+    agg = Aggregator(backend="columnar", stations=STATIONS, train_indexes=indexed)
+    agg.update_many([_train(f"T{i}", i * 0.7, station="STN-B" if i % 2 else "STN-A") for i in range(20)])
+    assert [a["train_id"] for a in agg.incoming_trains("STN-A")[1]] == [f"T{i}" for i in range(0, 20, 2)]
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from services.aggregator import Aggregator
+from services.live_stream import Broadcaster
+from tests.helpers import make_train
+
+
+def _parse(frame):
+    fields = dict(line.split(": ", 1) for line in frame.sse.decode().strip().split("\n"))
+    return fields["event"], json.loads(fields["data"])
+
+
+def _broadcaster(agg, **kwargs) -> Broadcaster:
+    return Broadcaster(agg, lambda data: json.dumps(data, default=str), **kwargs)
+
+
+def test_subscribers_get_snapshot_then_one_coalesced_delta():
+    agg = Aggregator(backend="dict")
+    agg.update(make_train(0))
+    b = _broadcaster(agg)
+    subs = [b.subscribe() for _ in range(3)]
+    event, snapshot = _parse(subs[0][1])
+    assert event == "snapshot" and [t["train_id"] for t in snapshot["trains"]] == ["TRN-000"]
+
+    for delay in (2.0, 3.0, 4.0):
+        agg.update(make_train(1, delay=delay))
+    assert b.publish_once() == 3
+    assert b.publish_once() == 0  # nothing changed since the last push
+    frames = [sub.get(timeout=0.1) for sub, _ in subs]
+    assert frames[0] is frames[1] is frames[2]  # serialized once, shared by all
+    event, delta = _parse(frames[0])
+    assert event == "delta"
+    assert [(t["train_id"], t["delay_min"]) for t in delta["trains"]["changed"]] == [("TRN-001", 4.0)]
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "disconnect"])
+def test_slow_consumer_policy(policy):
+    agg = Aggregator(backend="dict")
+    b = _broadcaster(agg, queue_size=2, drop_policy=policy)
+    slow, _ = b.subscribe()
+    for i in range(4):
+        agg.update(make_train(i))
+        b.publish_once()
+    if policy == "drop_oldest":
+        versions = [_parse(slow.get(timeout=0.1))[1]["version"] for _ in range(2)]
+        assert versions == [3, 4] and slow.dropped == 2
+    else:
+        assert slow.closed and b.subscriber_count == 0
+        slow.get(timeout=0.1)
+        slow.get(timeout=0.1)
+        with pytest.raises(EOFError):
+            slow.get(timeout=0.1)
+
+
+def test_late_subscriber_gets_the_changes_after_its_snapshot():
+    agg = Aggregator(backend="dict", snapshot_interval_seconds=3600)
+    agg.update(make_train(0))
+    agg.publish()
+    b = _broadcaster(agg)
+    agg.update(make_train(1))
+    assert b.publish_once() == 0
+    # The published snapshot still predates TRN-001, so the first delta must carry it
+    sub, snapshot = b.subscribe()
+    assert [t["train_id"] for t in _parse(snapshot)[1]["trains"]] == ["TRN-000"]
+    agg.publish()
+    assert b.publish_once() == 1
+    _, delta = _parse(sub.get(timeout=0.1))
+    assert delta["since"] == 1 and [t["train_id"] for t in delta["trains"]["changed"]] == ["TRN-001"]
+    assert b.publish_once() == 0
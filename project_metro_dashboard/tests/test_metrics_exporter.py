@@ -1,6 +1,7 @@
 from services.metrics_exporter import (
     avg_delay_g,
     crowded_stations_g,
+    delay_quantile_g,
     total_passengers_g,
     trains_active_g,
     update_from_stats,
@@ -20,3 +21,15 @@ def test_metrics_update_from_stats():
     assert total_passengers_g._value.get() == 800  # type: ignore[attr-defined]
     assert crowded_stations_g._value.get() == 2  # type: ignore[attr-defined]
 
+
+def test_metrics_update_from_stats_percentiles():
+    stats = {
+        "trains_active": 5,
+        "percentiles": {
+            "window_seconds": 900,
+            "delay_min": {"count": 5, "p50": 1.5, "p95": 6.0, "p99": None},
+        },
+    }
+    update_from_stats(stats)
+    assert delay_quantile_g.labels(quantile="0.5")._value.get() == 1.5  # type: ignore[attr-defined]
+    assert delay_quantile_g.labels(quantile="0.95")._value.get() == 6.0  # type: ignore[attr-defined]
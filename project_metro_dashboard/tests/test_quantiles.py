@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from services.quantiles import DDSketch, KpiSketches, WindowedSketch, format_percentiles, merge_sketches
+
+
+def _assert_accurate(sketch: DDSketch, values: np.ndarray, accuracy: float) -> None:
+    for q in (0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 1.0):
+        exact = np.quantile(values, q, method="lower")
+        assert abs(sketch.quantile(q) - exact) <= accuracy * abs(exact) + 1e-3
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_quantiles_within_relative_accuracy(batched):
+    rng = np.random.default_rng(7)
+    # Delays are mostly small, some trains run early (negative) and a few are very late
+    values = np.concatenate([rng.lognormal(0.5, 1.0, 5000), -rng.exponential(0.5, 500), np.zeros(100)])
+    rng.shuffle(values)
+    sketch = DDSketch(0.01)
+    if batched:
+        for chunk in np.array_split(values, 13):
+            sketch.add_many(chunk)
+    else:
+        for value in values.tolist():
+            sketch.add(value)
+    assert sketch.count == len(values)
+    _assert_accurate(sketch, values, 0.01)
+
+
+def test_merge_is_exact():
+    rng = np.random.default_rng(3)
+    parts = [rng.gamma(2.0, 2.0, 1000) for _ in range(4)]
+    whole = DDSketch()
+    whole.add_many(np.concatenate(parts))
+    merged = DDSketch()
+    for part in parts:
+        sketch = DDSketch()
+        sketch.add_many(part)
+        merged.merge(sketch)
+    assert (merged.positive, merged.count) == (whole.positive, whole.count)
+
+
+def test_bins_are_capped_and_high_quantiles_stay_accurate():
+    values = np.logspace(-2, 6, 20000)
+    sketch = DDSketch(0.01, max_bins=128)
+    sketch.add_many(values)
+    assert len(sketch.positive) == 128
+    assert sketch.count == len(values)
+    assert abs(sketch.quantile(0.99) - np.quantile(values, 0.99, method="lower")) <= 0.01 * values[-1]
+
+
+def test_window_forgets_old_buckets():
+    windowed = WindowedSketch(bucket_seconds=60, buckets=5, relative_accuracy=0.01)
+    windowed.add_many([0.0, 30.0], [100.0, 100.0])
+    windowed.add_many([600.0, 610.0, 620.0], [1.0, 2.0, 3.0])
+    windowed.add(10.0, 500.0)  # older than the ring reaches back
+    window = windowed.window(now=620.0)
+    assert window.count == 3
+    assert window.quantile(1.0) == pytest.approx(3.0, rel=0.01)
+    assert windowed.window(now=60.0 * 100).count == 0
+
+
+def test_kpi_sketches_fleet_and_station():
+    sketches = KpiSketches(window_seconds=300, bucket_seconds=60, relative_accuracy=0.01)
+    empty = format_percentiles(sketches.sketches(), 300)
+    assert empty["delay_min"] == {"count": 0, "p50": None, "p95": None, "p99": None}
+    sketches.add_trains([1000.0, 1001.0], [2.0, 4.0])
+    sketches.add_stations([1000.0, 1000.0, 1010.0], ["STN-001", "STN-002", "STN-001"], [1.0, 5.0, 3.0])
+    doc = format_percentiles(sketches.sketches(), 300)
+    assert doc["delay_min"]["count"] == 2 and doc["wait_min"]["count"] == 3
+    assert sketches.sketches("STN-001")["wait_min"].count == 2
+    assert sketches.sketches("STN-404") is None
+    halves = merge_sketches([sketches.sketches(), sketches.sketches()])
+    assert halves["delay_min"].count == 4
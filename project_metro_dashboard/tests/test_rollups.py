@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator
+from services.rollups import FLEET, RollupStore, parse_tiers
+from tests.helpers import make_station, make_train
+
+
+def _train(i: int, second: float, delay: float) -> TrainEvent:
+    return make_train(i, delay, second, id=f"ev-{i}-{second}", passenger_count=100 + i, next_station=None)
+
+
+def test_parse_tiers_sorts_finest_first():
+    assert parse_tiers("60:60, 1:60") == [(1, 60), (60, 60)]
+    assert parse_tiers("") == []
+
+
+def test_window_picks_finest_covering_tier_and_drops_old_buckets():
+    store = RollupStore(("delay",), [(1, 10), (60, 10)])
+    for second in range(30):
+        store.add("TRN-1", second, (float(second),))
+    recent = store.query("TRN-1", 5)
+    assert (recent["resolution_seconds"], recent["count"]) == (1, 5)
+    assert recent["metrics"]["delay"] == {"sum": 25 + 26 + 27 + 28 + 29, "min": 25.0, "max": 29.0}
+    # 30 s does not fit the 10 s ring, so the minute ring answers
+    assert store.query("TRN-1", 30)["resolution_seconds"] == 60
+    assert store.query("TRN-1", 30)["count"] == 30
+    assert store.query(FLEET, 5)["count"] == 5
+    assert store.query("TRN-2", 5) is None
+
+
+def test_batches_match_single_adds():
+    rng = random.Random(5)
+    rows = sorted(
+        ((f"TRN-{rng.randrange(40)}", 1000 + rng.uniform(0, 400), (rng.uniform(-2, 9), rng.randrange(300)))
+         for _ in range(3000)),
+        key=lambda r: r[1],
+    )
+    single, batched = RollupStore(("delay", "pax"), [(1, 60), (60, 10)]), RollupStore(("delay", "pax"), [(1, 60), (60, 10)])
+    for entity, ts, values in rows:
+        single.add(entity, ts, values)
+    for start in range(0, len(rows), 500):
+        chunk = rows[start : start + 500]
+        batched.add_many([r[0] for r in chunk], [r[1] for r in chunk], [r[2] for r in chunk])
+    for entity in ("TRN-3", FLEET):
+        for window in (30, 600):
+            a, b = single.query(entity, window, series=True), batched.query(entity, window, series=True)
+            assert a["count"] == b["count"]
+            assert a["metrics"]["pax"] == b["metrics"]["pax"]
+            assert a["metrics"]["delay"]["sum"] == pytest.approx(b["metrics"]["delay"]["sum"])
+            assert [s["start"] for s in a["series"]] == [s["start"] for s in b["series"]]
+
+
+def test_aggregator_rollups_per_train_and_fleet():
+    agg = Aggregator(backend="dict")
+    events = [_train(i % 4, second=i, delay=float(i % 4)) for i in range(40)]
+    agg.update_many(events[:20])
+    for ev in events[20:]:
+        agg.update(ev)
+    agg.update(make_station(1, 420, 3.5))
+    train = agg.rollup("trains", "TRN-002", 60, series=True)
+    assert train["count"] == 10
+    assert train["metrics"]["delay_min"]["avg"] == 2.0
+    assert sum(bucket["count"] for bucket in train["series"]) == 10
+    fleet = agg.rollup("trains", FLEET, 60)
+    assert fleet["count"] == 40
+    assert fleet["metrics"]["delay_min"]["avg"] == 1.5
+    assert agg.rollup("stations", "STN-001", 60)["metrics"]["platform_occupancy"]["max"] == 420
+    assert agg.rollup("trains", "TRN-999", 60) is None
+
+
+def test_removed_entities_free_their_rows_for_reuse():
+    store = RollupStore(("delay",), [(1, 10), (60, 10)])
+    for second in range(15):
+        store.add("TRN-1", second, (1.0,))
+    assert store.remove("TRN-1") and not store.remove("TRN-1") and not store.remove(FLEET)
+    assert store.query("TRN-1", 60) is None and store.query(FLEET, 60)["count"] == 15
+    store.add("TRN-2", 15, (2.0,))
+    assert store.query("TRN-2", 60)["count"] == 1 and len(store._open) == 2
+
+    agg = Aggregator(backend="dict")
+    agg.update(_train(1, 0, 1.0))
+    agg.update(make_station(1, 420, 3.5))
+    agg.remove_train("TRN-001")
+    agg.remove_station("STN-001")
+    assert agg.rollup("trains", "TRN-001", 60) is None and agg.rollup("stations", "STN-001", 60) is None
+    assert agg.rollup("trains", FLEET, 60)["count"] == 1
+
+
+def test_rollups_can_be_disabled():
+    agg = Aggregator(backend="dict", rollup_tiers=[])
+    agg.update(_train(1, 0, 1.0))
+    assert agg.rollup("trains", "TRN-001", 60) is None
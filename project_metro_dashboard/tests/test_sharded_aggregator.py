@@ -0,0 +1,32 @@
+import random
+from datetime import datetime, timezone
+
+from services.aggregator import Aggregator
+from services.sharded_aggregator import ShardProcessPool
+from tests.helpers import make_station, make_train
+
+
+def _stream(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    for _ in range(n):
+        if rng.random() < 0.8:
+            yield make_train(rng.randrange(40), delay=rng.choice([0.0, 2.0, 6.0]))
+        else:
+            yield make_station(rng.randrange(10), rng.randrange(500))
+
+
+def _by_id(records, field):
+    return {r[field]: r for r in records}
+
+
+def test_process_pool_matches_single_aggregator():
+    single, pool = Aggregator(backend="dict"), ShardProcessPool(2, backend="dict", batch_size=16)
+    try:
+        for ev in _stream(200):
+            single.update(ev)
+            pool.submit(ev)
+        now = datetime(2025, 1, 2, tzinfo=timezone.utc)
+        assert pool.compute_stats(now=now) == single.compute_stats(now=now)
+        assert _by_id(pool.section("trains"), "train_id") == _by_id(single.snapshot()["trains"], "train_id")
+    finally:
+        pool.close()
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from services.aggregator import Aggregator
+from services.shared_state import SharedStatePublisher, SharedStateReader
+from tests.helpers import TS, make_station, make_train
+
+
+@pytest.fixture
+def segment_name():
+    return f"metro-test-{os.getpid()}"
+
+
+@pytest.fixture
+def publisher(segment_name):
+    agg = Aggregator(backend="dict")
+    pub = SharedStatePublisher(agg, segment_name, max_trains=8, max_stations=4, interval_seconds=60)
+    yield pub
+    pub.close()
+
+
+def test_reader_matches_aggregator(publisher, segment_name):
+    agg = publisher.aggregator
+    for i in range(5):
+        agg.update(make_train(i, delay=i * 2.0, speed_kmph=30.0 + i))
+    agg.update(make_station(1, 950))
+    assert publisher.publish()
+    reader = SharedStateReader(segment_name)
+    assert reader.snapshot() == agg.snapshot()
+    assert reader.compute_stats(now=TS) == agg.compute_stats(now=TS)
+    assert reader.section("trains") == agg.section("trains")
+    version, delayed = agg.query_trains({"is_delayed": True})
+    assert reader.query_trains({"is_delayed": True}) == (version, sorted(delayed, key=lambda t: t["train_id"]))
+    assert reader.incoming_trains("STN-001") == agg.incoming_trains("STN-001")
+    assert reader.delta("trains", reader.version) == {
+        "version": agg.version, "full": False, "changed": [], "removed": []
+    }
+
+
+def test_reader_decodes_only_new_versions(publisher, segment_name):
+    agg = publisher.aggregator
+    agg.update(make_train(1))
+    publisher.publish()
+    reader = SharedStateReader(segment_name)
+    first = reader.current()
+    assert reader.current() is first
+    assert not publisher.publish()  # nothing changed since the last publish
+    agg.update(make_train(2))
+    publisher.publish()
+    assert reader.current() is not first
+    assert len(reader.current().trains) == 2
+
+
+def test_reader_before_ingest_is_empty(segment_name):
+    reader = SharedStateReader(segment_name)
+    assert reader.snapshot() == {"trains": [], "stations": []}
+    assert reader.compute_stats()["trains_active"] == 0
+
+
+def test_publish_skipped_when_fleet_exceeds_capacity(publisher, segment_name):
+    agg = publisher.aggregator
+    agg.update(make_train(1))
+    publisher.publish()
+    for i in range(10):
+        agg.update(make_train(i))
+    assert not publisher.publish()
+    assert len(SharedStateReader(segment_name).current().trains) == 1
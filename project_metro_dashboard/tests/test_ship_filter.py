@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from services.elastic_logger import ElasticLogger
+from services.ship_filter import ShipFilter, ShipPolicy
+from tests.helpers import TS
+
+TRAINS = ShipPolicy(
+    "train_id",
+    on_change=["status"],
+    deadband={"location": 50, "delay_min": 0.5},
+    max_interval_seconds=60,
+)
+
+
+def _doc(seconds: float, north_m: float = 0.0, delay: float = 0.0, status: str = "running", train: str = "T1"):
+    return {"train_id": train, "ts": TS + timedelta(seconds=seconds), "location": (28.5 + north_m / 111195, 77.1),
+            "delay_min": delay, "status": status}
+
+
+def test_deadband_status_changes_and_heartbeat():
+    gate = ShipFilter({"trains": TRAINS})
+    verdicts = [
+        gate.admit("trains", _doc(0)),  # first
+        gate.admit("trains", _doc(2, north_m=30)),  # within 50 m
+        gate.admit("trains", _doc(4, north_m=60)),  # 60 m from the last shipped
+        gate.admit("trains", _doc(6, north_m=70, delay=0.4)),
+        gate.admit("trains", _doc(8, north_m=70, delay=1.0)),  # delay moved 1.0
+        gate.admit("trains", _doc(10, north_m=70, delay=1.0, status="halted")),
+        gate.admit("trains", _doc(12, north_m=70, delay=1.0, status="halted", train="T2")),
+        gate.admit("trains", _doc(69, north_m=70, delay=1.0, status="halted")),
+        gate.admit("trains", _doc(70, north_m=70, delay=1.0, status="halted")),  # 60 s since the last one
+    ]
+    assert verdicts == [True, False, True, False, True, True, True, False, True]
+    assert (gate.shipped, gate.suppressed) == (6, 3)
+    assert gate.admit("metro-kpis", {"trains_active": 3})
+
+
+def test_sampling_policy_ships_changes_and_one_doc_per_interval():
+    gate = ShipFilter({"trains": ShipPolicy("train_id", on_change=["status"], min_interval_seconds=10)})
+    shipped = [t for t in range(0, 30, 2) if gate.admit("trains", _doc(t, north_m=t * 20.0))]
+    assert shipped == [0, 10, 20]
+    assert gate.admit("trains", _doc(31, status="halted"))
+    assert not gate.admit("trains", _doc(32, status="halted"))
+
+
+def test_elastic_logger_suppresses_before_shipping(fake_es):
+    es = ElasticLogger(fake_es.url, enabled=True, bulk=True, ship_filter=ShipFilter({"trains": TRAINS}))
+    for seconds in range(10):
+        es.index("trains", {**_doc(seconds, north_m=seconds * 10.0), "ts": None})
+    es.index("metro-kpis", {"trains_active": 1})
+    es.close()
+    # Without a ts the wall clock is used: the first doc and the one 50 m+ away ship
+    assert fake_es.count("trains") == 2 and fake_es.count("metro-kpis") == 1
@@ -1,8 +1,13 @@
 import asyncio
+from datetime import datetime, timezone
 
 import pytest
 
-from services.simulator import Simulator
+from models.station_event import StationEvent
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator
+from services.sim_clock import VirtualClock
+from services.simulator import Simulator, VectorSimulator
 
 
 @pytest.mark.asyncio
@@ -36,3 +41,56 @@ async def test_simulator_generates_valid_events():
     assert -180.0 <= lon <= 180.0
     assert any_train.speed_kmph >= 0  # type: ignore[union-attr]
 
+
+def test_vector_simulator_is_seeded_and_in_bounds():
+    def run(seed):
+        sim = VectorSimulator(train_count=50, station_count=8, train_capacity=150, seed=seed)
+        sim._init_trains()
+        ts = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        return [sim.step(ts) for _ in range(5)]
+
+    first, again, other = run(3), run(3), run(4)
+    assert [e.model_dump() for tick in first for e in tick] == [e.model_dump() for tick in again for e in tick]
+    assert [e.model_dump() for e in first[-1]] != [e.model_dump() for e in other[-1]]
+
+    events = first[-1]
+    trains = [e for e in events if isinstance(e, TrainEvent)]
+    stations = [e for e in events if isinstance(e, StationEvent)]
+    assert len(trains) == 50 and len(stations) == 5
+    assert len({e.id for tick in first for e in tick}) == sum(len(tick) for tick in first)
+    for t in trains:
+        TrainEvent.model_validate(t.model_dump())
+        assert 28.40 <= t.location[0] <= 28.90 and 77.00 <= t.location[1] <= 77.40
+        assert 0.0 <= t.speed_kmph <= 80.0 and t.passenger_count >= 0 and t.delay_min >= -2.0
+        assert t.next_station in {f"STN-{i:03d}" for i in range(8)}
+
+
+async def _fast_forward(seed, duration_seconds=120.0):
+    aggregator = Aggregator(backend="dict")
+    queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+    clock = VirtualClock(datetime(2025, 1, 1, tzinfo=timezone.utc), queue)
+    kpis = []
+    clock.every(15, lambda now: kpis.append(aggregator.compute_stats(now=now)))
+
+    async def consume():
+        while True:
+            aggregator.update(await queue.get())
+            queue.task_done()
+
+    consumer = asyncio.create_task(consume())
+    sim = Simulator(train_count=20, station_count=10, train_capacity=150, seed=seed)
+    await sim.run(queue, clock, max_ticks=int(duration_seconds / sim.tick_seconds))
+    consumer.cancel()
+    return kpis, aggregator.snapshot()
+
+
+@pytest.mark.asyncio
+async def test_fast_forward_is_deterministic_and_uses_simulated_time():
+    kpis, snapshot = await _fast_forward(seed=11)
+    again, snapshot_again = await _fast_forward(seed=11)
+    other, _ = await _fast_forward(seed=12)
+    assert len(kpis) == 8
+    assert kpis[0]["ts"] == "2025-01-01T00:00:15+00:00"
+    assert kpis == again and snapshot == snapshot_again
+    assert kpis != other
+    assert {t["ts"] for t in snapshot["trains"]} == {datetime(2025, 1, 1, 0, 1, 58, tzinfo=timezone.utc)}
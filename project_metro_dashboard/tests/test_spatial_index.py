@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from services.geo import haversine_km
+from services.spatial_index import GridIndex
+
+BOUNDS = ((28.40, 77.00), (28.90, 77.40))
+
+
+@pytest.fixture
+def fleet():
+    rng = np.random.default_rng(5)
+    lats, lons = rng.uniform(28.40, 28.90, 2000), rng.uniform(77.00, 77.40, 2000)
+    ids = [f"TRN-{i:04d}" for i in range(len(lats))]
+    index = GridIndex(BOUNDS, cell_km=1.0, initial_capacity=16)
+    index.move_many(ids, lats, lons)
+    return index, ids, lats, lons
+
+
+def _brute_bbox(ids, lats, lons, box):
+    min_lat, min_lon, max_lat, max_lon = box
+    return sorted(t for t, la, lo in zip(ids, lats, lons) if min_lat <= la <= max_lat and min_lon <= lo <= max_lon)
+
+
+def test_bbox_matches_full_scan(fleet):
+    index, ids, lats, lons = fleet
+    for box in [(28.5, 77.1, 28.55, 77.16), (28.0, 76.0, 29.0, 78.0), (28.61, 77.2, 28.61, 77.2)]:
+        assert sorted(index.bbox(*box)) == _brute_bbox(ids, lats, lons, box)
+
+
+def test_moves_and_removals_keep_cells_consistent(fleet):
+    index, ids, lats, lons = fleet
+    lats, lons = lats.copy(), lons.copy()
+    for i in range(0, len(ids), 3):
+        lats[i], lons[i] = 28.405 + (i % 7) * 0.07, 77.005 + (i % 5) * 0.08
+        index.move(ids[i], lats[i], lons[i])
+    for i in range(0, len(ids), 10):
+        assert index.remove(ids[i])
+    assert not index.remove(ids[0])
+    kept = [i for i in range(len(ids)) if i % 10]
+    box = (28.4, 77.0, 28.7, 77.25)
+    expected = _brute_bbox([ids[i] for i in kept], lats[kept], lons[kept], box)
+    assert sorted(index.bbox(*box)) == expected
+    assert len(index) == len(kept)
+
+
+@pytest.mark.parametrize("point", [(28.65, 77.2), (28.401, 77.399), (29.5, 76.5)])
+def test_nearest_matches_full_scan(fleet, point):
+    index, ids, lats, lons = fleet
+    distances = haversine_km(point[0], point[1], lats, lons)
+    expected = [ids[i] for i in np.argsort(distances)[:15]]
+    hits = index.nearest(*point, k=15)
+    assert [t for t, _ in hits] == expected
+    assert [d for _, d in hits] == sorted(d for _, d in hits)
+
+
+def test_nearest_with_fewer_trains_than_k():
+    index = GridIndex(BOUNDS, cell_km=0.5)
+    assert index.nearest(28.6, 77.2, 5) == []
+    index.move_many(["A", "B", "A"], [28.6, 28.8, 28.7], [77.2, 77.3, 77.1])
+    assert [t for t, _ in index.nearest(28.6, 77.2, 5)] == ["A", "B"]
+    assert index.bbox(28.69, 77.09, 28.71, 77.11) == ["A"]  # last position of a repeated id wins
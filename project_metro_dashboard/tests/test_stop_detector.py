@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+import pytest
+
+from models.train_event import TrainEvent
+from services.simulator import Simulator, VectorSimulator
+from services.stations import StationCatalog, layout_stations, load_stations
+from services.stop_detector import StopDetector
+from tests.helpers import TS, make_train
+
+STATIONS = StationCatalog(["STN-A", "STN-B"], [28.60, 28.70], [77.20, 77.20])
+
+
+def _ev(n, lat, next_station="STN-A", train_id="TRN-1", seconds=None):
+    return make_train(0, 0.0, 2 * n if seconds is None else seconds, id=f"{train_id}-{n}", train_id=train_id,
+                      location=(lat, 77.20), next_station=next_station)
+
+
+def test_arrival_dwell_and_departure():
+    detector = StopDetector(STATIONS, radius_km=0.15)
+    # ~1 km south, then inside the radius, dwelling, and off towards STN-B
+    path = [(28.591, "STN-A"), (28.5995, "STN-A"), (28.60, "STN-A"), (28.60, "STN-A"), (28.60, "STN-B"), (28.61, "STN-B")]
+    stops = [detector.observe([_ev(n, lat, stn)]) for n, (lat, stn) in enumerate(path)]
+    assert [[(s.kind, s.station_id) for s in tick] for tick in stops] == [
+        [], [("arrival", "STN-A")], [], [], [("departure", "STN-A")], []
+    ]
+    departure = stops[4][0]
+    assert departure.dwell_seconds == pytest.approx(6.0)
+    assert departure.id == "TRN-1-4:dep" and stops[1][0].id == "TRN-1-1:arr"
+    assert (detector.arrivals, detector.departures) == (1, 1)
+    assert detector.station_of("TRN-1") is None
+
+
+def test_drifting_out_of_the_radius_departs():
+    detector = StopDetector(STATIONS, radius_km=0.15)
+    detector.observe([_ev(0, 28.60)])
+    assert detector.station_of("TRN-1") == "STN-A"
+    assert [s.kind for s in detector.observe([_ev(1, 28.603)])] == ["departure"]
+    # Coming back within the radius is a new arrival
+    assert [s.kind for s in detector.observe([_ev(2, 28.6001)])] == ["arrival"]
+
+
+def test_repeated_trains_in_one_batch_are_applied_in_order():
+    detector = StopDetector(STATIONS, radius_km=0.15, initial_capacity=1)
+    batch = [
+        _ev(0, 28.60, train_id="TRN-1"),
+        _ev(0, 28.70, "STN-B", train_id="TRN-2"),
+        _ev(1, 28.60, "STN-B", train_id="TRN-1"),
+        _ev(2, 28.70, "STN-B", train_id="TRN-1"),
+        _ev(3, 28.70, None, train_id="TRN-3"),
+    ]
+    stops = detector.observe(batch)
+    assert [(s.train_id, s.kind, s.station_id) for s in stops] == [
+        ("TRN-1", "arrival", "STN-A"),
+        ("TRN-2", "arrival", "STN-B"),
+        ("TRN-1", "departure", "STN-A"),
+        ("TRN-1", "arrival", "STN-B"),
+    ]
+    assert detector.station_of("TRN-3") is None
+
+
+def test_station_layout_and_csv(tmp_path):
+    bounds = ((28.40, 77.00), (28.90, 77.40))
+    layout = layout_stations(30, bounds)
+    assert layout.ids == layout_stations(30, bounds).ids and (layout.lat == layout_stations(30, bounds).lat).all()
+    assert ((28.40 < layout.lat) & (layout.lat < 28.90) & (77.00 < layout.lon) & (layout.lon < 77.40)).all()
+    assert layout.codes(["STN-002", "STN-404", None]).tolist() == [2, -1, -1]
+    path = tmp_path / "stations.csv"
+    path.write_text("station_id,lat,lon\nSTN-X,28.5,77.1\nSTN-Y,28.6,77.2\n")
+    loaded = load_stations(str(path))
+    assert loaded.location("STN-Y") == (28.6, 77.2) and loaded.location("STN-Z") is None
+
+
+@pytest.mark.parametrize("engine", [Simulator, VectorSimulator])
+def test_simulated_trains_stop_at_their_stations(engine):
+    sim = engine(train_count=60, station_count=12, train_capacity=150, seed=2)
+    sim._init_trains()
+    detector = StopDetector(sim.stations, radius_km=0.15)
+    stops = []
+    for tick in range(900):
+        events = sim.step(TS + timedelta(seconds=2 * tick))
+        for ev in events:
+            if isinstance(ev, TrainEvent) and ev.status == "dwelling":
+                assert ev.speed_kmph == 0.0 and sim.stations.location(ev.next_station) == ev.location
+        stops.extend(detector.observe(events))
+    departures = [s for s in stops if s.kind == "departure"]
+    assert departures and len(stops) - len(departures) >= len(departures)
+    # The detector sees a stop from entering the radius, so it measures at least the dwell itself
+    assert min(s.dwell_seconds for s in departures) >= 10.0
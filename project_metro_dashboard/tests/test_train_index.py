@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator
+from services.train_index import TrainIndex, event_key, filter_records, sort_page
+from tests.helpers import make_train
+
+FILTERS = [
+    {"is_delayed": True},
+    {"is_overcrowded": True, "is_delayed": False},
+    {"next_station": "STN-002"},
+    {"status": "halted", "next_station": "STN-001"},
+    {"status": "running", "is_delayed": True, "is_overcrowded": False},
+    {"next_station": "STN-404"},
+]
+
+
+def _random_train(rng: random.Random, n: int) -> TrainEvent:
+    return make_train(
+        rng.randrange(60),
+        rng.choice([0.0, 2.5, 3.0, 3.5, 9.0]),
+        n,
+        id=f"ev-{n}",
+        passenger_count=rng.randrange(150, 250),
+        capacity=200,
+        next_station=rng.choice([None, "STN-000", "STN-001", "STN-002"]),
+        status=rng.choice(["running", "dwelling", "halted"]),
+    )
+
+
+@pytest.mark.parametrize("backend", ["dict", "columnar"])
+@pytest.mark.parametrize("batched", [False, True])
+def test_indexed_queries_match_full_scan(backend, batched):
+    rng = random.Random(4)
+    agg = Aggregator(backend=backend)
+    events = [_random_train(rng, n) for n in range(2000)]
+    for i in range(0, len(events), 97):
+        if batched:
+            agg.update_many(events[i : i + 97])
+        else:
+            for ev in events[i : i + 97]:
+                agg.update(ev)
+        agg.remove_train(f"TRN-{rng.randrange(60):03d}")
+    records = agg.snapshot()["trains"]
+    for filters in FILTERS:
+        version, found = agg.query_trains(filters)
+        assert version == agg.version
+        assert sorted(r["train_id"] for r in found) == sorted(r["train_id"] for r in filter_records(records, filters))
+    assert len(agg.query_trains({})[1]) == len(records) == len(agg.index)
+
+
+def test_index_moves_trains_only_between_changed_values():
+    index = TrainIndex()
+    ev = make_train(1, 5.0, id="a", train_id="TRN-1")
+    index.update(ev.train_id, event_key(ev))
+    index.update_many([("TRN-2", event_key(ev.model_copy(update={"train_id": "TRN-2", "delay_min": 0.0})))])
+    assert sorted(index.lookup({"next_station": "STN-001"})) == ["TRN-1", "TRN-2"]
+    assert index.lookup({"is_delayed": True}) == ["TRN-1"]
+    index.update("TRN-1", event_key(ev.model_copy(update={"delay_min": 1.0, "status": "halted"})))
+    assert index.lookup({"is_delayed": True}) == [] and index.lookup({"status": "halted"}) == ["TRN-1"]
+    assert index.remove("TRN-1") and not index.remove("TRN-1")
+    assert index.lookup({"status": "halted"}) == [] and len(index) == 1
+
+
+def test_sort_page():
+    records = [{"train_id": f"T{i}", "delay_min": float(i % 4), "next_station": None if i % 3 else "S"}
+               for i in range(10)]
+    assert [r["train_id"] for r in sort_page(records, "delay_min", offset=2, limit=3)] == ["T8", "T1", "T5"]
+    assert [r["train_id"] for r in sort_page(records, "delay_min", descending=True, limit=2)] == ["T7", "T3"]
+    assert [r["train_id"] for r in sort_page(records, "delay_min", offset=8)] == ["T3", "T7"]
+    # None sorts last either way
+    assert sort_page(records, "next_station")[-1]["next_station"] is None
+    assert sort_page(records, "next_station", descending=True)[-1]["next_station"] is None
+    full = sort_page(records, "train_id", descending=True)
+    assert [r["train_id"] for r in full] == sorted((r["train_id"] for r in records), reverse=True)
+    assert sort_page(records, "train_id", offset=20, limit=5) == []
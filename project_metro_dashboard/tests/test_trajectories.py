@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from models.train_event import TrainEvent
+from services.aggregator import Aggregator
+from services.trajectories import SAMPLE_BYTES, TrajectoryStore
+from tests.helpers import TS, make_train
+
+EPOCH = TS.timestamp()
+
+
+def _append(store: TrajectoryStore, train_id: str, ts: float, lat: float = 28.5, delay: float = 0.0) -> int:
+    return store.append_many([train_id], [ts], [lat], [77.1], [40.0], [delay], [120])
+
+
+def test_ring_keeps_the_latest_samples_in_order():
+    store = TrajectoryStore(capacity=5)
+    for i in range(12):
+        _append(store, "T1", EPOCH + i)
+    columns = store.range("T1")
+    assert columns["ts"].tolist() == [EPOCH + i for i in range(7, 12)]
+    assert store.range("T1", EPOCH + 8.5, EPOCH + 10)["ts"].tolist() == [EPOCH + 9, EPOCH + 10]
+    assert store.range("T1", EPOCH + 11)["ts"].tolist() == [EPOCH + 11]
+    assert store.range("T1", end=EPOCH + 7)["ts"].tolist() == [EPOCH + 7]
+    assert len(store.range("T1", EPOCH + 20)["ts"]) == 0
+    assert store.range("T2") is None
+
+
+def test_range_matches_brute_force_across_wraps():
+    rng = np.random.default_rng(1)
+    store = TrajectoryStore(capacity=16)
+    ts = np.cumsum(rng.uniform(0.5, 3.0, 53)) + EPOCH
+    for t in ts:
+        _append(store, "T1", float(t))
+    held = ts[-16:]
+    for _ in range(50):
+        lo, hi = sorted(rng.uniform(ts[30], ts[-1] + 2, 2))
+        expected = held[(held >= lo) & (held <= hi)]
+        assert store.range("T1", lo, hi)["ts"].tolist() == expected.tolist()
+
+
+def test_batches_with_repeated_trains_keep_event_order():
+    store = TrajectoryStore(capacity=8)
+    ids = ["A", "B", "A", "A", "B"]
+    kept = store.append_many(ids, [EPOCH, EPOCH, EPOCH + 1, EPOCH + 2, EPOCH + 1], [1.0] * 5, [2.0] * 5, [0.0] * 5,
+                             [0.0, 0.0, 1.0, 2.0, 3.0], [1] * 5)
+    assert kept == 5
+    assert store.range("A")["delay_min"].tolist() == [0.0, 1.0, 2.0]
+    assert store.range("B")["delay_min"].tolist() == [0.0, 3.0]
+    # Older than the last kept sample: dropped so the ring stays sorted
+    assert _append(store, "A", EPOCH) == 0
+
+
+def test_deadband_keeps_moves_delay_changes_and_gaps():
+    store = TrajectoryStore(capacity=32, deadband_m=50, deadband_delay_min=1.0, max_gap_seconds=30)
+    step = 0.0001  # about 11 m of latitude
+    kept = [_append(store, "T1", EPOCH + i, lat=28.5 + i * step) for i in range(10)]
+    # First sample, then every fifth (moved > 50 m)
+    assert kept == [1, 0, 0, 0, 0, 1, 0, 0, 0, 0]
+    assert _append(store, "T1", EPOCH + 10, lat=28.5 + 5 * step, delay=1.5) == 1
+    assert _append(store, "T1", EPOCH + 20, lat=28.5 + 5 * step, delay=1.5) == 0
+    assert _append(store, "T1", EPOCH + 40, lat=28.5 + 5 * step, delay=1.5) == 1
+    assert len(store.range("T1")["ts"]) == 4
+    # Position-only deadband: delay changes alone are not kept
+    moves_only = TrajectoryStore(capacity=8, deadband_m=50)
+    assert [_append(moves_only, "T1", EPOCH + i, delay=float(i)) for i in range(3)] == [1, 0, 0]
+
+
+def test_scalar_append_matches_column_path():
+    rng = np.random.default_rng(7)
+    n = 400
+    ids = [f"T{i}" for i in rng.integers(0, 12, n)]
+    ts = EPOCH + np.sort(rng.uniform(0, 600, n))
+    ts[rng.random(n) < 0.1] -= 30  # some stale samples
+    lats = 28.5 + np.cumsum(rng.uniform(0, 2e-4, n))
+    delays = rng.choice([0.0, 0.5, 2.0], n)
+    columns = [ids, ts.tolist(), lats.tolist(), [77.1] * n, [40.0] * n, delays.tolist(), [120] * n]
+    kwargs = dict(capacity=16, max_trains=10, deadband_m=50, deadband_delay_min=1.0, max_gap_seconds=20)
+    scalar, batched = TrajectoryStore(**kwargs), TrajectoryStore(**kwargs)
+    assert n >= batched.VECTORIZE_MIN
+    kept = sum(scalar.append(*sample) for sample in zip(*columns))
+    assert batched.append_many(*columns) == kept
+    assert len(scalar) == len(batched) == 10
+    for train_id in sorted(set(ids)):
+        if scalar.range(train_id) is None:
+            assert batched.range(train_id) is None
+            continue
+        for name, values in scalar.range(train_id).items():
+            assert values.tolist() == batched.range(train_id)[name].tolist()
+
+
+def test_memory_is_bounded_and_rows_are_reused():
+    store = TrajectoryStore(capacity=10, max_trains=6, initial_trains=2)
+    store.append_many([f"T{i}" for i in range(8)], [EPOCH] * 8, [0.0] * 8, [0.0] * 8, [0.0] * 8, [0.0] * 8, [0] * 8)
+    assert len(store) == 6 and "T7" not in store
+    assert store.nbytes == 6 * 10 * SAMPLE_BYTES + 6 * 2 * 8
+    assert store.remove("T0") and not store.remove("T0")
+    _append(store, "T7", EPOCH + 1)
+    assert len(store.range("T7")["ts"]) == 1 and store.nbytes == 6 * 10 * SAMPLE_BYTES + 6 * 2 * 8
+
+
+def _train(train_id: str, seconds: int, delay: float = 0.0) -> TrainEvent:
+    return make_train(0, delay, seconds, id=f"{train_id}-{seconds}", train_id=train_id,
+                      location=(28.5, 77.1 + seconds * 1e-4), speed_kmph=40.0, passenger_count=100 + seconds)
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_aggregator_history(batched):
+    agg = Aggregator(backend="columnar", history_capacity=50)
+    events = [_train(f"T{i % 3}", i // 3, delay=i / 10) for i in range(30)]
+    if batched:
+        agg.update_many(events)
+    else:
+        for ev in events:
+            agg.update(ev)
+    samples = agg.history("T1", EPOCH + 2, EPOCH + 4)
+    assert [s["passenger_count"] for s in samples] == [102, 103, 104]
+    assert samples[0] == {
+        "ts": "2025-01-01T00:00:02.000Z",
+        "lat": 28.5, "lon": 77.1002, "speed_kmph": 40.0, "delay_min": 0.7, "passenger_count": 102,
+    }
+    assert len(agg.history("T2")) == 10
+    agg.remove_train("T2")
+    assert agg.history("T2") is None
+    assert Aggregator(history_capacity=0).history("T1") is None